@@ -1,7 +1,58 @@
-from app import app
+"""
+Vercel serverless entry point
+
+Twilio's TwiML webhooks are served by the light voice app, which never
+imports the database, the Twilio REST client or Firebase. The full app in
+app.py is imported on the first request for any other route, so a cold
+function answering a webhook skips its startup entirely.
+"""
+
+import os
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.exceptions import HTTPException
+
+from voice_routes import create_voice_app
+
+voice_app = create_voice_app()
+
+
+class LazyAppDispatcher:
+    """WSGI app routing TwiML requests to the voice app and the rest to app.py"""
+
+    def __init__(self, voice_app):
+        self.voice_app = voice_app
+        self._full_app = None
+        self._lock = threading.Lock()
+
+    @property
+    def full_app(self):
+        if self._full_app is None:
+            with self._lock:
+                if self._full_app is None:
+                    from app import app as full_app
+                    self._full_app = full_app
+        return self._full_app
+
+    def is_voice_route(self, environ):
+        try:
+            self.voice_app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return False
+        return True
+
+    def __call__(self, environ, start_response):
+        if self.is_voice_route(environ):
+            return self.voice_app(environ, start_response)
+        return self.full_app(environ, start_response)
+
 
 # This is the entry point for Vercel serverless functions
-app = app
+app = LazyAppDispatcher(voice_app)
 
 if __name__ == "__main__":
-    app.run()
+    from werkzeug.serving import run_simple
+    run_simple('127.0.0.1', 5000, app)
@@ -1,25 +1,28 @@
-from flask import Flask, request, Response, render_template, jsonify, session, redirect, url_for
+from flask import Flask, request, Response, render_template, jsonify, session, redirect, url_for, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload
 import os
-from datetime import datetime
-from twilio.rest import Client
-from twilio.twiml.voice_response import VoiceResponse, Gather, Say
+import importlib.util
+import base64
+import binascii
+import hashlib
+from datetime import datetime, timedelta
 import json
-import random
 from dotenv import load_dotenv
 from ai_logic.ride_events import on_driver_arrival, on_ride_cancelled, on_safety_issue, on_feedback_request
-try:
-    from firebase_utils import get_realtime_status
-    firebase_available = True
-except ImportError:
-    firebase_available = False
-    print("⚠️  Firebase not available - running without real-time features")
+from lazy_init import LazyResource
+from voice_routes import voice_routes, AI_RESPONSES
+
+# firebase_utils initializes the Firebase app on first use, so only probe for the SDK here
+firebase_available = importlib.util.find_spec('firebase_admin') is not None
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'weride-ai-caller-secret-2024')
+app.register_blueprint(voice_routes)
 
 # Database Configuration
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI', 'sqlite:///weride.db')
@@ -32,93 +35,176 @@ TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE_NUMBER')
 RECEIVER_NUMBER = os.getenv('RECEIVER_NUMBER')
 NGROK_BASE = os.getenv('NGROK_BASE', 'https://your-domain.vercel.app')
 
-# Initialize Twilio client
-twilio_client = None
-if TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN:
+twilio_configured = bool(TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN)
+
+def create_twilio_client():
+    """Build the Twilio REST client; None means demo mode"""
+    if not twilio_configured:
+        print("⚠️  Twilio credentials not found - running in demo mode")
+        return None
+    from twilio_pool import get_twilio_client
     try:
-        twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+        client = get_twilio_client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
         print("✅ Twilio client initialized successfully")
+        return client
     except Exception as e:
         print(f"⚠️  Twilio initialization error: {e}")
-else:
-    print("⚠️  Twilio credentials not found - running in demo mode")
+        return None
+
+# Created when the first call is placed, not at import
+twilio_client = LazyResource(create_twilio_client, 'twilio')
 
 # In-memory storage for demo (replace with your database)
 active_calls = {}
 ride_bookings = {}
-call_logs = []
 user_sessions = {}
 
-# Enhanced AI Response templates with detailed status updates
-AI_RESPONSES = {
-    'booking_confirmed': [
-        "Hello! This is WeRide AI assistant. Your ride has been successfully booked for {price} rupees from {pickup} to {destination}. Your booking ID is {booking_id}. We'll call you when a driver accepts your request.",
-        "Hi! WeRide AI here. Great news! Your ride booking is confirmed. Route: {pickup} to {destination}. Price: {price} rupees. Booking reference: {booking_id}. You'll get another call when your driver is assigned.",
-        "Thank you for choosing WeRide! Your booking is confirmed. From {pickup} to {destination} for {price} rupees. Booking ID: {booking_id}. We'll notify you once a driver accepts."
-    ],
-    'driver_assigned': [
-        "Good news! Driver {driver_name} has accepted your ride request. They're driving a {vehicle} with license plate {plate}. Driver rating: {rating} stars. They'll reach you in approximately {eta} minutes.",
-        "WeRide AI here! Your driver {driver_name} is confirmed. Vehicle: {vehicle}, Plate: {plate}, Rating: {rating} stars. Estimated arrival: {eta} minutes. Get ready!",
-        "Hello! Driver {driver_name} has accepted your WeRide booking. They're in a {vehicle} ({plate}) with {rating} star rating. Expected pickup time: {eta} minutes."
-    ],
-    'driver_enroute': [
-        "Your WeRide driver {driver_name} is now on the way to pick you up. They're currently {distance} away and should arrive in {eta} minutes. Vehicle: {vehicle}, Plate: {plate}.",
-        "WeRide update: Driver {driver_name} is heading to your location. Current distance: {distance}. Arrival time: approximately {eta} minutes. Look for {vehicle} with plate {plate}.",
-        "Hi! Your driver {driver_name} is en route. They're {distance} away in a {vehicle} ({plate}). Estimated arrival: {eta} minutes. Please be ready!"
-    ],
-    'driver_arrived': [
-        "Your WeRide driver {driver_name} has arrived at your pickup location! They're waiting in a {vehicle} with license plate {plate}. Please come out and look for your driver. Press 1 when you see them, or 2 if you need more time.",
-        "Hi! This is WeRide AI. Driver {driver_name} is now at your location in a {vehicle}, plate number {plate}. They're waiting for you outside. Press 1 to confirm you're coming out, or 2 if you need a few more minutes.",
-        "Good day! Your WeRide driver {driver_name} has reached your pickup point. Look for a {vehicle} with plate {plate}. Press 1 when you spot your driver, or 2 if you need additional time to come out."
-    ],
-    'ride_started': [
-        "Your WeRide journey has begun! Driver {driver_name} is taking you from {pickup} to {destination}. Estimated trip time: {duration} minutes. For safety, we may call to check on you during the ride.",
-        "WeRide AI here! Your trip has started with driver {driver_name}. Route: {pickup} to {destination}. Journey time: approximately {duration} minutes. Have a safe ride!",
-        "Hello! Your WeRide trip is underway. Driver {driver_name} is driving you to {destination}. Expected arrival: {duration} minutes. Enjoy your ride and stay safe!"
-    ],
-    'safety_check': [
-        "This is WeRide AI safety monitoring. We're checking in on your ongoing ride with driver {driver_name}. Press 1 if everything is fine and you feel safe. Press 2 if you need immediate assistance or feel unsafe.",
-        "WeRide safety AI here. How is your ride going with driver {driver_name}? Press 1 if you're comfortable and safe. Press 2 if you have any safety concerns or need help.",
-        "Hi, this is WeRide AI conducting a safety check. You're currently on a ride with {driver_name}. Press 1 to confirm you're safe and comfortable. Press 2 if you need emergency assistance."
-    ],
-    'ride_completed': [
-        "Your WeRide journey is complete! You've arrived at {destination}. Total fare: {final_price} rupees. Driver: {driver_name}. We hope you had a pleasant experience. A feedback call will follow shortly.",
-        "WeRide AI here! Trip completed successfully to {destination}. Final amount: {final_price} rupees. Thank you for riding with driver {driver_name}. Please expect a feedback call in a moment.",
-        "Hello! Your WeRide trip has ended at {destination}. Total cost: {final_price} rupees. Driver {driver_name} thanks you for the ride. We'll call back shortly for your feedback."
-    ],
-    'feedback_request': [
-        "Hi! WeRide AI here for your ride feedback. How was your experience with driver {driver_name} from {pickup} to {destination}? Press 1 for excellent, 2 for good, 3 for average, 4 for poor, or 5 if you had serious issues.",
-        "WeRide feedback collection! Please rate your recent trip with {driver_name}. Route: {pickup} to {destination}. Press 1 for 5 stars, 2 for 4 stars, 3 for 3 stars, 4 for 2 stars, or 5 for 1 star.",
-        "Hello! How was your WeRide experience? Driver: {driver_name}, Route: {pickup} to {destination}. Rate your trip: Press 1 for excellent service, 2 for good, 3 for okay, 4 for poor, or 5 for very poor."
-    ],
-    'ride_cancelled': [
-        "WeRide AI notification: Your ride booking has been cancelled. Reason: {reason}. If this was unexpected, please contact our support. You can book a new ride anytime through our app.",
-        "Hi! This is WeRide AI. Your ride from {pickup} to {destination} has been cancelled due to: {reason}. No charges applied. Feel free to book another ride when you're ready.",
-        "WeRide update: Your booking for {pickup} to {destination} is cancelled. Reason: {reason}. We apologize for any inconvenience. You can make a new booking immediately."
-    ],
-    'payment_reminder': [
-        "WeRide AI payment reminder: Your trip with {driver_name} costs {final_price} rupees. Please complete the payment to your driver. Trip: {pickup} to {destination}. Thank you!",
-        "Payment reminder from WeRide AI! Please pay {final_price} rupees to driver {driver_name} for your ride from {pickup} to {destination}. We appreciate your prompt payment."
-    ],
-    'driver_delay': [
-        "WeRide AI update: Your driver {driver_name} is running approximately {delay} minutes late due to {reason}. They'll reach you as soon as possible. We apologize for the delay.",
-        "Hi! Driver {driver_name} is delayed by about {delay} minutes because of {reason}. They're still coming to pick you up. Thank you for your patience with WeRide."
-    ]
-}
-
 # Import models and use their db instance
-from db.models import db, User, Driver, Ride, RideOffer, RideTracking, Rating
+from db.models import db, User, Driver, Ride, RideOffer, RideTracking, Rating, Campaign
+from idempotency import IdempotencyStore
+from campaigns import CampaignRunner, CampaignError, recipients_from_list, recipients_from_rides, ride_query
+from call_dispatch import CallDispatcher
+from driver_index import DriverIndex, driver_info
+from matching import MatchingEngine
+from track_compaction import TrackCompactor
+from track_store import TrackStore
+from geometry import estimate_ride, pickup_etas
+from offer_expiry import ExpirySweeper
+from location_ingest import LocationIngestBuffer, parse_ping
+from call_log import CallLogBuffer
+from ride_stream import RideEventBroker
+from dashboard_stats import DashboardStats
+from metrics import RequestMetrics, registry as metrics_registry, metrics_response
+from rate_limit import LANES, lane_priority, throttled
+from resilience import breaker_states
+from config import (
+    CALL_DISPATCH_WORKERS, CALL_JOB_STALE_SECONDS, CALL_DISPATCH_SWEEP_INTERVAL,
+    DRIVER_INDEX_CELL_DEG, DRIVER_INDEX_REFRESH_SECONDS,
+    LOCATION_FLUSH_SIZE, LOCATION_FLUSH_INTERVAL, LOCATION_BUFFER_MAX, LOCATION_FLUSH_MAX_ATTEMPTS,
+    CALL_LOG_CAPACITY, CALL_LOG_BATCH_SIZE, DASHBOARD_STATS_TTL, IDEMPOTENCY_TTL_SECONDS,
+    CAMPAIGN_BATCH_SIZE, CAMPAIGN_MAX_RECIPIENTS, MATCHING_ENABLED, MATCHING_INTERVAL, MATCHING_RADIUS_KM,
+    MATCHING_CANDIDATES, MATCHING_PRICE_WEIGHT, MATCHING_SPEED_KMH, MATCHING_MAX_RIDES,
+    TRACK_COMPACTION_ENABLED, TRACK_COMPACTION_INTERVAL, TRACK_SIMPLIFY_TOLERANCE_M,
+    TRACK_RAW_RETENTION_HOURS, TRACK_COMPACTION_BATCH, TRACK_STORE,
+    OFFER_EXPIRY_ENABLED, OFFER_TTL_SECONDS, RIDE_TTL_SECONDS, OFFER_EXPIRY_INTERVAL, OFFER_EXPIRY_BATCH
+)
 
 # Initialize db with app
 db.init_app(app)
 
+# Per-route latency, status and query counts, served at /metrics
+request_metrics = RequestMetrics(app)
+
+# Recent calls in memory, older ones in the CallLog table
+call_log = CallLogBuffer(app, capacity=CALL_LOG_CAPACITY, batch_size=CALL_LOG_BATCH_SIZE)
+
+# Retried POSTs with an Idempotency-Key replay the first response
+idempotency = IdempotencyStore(app, ttl=IDEMPOTENCY_TTL_SECONDS)
+
+# Outbound calls are placed by background workers, not request threads,
+# most urgent call type first
+call_dispatcher = CallDispatcher(workers=CALL_DISPATCH_WORKERS, priority=lane_priority,
+                                 stale_after=CALL_JOB_STALE_SECONDS, sweep_interval=CALL_DISPATCH_SWEEP_INTERVAL)
+
+# Bulk calls and SMS, queued through the dispatcher in batches
+campaigns = CampaignRunner(app, call_dispatcher, base_url=NGROK_BASE,
+                           batch_size=CAMPAIGN_BATCH_SIZE, max_recipients=CAMPAIGN_MAX_RECIPIENTS)
+
+# Online drivers bucketed by location for nearest-driver lookups
+driver_index = DriverIndex(cell_size_deg=DRIVER_INDEX_CELL_DEG, refresh_seconds=DRIVER_INDEX_REFRESH_SECONDS)
+
+# Dashboard counters served from memory
+dashboard_stats = DashboardStats(app, ttl=DASHBOARD_STATS_TTL)
+
+# Live ride updates pushed to passengers over Server-Sent Events
+ride_events = RideEventBroker()
+
+# Ride tracks packed one row per ride, used instead of RideTracking rows when TRACK_STORE=packed
+track_store = TrackStore()
+packed_tracks = TRACK_STORE == 'packed'
+
+# GPS pings from the bulk endpoint are written behind in batches
+location_ingest = LocationIngestBuffer(
+    app,
+    flush_size=LOCATION_FLUSH_SIZE,
+    flush_interval=LOCATION_FLUSH_INTERVAL,
+    max_buffered=LOCATION_BUFFER_MAX,
+    max_attempts=LOCATION_FLUSH_MAX_ATTEMPTS,
+    driver_index=driver_index,
+    ride_events=ride_events,
+    track_store=track_store if packed_tracks else None
+)
+
+def publish_matched_offers(offers):
+    """Push offers written by the matcher to the passengers' ride streams"""
+    names = dict(db.session.query(User.id, User.name).filter(User.id.in_({offer['driver_id'] for offer in offers})))
+    for offer in offers:
+        ride_events.publish(offer['ride_id'], 'offer-created', {
+            'offer_id': offer['offer_id'],
+            'driver_name': names.get(offer['driver_id']),
+            'offered_price': offer['offered_price'],
+            'pickup_time': offer['pickup_time'],
+            'message': offer['message']
+        })
+
+# Optional rounds offering pending rides to idle drivers in one global assignment
+matching = MatchingEngine(
+    app,
+    interval=MATCHING_INTERVAL,
+    radius_km=MATCHING_RADIUS_KM,
+    candidates=MATCHING_CANDIDATES,
+    price_weight=MATCHING_PRICE_WEIGHT,
+    speed_kmh=MATCHING_SPEED_KMH,
+    max_rides=MATCHING_MAX_RIDES,
+    on_offers=publish_matched_offers
+)
+if MATCHING_ENABLED:
+    matching.start()
+
+# Finished rides' GPS tracks are simplified once the raw retention window passes
+track_compactor = TrackCompactor(
+    app,
+    tolerance_m=TRACK_SIMPLIFY_TOLERANCE_M,
+    retention_hours=TRACK_RAW_RETENTION_HOURS,
+    batch_size=TRACK_COMPACTION_BATCH,
+    interval=TRACK_COMPACTION_INTERVAL
+)
+if TRACK_COMPACTION_ENABLED:
+    track_compactor.start()
+
+def publish_expired(offers, rides):
+    """Tell open ride streams about offers and rides the sweeper expired"""
+    for offer_id, ride_id in offers:
+        ride_events.publish(ride_id, 'offer-expired', {'offer_id': offer_id})
+    for ride_id in rides:
+        ride_events.publish(ride_id, 'status-change', {'status': 'expired'})
+
+# Pending offers and rides nobody acted on are expired in short batches
+offer_expiry = ExpirySweeper(
+    app,
+    offer_ttl=OFFER_TTL_SECONDS,
+    ride_ttl=RIDE_TTL_SECONDS,
+    batch_size=OFFER_EXPIRY_BATCH,
+    interval=OFFER_EXPIRY_INTERVAL,
+    on_expired=publish_expired
+)
+if OFFER_EXPIRY_ENABLED:
+    offer_expiry.start()
+
+metrics_registry.gauge('call_dispatch_pending', "Call jobs waiting for a dispatcher worker", call_dispatcher.pending)
+metrics_registry.gauge('call_dispatch_pending_by_lane', "Call jobs waiting for a dispatcher worker, by priority lane",
+                       lambda: {(LANES[priority],): count for priority, count in call_dispatcher.pending_by_priority().items()},
+                       labels=('lane',))
+metrics_registry.gauge('location_pings_buffered', "GPS pings waiting to be flushed", lambda: len(location_ingest))
+metrics_registry.gauge('ride_stream_subscribers', "Open ride event streams", ride_events.subscriber_count)
+
 # ─────────── MAIN DASHBOARD ───────────
 @app.route("/")
 def dashboard():
     return render_template('index.html', 
-                         total_calls=len(call_logs),
+                         total_calls=call_log.total,
                          active_rides=len(ride_bookings),
-                         twilio_status='Connected' if twilio_client else 'Demo Mode')
+                         twilio_status='Connected' if twilio_configured else 'Demo Mode')
 
 # ─────────── BOOKING PAGE ───────────
 @app.route("/book")
@@ -166,110 +252,110 @@ def book_ride_post():
             'message': 'Ride booked successfully! (Demo mode - no actual call)'
         })
 
-# ─────────── DYNAMIC AI VOICE CALL ───────────
-@app.route("/voice-dynamic", methods=["POST"])
-def voice_dynamic():
-    message = request.form.get("message", "This is a default AI message.")
-    voice = request.form.get("voice", "Polly.Joanna")  # Options: Polly.Matthew, Polly.Ivy, etc.
-
-    xml = f"""<?xml version="1.0" encoding="UTF-8"?>
-<Response>
-    <Say voice="{voice}" language="en-US">{message}</Say>
-</Response>"""
-    return Response(xml, mimetype='text/xml')
-
-# ─────────── STATIC XML VOICE ROUTES ───────────
-@app.route("/voice-arrival", methods=["POST"])
-def voice_arrival():
-    resp = """<?xml version="1.0" encoding="UTF-8"?>
-<Response>
-    <Say voice="Polly.Joanna" language="en-US">
-        Your WeRide driver has arrived. Please confirm before boarding.
-    </Say>
-</Response>"""
-    return Response(resp, mimetype='text/xml')
-
-@app.route("/voice-safety", methods=["POST"])
-def voice_safety():
-    resp = """<?xml version="1.0" encoding="UTF-8"?>
-<Response>
-    <Gather action="/safety-response" numDigits="1">
-        <Say voice="Polly.Matthew" language="en-US">
-            We detected a possible issue. Press 1 if you're safe. Press 2 if you need help.
-        </Say>
-    </Gather>
-</Response>"""
-    return Response(resp, mimetype='text/xml')
-
-@app.route("/voice-feedback", methods=["POST"])
-def voice_feedback():
-    resp = """<?xml version="1.0" encoding="UTF-8"?>
-<Response>
-    <Say voice="Polly.Ivy" language="en-US">
-        How was your ride today? Press 1 for good, 2 for bad, or leave a short message after the tone.
-    </Say>
-</Response>"""
-    return Response(resp, mimetype='text/xml')
-
 # ─────────── CORE AI CALLER FUNCTIONS ───────────
 def make_ai_call(phone_number, call_type, context=None):
-    """Make an AI voice call using Twilio"""
-    if not twilio_client:
+    """Queue an AI voice call; returns the call job ID, or False in demo mode"""
+    if not twilio_client.get():
         print(f"📱 DEMO: Would call {phone_number} with {call_type} message")
         # Log the demo call
-        call_logs.append({
-            'id': len(call_logs) + 1,
-            'phone': phone_number,
-            'type': call_type,
-            'status': 'demo',
-            'timestamp': datetime.now().isoformat(),
-            'context': context
-        })
+        call_log.record(phone_number, call_type, 'demo', context=context)
         return False
     
     try:
-        # Select AI response based on call type
-        message = random.choice(AI_RESPONSES.get(call_type, AI_RESPONSES['booking']))
+        job_id = call_dispatcher.enqueue(phone_number, call_type, f"{NGROK_BASE}/twiml/{call_type}", context)
+        print(f"📞 AI call queued for {phone_number} - job {job_id}")
+        return job_id
         
-        # Create call using Twilio
-        call = twilio_client.calls.create(
-            to=phone_number,
+    except Exception as e:
+        print(f"❌ Error queueing call to {phone_number}: {e}")
+        call_log.record(phone_number, call_type, 'failed', error=e, context=context)
+        return False
+
+def claim_ride_call(ride_id, flag):
+    """Atomically set a ride's call flag; True only for the request that flipped it"""
+    claimed = Ride.query.filter(Ride.id == ride_id, getattr(Ride, flag).isnot(True)).update(
+        {flag: True}, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+def release_ride_call(ride_id, flag):
+    """Clear a claimed call flag again, so a later request can place the call"""
+    Ride.query.filter(Ride.id == ride_id).update({flag: False}, synchronize_session=False)
+    db.session.commit()
+
+def make_ride_call(ride, flag, call_type):
+    """
+    Queue a once-per-ride AI call to the passenger, guarded by a Ride call flag
+
+    Returns:
+        The call job ID, or None if another request already placed the
+        call or it couldn't be queued (the flag is cleared again then)
+    """
+    if not claim_ride_call(ride.id, flag):
+        return None
+    job_id = None
+    try:
+        job_id = make_ai_call(ride.passenger.phone, call_type, {'ride_id': ride.id})
+    finally:
+        if not job_id:
+            db.session.rollback()
+            release_ride_call(ride.id, flag)
+    return job_id or None
+
+def place_queued_call(job):
+    """Dispatcher handler: place a queued call job through Twilio"""
+    from twilio_pool import twilio_breaker
+    context = json.loads(job.context) if job.context else None
+    if job.call_type == 'campaign_sms':
+        return send_queued_sms(job, context)
+    
+    try:
+        call = twilio_breaker.call(
+            throttled('calls.create', twilio_client.get().calls.create, job.call_type, waited=job_age(job)),
+            to=job.phone,
             from_=TWILIO_PHONE_NUMBER,
-            url=f"{NGROK_BASE}/twiml/{call_type}",
+            url=job.url,
             method='POST'
         )
-        
-        # Log the call
-        call_logs.append({
-            'id': len(call_logs) + 1,
-            'phone': phone_number,
-            'type': call_type,
-            'status': 'initiated',
-            'call_sid': call.sid,
-            'timestamp': datetime.now().isoformat(),
-            'context': context
-        })
-        
-        print(f"📞 AI call initiated to {phone_number} - SID: {call.sid}")
-        return True
-        
     except Exception as e:
-        print(f"❌ Error making call to {phone_number}: {e}")
-        call_logs.append({
-            'id': len(call_logs) + 1,
-            'phone': phone_number,
-            'type': call_type,
-            'status': 'failed',
-            'error': str(e),
-            'timestamp': datetime.now().isoformat(),
-            'context': context
-        })
-        return False
+        print(f"❌ Error making call to {job.phone}: {e}")
+        call_log.record(job.phone, job.call_type, 'failed', error=e, context=context)
+        raise
+    
+    # Log the call
+    call_log.record(job.phone, job.call_type, 'initiated', call_sid=call.sid, context=context)
+    
+    print(f"📞 AI call initiated to {job.phone} - SID: {call.sid}")
+    return call.sid
+
+def send_queued_sms(job, context):
+    """Dispatcher handler for campaign SMS jobs; the body is rendered when queued"""
+    from twilio_pool import twilio_breaker
+    try:
+        message = twilio_breaker.call(
+            throttled('messages.create', twilio_client.get().messages.create, job.call_type, waited=job_age(job)),
+            to=job.phone,
+            from_=TWILIO_PHONE_NUMBER,
+            body=context['body']
+        )
+    except Exception as e:
+        print(f"❌ Error sending SMS to {job.phone}: {e}")
+        call_log.record(job.phone, job.call_type, 'failed', error=e, context=context)
+        raise
+    
+    call_log.record(job.phone, job.call_type, 'initiated', call_sid=message.sid, context=context)
+    return message.sid
+
+def job_age(job):
+    """Seconds since a call job was queued, counted against its rate limit lane's deadline"""
+    return max(0.0, (datetime.utcnow() - job.created_at).total_seconds())
+
+call_dispatcher.init_app(app, handler=place_queued_call)
 
 # ─────────── ENHANCED AI CALLER FUNCTION ───────────
 def make_contextual_ai_call(phone_number, call_type, ride_data=None):
-    """Make a context-aware AI voice call with dynamic content"""
-    if not twilio_client:
+    """Queue a context-aware AI voice call with dynamic content"""
+    if not twilio_client.get():
         print(f"📱 DEMO: Would call {phone_number} with {call_type} message (with context)")
         return False
     
@@ -281,285 +367,39 @@ def make_contextual_ai_call(phone_number, call_type, ride_data=None):
             for key, value in ride_data.items():
                 twiml_params += f"&{key}={value}"
         
-        call = twilio_client.calls.create(
-            to=phone_number,
-            from_=TWILIO_PHONE_NUMBER,
-            url=f"{NGROK_BASE}/twiml-enhanced{twiml_params}",
-            method='POST'
-        )
+        job_id = call_dispatcher.enqueue(phone_number, call_type, f"{NGROK_BASE}/twiml-enhanced{twiml_params}", ride_data)
         
-        print(f"📞 Enhanced AI call initiated to {phone_number} - SID: {call.sid}")
-        return True
+        print(f"📞 Enhanced AI call queued for {phone_number} - job {job_id}")
+        return job_id
         
     except Exception as e:
-        print(f"❌ Error making contextual call: {e}")
+        print(f"❌ Error queueing contextual call: {e}")
         return False
 
-# ─────────── ENHANCED TWIML RESPONSE HANDLERS ───────────
-@app.route("/twiml-enhanced", methods=["POST"])
-def generate_enhanced_twiml():
-    """Generate enhanced TwiML responses with context"""
-    call_type = request.args.get('call_type', 'booking')
-    response = VoiceResponse()
-    
-    # Get context data from URL parameters
-    ride_id = request.args.get('ride_id')
-    driver_name = request.args.get('driver_name', 'your driver')
-    vehicle = request.args.get('vehicle', 'vehicle')
-    plate = request.args.get('plate', 'unknown')
-    pickup = request.args.get('pickup', 'your location')
-    destination = request.args.get('destination', 'your destination')
-    price = request.args.get('price', '0')
-    eta = request.args.get('eta', '5')
-    rating = request.args.get('rating', '5.0')
-    
-    try:
-        if call_type == 'booking_confirmed':
-            message_template = random.choice(AI_RESPONSES['booking_confirmed'])
-            message = message_template.format(
-                pickup=pickup,
-                destination=destination,
-                price=price,
-                booking_id=ride_id or 'WR12345'
-            )
-            response.say(message, voice='Polly.Joanna', language='en-US')
-            
-        elif call_type == 'driver_assigned':
-            message_template = random.choice(AI_RESPONSES['driver_assigned'])
-            message = message_template.format(
-                driver_name=driver_name,
-                vehicle=vehicle,
-                plate=plate,
-                rating=rating,
-                eta=eta
-            )
-            response.say(message, voice='Polly.Joanna', language='en-US')
-            
-        elif call_type == 'driver_arrived':
-            message_template = random.choice(AI_RESPONSES['driver_arrived'])
-            message = message_template.format(
-                driver_name=driver_name,
-                vehicle=vehicle,
-                plate=plate
-            )
-            response.say(message, voice='Polly.Joanna', language='en-US')
-            
-            # Add interactive response gathering
-            gather = Gather(numDigits=1, action='/handle-arrival-response-enhanced', method='POST')
-            gather.say("Press 1 when you see your driver, or 2 if you need more time.", 
-                      voice='Polly.Joanna', language='en-US')
-            response.append(gather)
-            
-        elif call_type == 'safety_check':
-            message_template = random.choice(AI_RESPONSES['safety_check'])
-            message = message_template.format(driver_name=driver_name)
-            
-            gather = Gather(numDigits=1, action='/handle-safety-response-enhanced', method='POST')
-            gather.say(message, voice='Polly.Matthew', language='en-US')
-            response.append(gather)
-            
-        elif call_type == 'feedback_request':
-            message_template = random.choice(AI_RESPONSES['feedback_request'])
-            message = message_template.format(
-                driver_name=driver_name,
-                pickup=pickup,
-                destination=destination
-            )
-            
-            gather = Gather(numDigits=1, action='/handle-feedback-response-enhanced', method='POST')
-            gather.say(message, voice='Polly.Ivy', language='en-US')
-            response.append(gather)
-            
-        elif call_type == 'ride_completed':
-            message_template = random.choice(AI_RESPONSES['ride_completed'])
-            message = message_template.format(
-                destination=destination,
-                final_price=price,
-                driver_name=driver_name
-            )
-            response.say(message, voice='Polly.Joanna', language='en-US')
-            
-        elif call_type == 'ride_cancelled':
-            reason = request.args.get('reason', 'driver unavailable')
-            message_template = random.choice(AI_RESPONSES['ride_cancelled'])
-            message = message_template.format(
-                pickup=pickup,
-                destination=destination,
-                reason=reason
-            )
-            response.say(message, voice='Polly.Joanna', language='en-US')
-            
-        else:
-            # Fallback to basic response
-            response.say("Hello from WeRide AI Assistant. Thank you for using our service.", 
-                        voice='Polly.Joanna', language='en-US')
-            
-    except Exception as e:
-        print(f"Error generating enhanced TwiML: {e}")
-        response.say("Hello from WeRide AI Assistant. Thank you for using our service.", 
-                    voice='Polly.Joanna', language='en-US')
-    
-    return Response(str(response), mimetype='text/xml')
-
-# ─────────── LEGACY TWIML RESPONSE HANDLERS ───────────
-@app.route("/twiml/<call_type>", methods=["POST"])
-def generate_twiml(call_type):
-    """Generate TwiML responses for different call types (legacy support)"""
-    response = VoiceResponse()
-    
-    if call_type == 'arrival':
-        response.say("Your WeRide driver has arrived at your pickup location. Please come out when ready.", 
-                    voice='Polly.Joanna', language='en-US')
-        
-        gather = Gather(numDigits=1, action='/handle-arrival-response', method='POST')
-        gather.say("Press 1 to confirm you're coming out, or 2 if you need more time.", 
-                  voice='Polly.Joanna', language='en-US')
-        response.append(gather)
-        
-    elif call_type == 'safety':
-        gather = Gather(numDigits=1, action='/handle-safety-response', method='POST')
-        gather.say("WeRide AI safety check: Are you okay? Press 1 for yes, 2 if you need help immediately.", 
-                  voice='Polly.Matthew', language='en-US')
-        response.append(gather)
-        
-    elif call_type == 'feedback':
-        gather = Gather(numDigits=1, action='/handle-feedback-response', method='POST')
-        gather.say("Hi! This is WeRide AI. How was your ride? Press 1 for excellent, 2 for good, 3 for average, or 4 for poor.", 
-                  voice='Polly.Ivy', language='en-US')
-        response.append(gather)
-        
-    elif call_type == 'booking':
-        response.say("Thank you for booking with WeRide! Your ride has been confirmed. We'll call you when your driver arrives.", 
-                    voice='Polly.Joanna', language='en-US')
-        
-    else:
-        response.say("Hello from WeRide AI Assistant. Thank you for using our service.", 
-                    voice='Polly.Joanna', language='en-US')
-    
-    return Response(str(response), mimetype='text/xml')
-
-# ─────────── RESPONSE HANDLERS ───────────
-@app.route("/handle-arrival-response", methods=["POST"])
-def handle_arrival_response():
-    """Handle user response to arrival call"""
-    digit_pressed = request.form.get('Digits')
-    response = VoiceResponse()
-    
-    if digit_pressed == '1':
-        response.say("Great! Your driver will wait for you. Have a safe ride!", 
-                    voice='Polly.Joanna', language='en-US')
-    elif digit_pressed == '2':
-        response.say("No problem! Take your time. Your driver has been notified.", 
-                    voice='Polly.Joanna', language='en-US')
-    else:
-        response.say("Thank you for your response. Have a great day!", 
-                    voice='Polly.Joanna', language='en-US')
-    
-    return Response(str(response), mimetype='text/xml')
-
-@app.route("/handle-safety-response", methods=["POST"])
-def handle_safety_response():
-    """Handle user response to safety call"""
-    digit_pressed = request.form.get('Digits')
-    response = VoiceResponse()
-    
-    if digit_pressed == '1':
-        response.say("Great to hear you're safe! Continue with your ride.", 
-                    voice='Polly.Matthew', language='en-US')
-    elif digit_pressed == '2':
-        response.say("We're connecting you to emergency services immediately. Stay on the line.", 
-                    voice='Polly.Matthew', language='en-US')
-        # In production, trigger emergency response
-    else:
-        response.say("If this is an emergency, please call emergency services directly.", 
-                    voice='Polly.Matthew', language='en-US')
-    
-    return Response(str(response), mimetype='text/xml')
-
-@app.route("/handle-feedback-response", methods=["POST"])
-def handle_feedback_response():
-    """Handle user response to feedback call (legacy)"""
-    digit_pressed = request.form.get('Digits')
-    response = VoiceResponse()
-    
-    feedback_responses = {
-        '1': "Thank you for the excellent rating! We're glad you enjoyed your ride.",
-        '2': "Thanks for the good rating! We appreciate your feedback.",
-        '3': "Thank you for your feedback. We'll work to improve our service.",
-        '4': "We're sorry about the issues. A customer service representative will contact you soon."
-    }
-    
-    message = feedback_responses.get(digit_pressed, "Thank you for your feedback!")
-    response.say(message, voice='Polly.Ivy', language='en-US')
-    
-    return Response(str(response), mimetype='text/xml')
-
-# ─────────── ENHANCED INTERACTIVE RESPONSE HANDLERS ───────────
-@app.route("/handle-arrival-response-enhanced", methods=["POST"])
-def handle_arrival_response_enhanced():
-    """Handle enhanced user response to arrival call"""
-    digit_pressed = request.form.get('Digits')
-    response = VoiceResponse()
-    
-    if digit_pressed == '1':
-        response.say("Perfect! We've notified your driver that you're on your way out. Please look for their vehicle and confirm with them before getting in. Have a safe and pleasant ride with WeRide!", 
-                    voice='Polly.Joanna', language='en-US')
-    elif digit_pressed == '2':
-        response.say("No problem! We've let your driver know you need a few more minutes. They'll wait for you. Please come out as soon as you're ready. Thank you for using WeRide!", 
-                    voice='Polly.Joanna', language='en-US')
-    else:
-        response.say("Thank you for responding to WeRide AI assistant. If you need any assistance, please call our support line. Have a great day!", 
-                    voice='Polly.Joanna', language='en-US')
-    
-    return Response(str(response), mimetype='text/xml')
-
-@app.route("/handle-safety-response-enhanced", methods=["POST"])
-def handle_safety_response_enhanced():
-    """Handle enhanced user response to safety call"""
-    digit_pressed = request.form.get('Digits')
-    response = VoiceResponse()
-    
-    if digit_pressed == '1':
-        response.say("Excellent! We're happy to confirm you're safe and comfortable during your WeRide journey. Continue enjoying your ride. We may check in again if the trip is long. Thank you!", 
-                    voice='Polly.Matthew', language='en-US')
-    elif digit_pressed == '2':
-        response.say("We understand you need immediate assistance. WeRide emergency protocol is now activated. We're connecting you to our emergency response team and local authorities. Please stay on the line and provide your location.", 
-                    voice='Polly.Matthew', language='en-US')
-        # In production, trigger emergency response system
-        # - Contact emergency services
-        # - Alert WeRide safety team  
-        # - Track ride location
-        # - Notify emergency contacts
-    else:
-        response.say("This is WeRide safety monitoring. If you're in immediate danger, please call emergency services directly at your local emergency number. For non-urgent issues, contact WeRide support.", 
-                    voice='Polly.Matthew', language='en-US')
-    
-    return Response(str(response), mimetype='text/xml')
-
-@app.route("/handle-feedback-response-enhanced", methods=["POST"])
-def handle_feedback_response_enhanced():
-    """Handle enhanced user response to feedback call"""
-    digit_pressed = request.form.get('Digits')
-    response = VoiceResponse()
-    
-    enhanced_feedback_responses = {
-        '1': "Fantastic! We're thrilled you had an excellent WeRide experience. Your 5-star rating means the world to us and your driver. Thank you for choosing WeRide, and we look forward to serving you again soon!",
-        '2': "Great to hear you had a good ride! Your positive feedback helps us maintain high service standards. We appreciate you taking the time to rate your WeRide experience. Thank you for riding with us!",
-        '3': "Thank you for your honest feedback. We value all passenger input as it helps us improve our WeRide service. We'll take note of your experience and work to make your next ride even better.",
-        '4': "We're sorry to hear your ride wasn't up to your expectations. Your feedback is important to us. A WeRide customer service representative will contact you within 24 hours to discuss your experience and make things right.",
-        '5': "We sincerely apologize for the serious issues you experienced during your WeRide trip. This is not the standard we strive for. A senior customer service manager will call you within 2 hours to personally address your concerns and ensure this doesn't happen again."
-    }
-    
-    message = enhanced_feedback_responses.get(digit_pressed, "Thank you for providing feedback to WeRide AI assistant. Your input helps us improve our service quality.")
-    response.say(message, voice='Polly.Ivy', language='en-US')
+@app.route("/api/call-jobs/<int:job_id>")
+def get_call_job(job_id):
+    """Look up the status of a queued outbound call"""
+    job = call_dispatcher.get_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Call job not found'}), 404
     
-    # In production, log the feedback rating to database
-    # and trigger appropriate follow-up actions based on rating
-    
-    return Response(str(response), mimetype='text/xml')
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'phone': job.phone,
+        'call_type': job.call_type,
+        'status': job.status,
+        'call_sid': job.call_sid,
+        'error': job.error,
+        'attempts': job.attempts,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    })
 
 # ─────────── API TRIGGER ROUTE ───────────
 @app.route("/api/trigger-call", methods=["POST"])
+@idempotency.idempotent
 def api_trigger_call():
     """API endpoint to trigger different types of calls"""
     data = request.get_json()
@@ -593,6 +433,7 @@ def api_trigger_call():
 # ─────────── INDRIVE-LIKE FEATURES ───────────
 
 @app.route("/api/create-ride", methods=["POST"])
+@idempotency.idempotent
 def create_real_ride():
     """Create a real ride with InDrive-like features"""
     data = request.get_json()
@@ -620,28 +461,75 @@ def create_real_ride():
             destination_lat=data.get('dest_lat'),
             destination_lng=data.get('dest_lng')
         )
+        estimate_ride(ride)
         
         db.session.add(ride)
         db.session.commit()
+        dashboard_stats.ride_created(ride)
         
         # Trigger AI confirmation call
-        make_ai_call(passenger.phone, 'booking', {'ride_id': ride.id})
+        call_job_id = make_ai_call(passenger.phone, 'booking', {'ride_id': ride.id})
         
         return jsonify({
             'success': True,
             'ride_id': ride.id,
             'message': 'Ride created! Drivers will see your request.',
-            'passenger_offer': ride.passenger_offer
+            'passenger_offer': ride.passenger_offer,
+            'call_job_id': call_job_id or None
         })
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def encode_ride_cursor(requested_at, ride_id):
+    """Opaque keyset cursor for the (requested_at, id) ride ordering"""
+    return base64.urlsafe_b64encode(f"{requested_at.isoformat()}|{ride_id}".encode()).decode()
+
+def decode_ride_cursor(cursor):
+    """Inverse of encode_ride_cursor; raises ValueError on a malformed cursor"""
+    try:
+        requested_at, ride_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(requested_at), int(ride_id)
+    except (TypeError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
 @app.route("/api/available-rides")
 def get_available_rides():
-    """Get available rides for drivers"""
-    rides = Ride.query.filter_by(status='pending').all()
+    """Get available rides for drivers, oldest first, one keyset page at a time"""
+    cursor = request.args.get('cursor')
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 200)
+        after = decode_ride_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    # Resolve the page with an index-only scan first; pending rides don't
+    # change, so their IDs are enough to tell whether the page changed
+    page = db.session.query(Ride.id, Ride.requested_at).filter(Ride.status == 'pending')
+    if after:
+        page = page.filter(tuple_(Ride.requested_at, Ride.id) > after)
+    page = page.order_by(Ride.requested_at, Ride.id).limit(limit + 1).all()
+    
+    has_more = len(page) > limit
+    page = page[:limit]
+    next_cursor = encode_ride_cursor(page[-1].requested_at, page[-1].id) if has_more else None
+    
+    etag = hashlib.sha1(
+        f"{cursor}:{limit}:{next_cursor}:{','.join(str(row.id) for row in page)}".encode()
+    ).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    
+    rides = []
+    if page:
+        rides = (Ride.query
+                 .options(joinedload(Ride.passenger))
+                 .filter(Ride.id.in_([row.id for row in page]))
+                 .order_by(Ride.requested_at, Ride.id)
+                 .all())
     
     rides_data = []
     for ride in rides:
@@ -655,9 +543,13 @@ def get_available_rides():
             'created_at': ride.requested_at.isoformat()
         })
     
-    return jsonify({'rides': rides_data})
+    response = jsonify({'rides': rides_data, 'next_cursor': next_cursor})
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route("/api/make-offer", methods=["POST"])
+@idempotency.idempotent
 def driver_make_offer():
     """Driver makes counter-offer for a ride"""
     data = request.get_json()
@@ -673,22 +565,41 @@ def driver_make_offer():
             )
             db.session.add(driver)
             db.session.commit()
+            dashboard_stats.driver_registered()
+        
+        # Without a pickup time from the driver, estimate one from their last location
+        pickup_time = data.get('pickup_time')
+        if pickup_time is None:
+            ride = Ride.query.get(data['ride_id'])
+            profile = driver.driver_profile[0] if driver.driver_profile else None
+            if ride and profile and None not in (ride.pickup_lat, ride.pickup_lng,
+                                                 profile.current_lat, profile.current_lng):
+                _, minutes = pickup_etas(ride.pickup_lat, ride.pickup_lng, profile.current_lat, profile.current_lng)
+                pickup_time = int(minutes)
         
         # Create ride offer
         offer = RideOffer(
             ride_id=data['ride_id'],
             driver_id=driver.id,
             offered_price=float(data['offered_price']),
-            estimated_pickup_time=data.get('pickup_time', 5),
+            estimated_pickup_time=pickup_time if pickup_time is not None else 5,
             message=data.get('message', '')
         )
         
         db.session.add(offer)
         db.session.commit()
         
+        ride_events.publish(offer.ride_id, 'offer-created', {
+            'offer_id': offer.id,
+            'driver_name': driver.name,
+            'offered_price': offer.offered_price,
+            'pickup_time': offer.estimated_pickup_time,
+            'message': offer.message
+        })
+        
         # Notify passenger via AI call about new offer
         ride = Ride.query.get(data['ride_id'])
-        make_ai_call(ride.passenger.phone, 'arrival', {
+        call_job_id = make_ai_call(ride.passenger.phone, 'arrival', {
             'message': f'You have a new offer from {driver.name} for ${offer.offered_price}',
             'ride_id': ride.id,
             'offer_id': offer.id
@@ -697,7 +608,8 @@ def driver_make_offer():
         return jsonify({
             'success': True,
             'offer_id': offer.id,
-            'message': 'Offer sent to passenger!'
+            'message': 'Offer sent to passenger!',
+            'call_job_id': call_job_id or None
         })
         
     except Exception as e:
@@ -705,37 +617,57 @@ def driver_make_offer():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route("/api/accept-offer", methods=["POST"])
+@idempotency.idempotent
 def accept_offer():
     """Passenger accepts a driver's offer"""
     data = request.get_json()
     
     try:
         offer = RideOffer.query.get(data['offer_id'])
-        ride = offer.ride
+        if not offer:
+            return jsonify({'success': False, 'error': 'Offer not found'}), 404
         
-        # Update ride status
-        ride.driver_id = offer.driver_id
-        ride.final_price = offer.offered_price
-        ride.status = 'accepted'
-        ride.accepted_at = datetime.utcnow()
+        # Conditional UPDATEs claim the offer and the ride, so an offer the expiry
+        # sweeper (or another accept) got to first is never flipped back
+        claimed = RideOffer.query.filter_by(id=offer.id, status='pending').update(
+            {'status': 'accepted'}, synchronize_session=False)
+        if claimed != 1:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': 'Offer is no longer available'}), 409
         
-        # Update offer status
-        offer.status = 'accepted'
+        old_status = 'pending'
+        claimed = Ride.query.filter_by(id=offer.ride_id, status='pending').update({
+            'driver_id': offer.driver_id,
+            'final_price': offer.offered_price,
+            'status': 'accepted',
+            'accepted_at': datetime.utcnow()
+        }, synchronize_session=False)
+        if claimed != 1:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': 'Ride is no longer pending'}), 409
         
         # Reject other offers
-        other_offers = RideOffer.query.filter_by(ride_id=ride.id).filter(RideOffer.id != offer.id).all()
-        for other_offer in other_offers:
-            other_offer.status = 'rejected'
+        RideOffer.query.filter(RideOffer.ride_id == offer.ride_id, RideOffer.status == 'pending',
+                               RideOffer.id != offer.id).update({'status': 'rejected'}, synchronize_session=False)
         
         db.session.commit()
+        ride = offer.ride
+        dashboard_stats.ride_status_changed(ride, old_status)
+        
+        ride_events.publish(ride.id, 'offer-accepted', {
+            'offer_id': offer.id,
+            'driver_name': offer.driver.name,
+            'final_price': ride.final_price
+        })
+        ride_events.publish(ride.id, 'status-change', {'status': ride.status})
         
         # AI call to both driver and passenger
-        make_ai_call(offer.driver.phone, 'booking', {
+        driver_job_id = make_ai_call(offer.driver.phone, 'booking', {
             'message': f'Congratulations! Your offer was accepted. Pickup: {ride.pickup_address}',
             'ride_id': ride.id
         })
         
-        make_ai_call(ride.passenger.phone, 'booking', {
+        passenger_job_id = make_ai_call(ride.passenger.phone, 'booking', {
             'message': f'Your ride is confirmed! Driver {offer.driver.name} will pick you up.',
             'ride_id': ride.id
         })
@@ -744,7 +676,8 @@ def accept_offer():
             'success': True,
             'message': 'Ride confirmed!',
             'driver_name': offer.driver.name,
-            'final_price': ride.final_price
+            'final_price': ride.final_price,
+            'call_job_ids': [job_id for job_id in (driver_job_id, passenger_job_id) if job_id]
         })
         
     except Exception as e:
@@ -762,10 +695,11 @@ def update_driver_location():
             return jsonify({'success': False, 'error': 'Driver not found'}), 404
         
         # Update driver location in driver profile
-        if driver.driver_profile:
-            driver.driver_profile.current_lat = data['lat']
-            driver.driver_profile.current_lng = data['lng']
-            driver.driver_profile.last_location_update = datetime.utcnow()
+        profile = driver.driver_profile[0] if driver.driver_profile else None
+        if profile:
+            profile.current_lat = data['lat']
+            profile.current_lng = data['lng']
+            profile.last_location_update = datetime.utcnow()
         
         # If driver has active ride, track location
         active_ride = Ride.query.filter_by(driver_id=driver.id, status='accepted').first()
@@ -773,39 +707,76 @@ def update_driver_location():
             tracking = RideTracking(
                 ride_id=active_ride.id,
                 driver_lat=data['lat'],
-                driver_lng=data['lng']
+                driver_lng=data['lng'],
+                timestamp=datetime.utcnow()
             )
-            db.session.add(tracking)
+            if packed_tracks:
+                track_store.append(active_ride.id, [(tracking.driver_lat, tracking.driver_lng, tracking.timestamp)])
+            else:
+                db.session.add(tracking)
         
         db.session.commit()
         
+        if active_ride:
+            ride_events.publish(active_ride.id, 'driver-location', {
+                'lat': tracking.driver_lat,
+                'lng': tracking.driver_lng,
+                'timestamp': tracking.timestamp
+            })
+        
+        # Keep the nearest-driver index in step with the new position
+        if profile and profile.is_online:
+            driver_index.upsert(driver.id, profile.current_lat, profile.current_lng, driver_info(driver, profile))
+        elif profile:
+            driver_index.remove(driver.id)
+        
         return jsonify({'success': True, 'message': 'Location updated'})
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route("/api/driver-locations/bulk", methods=["POST"])
+def ingest_driver_locations():
+    """Accept a batch of location pings from many drivers for write-behind storage"""
+    data = request.get_json(silent=True) or {}
+    raw_pings = data.get('pings')
+    if not isinstance(raw_pings, list):
+        return jsonify({'success': False, 'error': 'pings must be a list'}), 400
+    
+    pings = [ping for ping in map(parse_ping, raw_pings) if ping is not None]
+    if pings and not location_ingest.add(pings):
+        return jsonify({'success': False, 'error': 'Location buffer full, retry shortly'}), 503
+    
+    return jsonify({
+        'success': True,
+        'accepted': len(pings),
+        'rejected': len(raw_pings) - len(pings)
+    }), 202
+
 @app.route("/api/driver-arrived", methods=["POST"])
+@idempotency.idempotent
 def driver_arrived():
     """Mark driver as arrived and trigger AI call"""
     data = request.get_json()
     
     try:
         ride = Ride.query.get(data['ride_id'])
+        old_status = ride.status
         ride.status = 'arrived'
         ride.pickup_time = datetime.utcnow()
         
         db.session.commit()
+        dashboard_stats.ride_status_changed(ride, old_status)
+        ride_events.publish(ride.id, 'status-change', {'status': ride.status})
         
-        # Trigger AI arrival call
-        if not ride.arrival_call_made:
-            make_ai_call(ride.passenger.phone, 'arrival', {'ride_id': ride.id})
-            ride.arrival_call_made = True
-            db.session.commit()
+        # Trigger AI arrival call; the conditional UPDATE lets only one request place it
+        call_job_id = make_ride_call(ride, 'arrival_call_made', 'arrival')
         
         return jsonify({
             'success': True,
-            'message': 'Passenger notified of arrival via AI call!'
+            'message': 'Passenger notified of arrival via AI call!',
+            'call_job_id': call_job_id
         })
         
     except Exception as e:
@@ -813,12 +784,14 @@ def driver_arrived():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route("/api/complete-ride", methods=["POST"])
+@idempotency.idempotent
 def complete_ride():
     """Mark ride as completed and trigger feedback AI call"""
     data = request.get_json()
     
     try:
         ride = Ride.query.get(data['ride_id'])
+        old_status = ride.status
         ride.status = 'completed'
         ride.completed_at = datetime.utcnow()
         
@@ -827,22 +800,154 @@ def complete_ride():
         ride.driver.total_rides += 1
         
         db.session.commit()
+        dashboard_stats.ride_status_changed(ride, old_status)
+        ride_events.publish(ride.id, 'status-change', {'status': ride.status})
         
-        # Trigger feedback AI call
-        if not ride.feedback_call_made:
-            make_ai_call(ride.passenger.phone, 'feedback', {'ride_id': ride.id})
-            ride.feedback_call_made = True
-            db.session.commit()
+        # Trigger feedback AI call; the conditional UPDATE lets only one request place it
+        call_job_id = make_ride_call(ride, 'feedback_call_made', 'feedback')
         
         return jsonify({
             'success': True,
-            'message': 'Ride completed! Feedback call initiated.'
+            'message': 'Ride completed! Feedback call initiated.',
+            'call_job_id': call_job_id
         })
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route("/api/rides/<int:ride_id>/events")
+def ride_event_stream(ride_id):
+    """Server-Sent Events stream of offers, driver location and status for one ride"""
+    ride = Ride.query.get(ride_id)
+    if not ride:
+        return jsonify({'success': False, 'error': 'Ride not found'}), 404
+    
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        last_event_id = 0
+    
+    snapshot = ('status-change', {'status': ride.status})
+    # Don't hold a pooled DB connection for the lifetime of the stream
+    db.session.remove()
+    
+    response = Response(
+        stream_with_context(ride_events.stream(ride_id, last_event_id, initial=snapshot)),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route("/api/rides/<int:ride_id>/track")
+def ride_track(ride_id):
+    """
+    Replay a ride's GPS track as columns of lat, lng and ms since started_at
+
+    ?format=packed returns a packed track's blob as stored, for clients that
+    decode it themselves.
+    """
+    if request.args.get('format') == 'packed':
+        track = track_store.read(ride_id)
+        if track is None:
+            return jsonify({'success': False, 'error': 'No packed track for this ride'}), 404
+        response = Response(bytes(track.data), mimetype='application/octet-stream')
+        response.headers['X-Track-Points'] = str(track.count)
+        response.headers['X-Track-Started-At'] = track.started_at.isoformat()
+        return response
+    
+    points = track_store.points(ride_id)
+    if not points and not Ride.query.get(ride_id):
+        return jsonify({'success': False, 'error': 'Ride not found'}), 404
+    
+    started_at = points[0][2] if points else None
+    return jsonify({
+        'success': True,
+        'ride_id': ride_id,
+        'points': len(points),
+        'started_at': started_at.isoformat() if started_at else None,
+        'lat': [lat for lat, _, _ in points],
+        'lng': [lng for _, lng, _ in points],
+        'offset_ms': [(timestamp - started_at) // timedelta(milliseconds=1) for _, _, timestamp in points]
+    })
+
+# ─────────── CALL CAMPAIGNS ───────────
+@app.route("/api/campaigns", methods=["POST"])
+@idempotency.idempotent
+def create_campaign():
+    """Queue a call or SMS campaign for a recipient list or the rides matching a query"""
+    data = request.get_json(silent=True) or {}
+    template = data.get('template')
+    recipients = data.get('recipients')
+    filters = data.get('ride_query')
+    
+    if not template:
+        return jsonify({'success': False, 'error': 'template is required'}), 400
+    if (recipients is None) == (filters is None):
+        return jsonify({'success': False, 'error': 'Provide either recipients or ride_query'}), 400
+    if not twilio_client.get():
+        return jsonify({'success': False, 'error': 'Twilio is not configured (demo mode)'}), 503
+    
+    try:
+        if recipients is not None:
+            if not isinstance(recipients, list):
+                return jsonify({'success': False, 'error': 'recipients must be a list'}), 400
+            count = len(recipients)
+            source = recipients_from_list(recipients)
+        else:
+            query = ride_query(filters)
+            count = query.order_by(None).count()
+            source = recipients_from_rides(query)
+        if count > campaigns.max_recipients:
+            return jsonify({
+                'success': False,
+                'error': f'{count} recipients exceeds the limit of {campaigns.max_recipients}'
+            }), 400
+        
+        campaign = campaigns.launch(
+            data.get('name') or template,
+            template,
+            source,
+            channel=data.get('channel', 'voice'),
+            values=data.get('values')
+        )
+    except CampaignError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    print(f"📣 Campaign {campaign.id} queued {campaign.total_recipients} {campaign.channel} messages")
+    return jsonify({
+        'success': campaign.status != 'failed',
+        'campaign_id': campaign.id,
+        'status': campaign.status,
+        'queued': campaign.total_recipients,
+        'skipped': campaign.skipped_recipients,
+        'progress_url': url_for('campaign_progress', campaign_id=campaign.id)
+    }), 202
+
+@app.route("/api/campaigns/<int:campaign_id>")
+def get_campaign(campaign_id):
+    """Campaign details with job counts by status"""
+    summary = campaigns.summary(campaign_id)
+    if summary is None:
+        return jsonify({'success': False, 'error': 'Campaign not found'}), 404
+    return jsonify(dict(summary, success=True))
+
+@app.route("/api/campaigns/<int:campaign_id>/progress")
+def campaign_progress(campaign_id):
+    """Newline-delimited JSON: one line per finished recipient, periodic stats, then totals"""
+    if db.session.get(Campaign, campaign_id) is None:
+        return jsonify({'success': False, 'error': 'Campaign not found'}), 404
+    db.session.remove()
+    
+    response = Response(stream_with_context(campaigns.progress(campaign_id)), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route("/api/online-drivers")
 def get_online_drivers():
     """Get list of online drivers with their locations"""
@@ -864,24 +969,82 @@ def get_online_drivers():
     
     return jsonify({'drivers': drivers_data})
 
+@app.route("/api/nearest-drivers")
+def get_nearest_drivers():
+    """Get the closest online drivers to a point, within a radius"""
+    try:
+        lat = float(request.args['lat'])
+        lng = float(request.args['lng'])
+        radius_km = float(request.args.get('radius_km', 5))
+        k = min(int(request.args.get('k', 10)), 100)
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'error': 'lat and lng are required numbers'}), 400
+    # Chained comparisons are False for NaN, so these also reject non-finite values
+    if not -90 <= lat <= 90 or not -180 <= lng <= 180 or not 0 < radius_km < float('inf') or k < 1:
+        return jsonify({'success': False, 'error': 'lat must be within ±90, lng within ±180, '
+                                                   'radius_km positive and k at least 1'}), 400
+    radius_km = min(radius_km, 50.0)
+    
+    driver_index.ensure_fresh(app)
+    
+    nearest = driver_index.nearest(lat, lng, radius_km, k)
+    _, etas = pickup_etas(lat, lng, [entry[2] for entry in nearest], [entry[3] for entry in nearest])
+    
+    drivers_data = []
+    for (distance_km, driver_id, driver_lat, driver_lng, info), eta in zip(nearest, etas.tolist()):
+        drivers_data.append(dict(
+            info,
+            id=driver_id,
+            current_lat=driver_lat,
+            current_lng=driver_lng,
+            distance_km=round(distance_km, 3),
+            eta_minutes=int(eta)
+        ))
+    
+    return jsonify({'drivers': drivers_data})
+
+# ─────────── BATCH MATCHING ───────────
+@app.route("/api/matching/run", methods=["POST"])
+def run_matching():
+    """Run one matching round now and return its summary"""
+    try:
+        summary = matching.run_once(wait=False)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+    if summary is None:
+        return jsonify({'success': False, 'error': 'A matching round is already running'}), 409
+    return jsonify(dict(summary, success=True))
+
+# ─────────── METRICS ───────────
+@app.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint"""
+    return metrics_response()
+
+@app.route("/api/health/dependencies")
+def dependency_health():
+    """Circuit breaker state for Twilio and Firebase (listed once first used)"""
+    states = breaker_states()
+    return jsonify({
+        'success': True,
+        'healthy': all(state['state'] == 'closed' for state in states.values()),
+        'dependencies': states
+    })
+
 # ─────────── DASHBOARD WITH REAL DATA ───────────
 @app.route("/dashboard")
 def real_dashboard():
     """Dashboard showing real ride statistics"""
-    total_rides = Ride.query.count()
-    active_rides = Ride.query.filter(Ride.status.in_(['pending', 'accepted', 'arrived', 'in_progress'])).count()
-    total_drivers = User.query.filter_by(user_type='driver').count()
-    online_drivers = db.session.query(Driver).filter_by(is_online=True).count()
-    
-    recent_rides = Ride.query.order_by(Ride.requested_at.desc()).limit(10).all()
+    stats = dashboard_stats.snapshot()
     
     return render_template('dashboard.html',
-                         total_rides=total_rides,
-                         active_rides=active_rides,
-                         total_drivers=total_drivers,
-                         online_drivers=online_drivers,
-                         recent_rides=recent_rides,
-                         twilio_status='Connected' if twilio_client else 'Demo Mode')
+                         total_rides=stats['total_rides'],
+                         active_rides=stats['active_rides'],
+                         total_drivers=stats['total_drivers'],
+                         online_drivers=stats['online_drivers'],
+                         recent_rides=stats['recent_rides'],
+                         twilio_status='Connected' if twilio_configured else 'Demo Mode')
 
 # ─────────── TRIGGER ROUTES ───────────
 @app.route("/arrival", methods=["POST"])
@@ -917,4 +1080,8 @@ def create_tables():
 
 # ─────────── FLASK RUN ───────────
 if __name__ == "__main__":
+    # Workers start with the server (not on import), so jobs left queued by a
+    # previous process are placed without waiting for a new one; other entry
+    # points start them on the first enqueue
+    call_dispatcher.start()
     app.run(debug=True)
@@ -0,0 +1,324 @@
+"""
+Pre-rendered Audio Cache
+========================
+
+Spoken TwiML costs a <Say> synthesis on every call, though most calls speak
+the same few messages. This cache renders each (text, voice, language) once
+with offline TTS (pyttsx3) in a process pool and stores the audio on disk
+under the sha256 of that triple. Voice responses are rewritten on the way
+out: a <Say> whose audio is cached becomes <Play>/audio/<hash>.wav</Play>,
+served with a year-long immutable Cache-Control since the content of a hash
+never changes.
+
+A <Say> that isn't cached is still spoken by Twilio; with render_on_miss
+its audio is also rendered in the background for next time. Every static
+prompt can be rendered up front with:
+
+    python audio_cache.py [--workers N]
+
+pyttsx3 is in requirements.txt and drives the platform's speech engine
+(espeak on Linux, SAPI5 on Windows, NSSpeechSynthesizer on macOS). Without
+it, or without a working engine, nothing is rendered and responses keep
+their <Say> elements.
+
+On macOS save_to_file writes AIFF whatever the file name, yet the file is
+still stored as .wav and served as audio/wav. Render the cache on the Linux
+or Windows hosts that serve it, not on a Mac.
+"""
+
+import hashlib
+import importlib.util
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape, unescape
+
+from config import (
+    AUDIO_CACHE_DIR, AUDIO_CACHE_BASE_URL, AUDIO_CACHE_WORKERS, AUDIO_CACHE_MAX_PENDING, AUDIO_CACHE_RENDER_ON_MISS
+)
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+AUDIO_SUFFIX = '.wav'
+AUDIO_MIMETYPE = 'audio/wav'
+MAX_AGE = 365 * 24 * 3600
+
+KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+_SAY = re.compile(r'<Say((?:\s+\w+="[^"]*")*)\s*>(.*?)</Say>', re.DOTALL)
+_ATTR = re.compile(r'(\w+)="([^"]*)"')
+
+# Polly voices used by the voice routes, by the gender picked from the local engine
+VOICE_GENDERS = {
+    'Polly.Joanna': 'female',
+    'Polly.Ivy': 'female',
+    'Polly.Matthew': 'male',
+    'alice': 'female',
+    'man': 'male',
+    'woman': 'female'
+}
+
+audio_lookups = registry.counter(
+    'audio_cache_lookups_total', "Spoken TwiML elements looked up in the audio cache", ('outcome',))
+audio_renders = registry.counter(
+    'audio_renders_total', "Audio cache renders by outcome", ('outcome',))
+
+
+def audio_key(text, voice, language):
+    """Content hash of a spoken message; whitespace differences don't matter"""
+    normalized = ' '.join(text.split())
+    return hashlib.sha256(f"{voice}\0{language}\0{normalized}".encode()).hexdigest()
+
+
+class AudioCache:
+    """Content-addressed store of rendered speech, used to swap <Say> for <Play>"""
+
+    def __init__(self, directory, base_url='', workers=2, max_pending=100, render_on_miss=False):
+        """
+        Args:
+            directory: Where audio files are stored; empty disables the cache
+            base_url: Prefix for <Play> URLs (default: relative to the TwiML URL)
+            workers: TTS processes
+            max_pending: Renders queued at once; further misses aren't queued
+            render_on_miss: Queue a render for every <Say> that isn't cached
+        """
+        self.directory = os.path.abspath(directory) if directory else None
+        self.base_url = base_url.rstrip('/')
+        self.workers = workers
+        self.max_pending = max_pending
+        self.render_on_miss = render_on_miss
+        self._known = None
+        self._pending = {}
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.directory is not None
+
+    @staticmethod
+    def renderer_available():
+        return importlib.util.find_spec('pyttsx3') is not None
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + AUDIO_SUFFIX)
+
+    def url(self, key):
+        return f"{self.base_url}/audio/{key}{AUDIO_SUFFIX}"
+
+    def contains(self, key):
+        with self._lock:
+            if self._known is None:
+                self._known = self._scan()
+            if key in self._known:
+                return True
+        # Rendered by another process (e.g. the pre-render command) since the scan
+        if os.path.exists(self.path(key)):
+            with self._lock:
+                self._known.add(key)
+            return True
+        return False
+
+    def play_cached(self, twiml):
+        """
+        Replace every cached <Say> in a TwiML document with <Play>
+
+        Uncached ones are left alone and, with render_on_miss, queued for
+        rendering.
+        """
+        if not self.enabled or '<Say' not in twiml:
+            return twiml
+
+        def replace(match):
+            attrs = dict(_ATTR.findall(match.group(1)))
+            if set(attrs) - {'voice', 'language'}:
+                return match.group(0)
+            text = unescape(match.group(2), {'&quot;': '"', '&apos;': "'"})
+            voice = attrs.get('voice', '')
+            language = attrs.get('language', '')
+            key = audio_key(text, voice, language)
+            if self.contains(key):
+                audio_lookups.inc('hit')
+                return f"<Play>{escape(self.url(key))}</Play>"
+            audio_lookups.inc('miss')
+            if self.render_on_miss:
+                try:
+                    self.submit(text, voice, language)
+                except Exception as e:
+                    # Twilio still speaks the <Say>; a broken renderer mustn't fail the call
+                    audio_renders.inc('failed')
+                    logger.error("Couldn't queue audio render %s: %s", key[:12], e)
+            return match.group(0)
+
+        return _SAY.sub(replace, twiml)
+
+    def submit(self, text, voice, language):
+        """
+        Queue one message for rendering in the process pool
+
+        Returns:
+            The key, or None if the renderer is missing or the queue is full
+        """
+        key = audio_key(text, voice, language)
+        with self._lock:
+            if key in self._pending:
+                return key
+            if len(self._pending) >= self.max_pending:
+                audio_renders.inc('dropped')
+                return None
+            pool = self._get_pool()
+            if pool is None:
+                return None
+            future = pool.submit(render_audio, ' '.join(text.split()), voice, language, self.path(key))
+            self._pending[key] = future
+        future.add_done_callback(lambda done: self._rendered(key, done))
+        return key
+
+    def render_all(self, items):
+        """
+        Render (text, voice, language) triples that aren't cached yet and
+        wait for them
+
+        Returns:
+            (rendered, already_cached, failed) counts
+        """
+        submitted = {}
+        cached = 0
+        for text, voice, language in set(items):
+            key = audio_key(text, voice, language)
+            if self.contains(key):
+                cached += 1
+                continue
+            pool = self._get_pool()
+            if pool is None:
+                raise RuntimeError("pyttsx3 is not installed; can't render audio")
+            submitted[key] = pool.submit(render_audio, ' '.join(text.split()), voice, language, self.path(key))
+
+        rendered = failed = 0
+        for key, future in submitted.items():
+            self._rendered(key, future)
+            if future.exception() is None:
+                rendered += 1
+            else:
+                failed += 1
+        return rendered, cached, failed
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def _get_pool(self):
+        # Started on the first render so processes that only serve cached audio never spawn one
+        if self._pool is None:
+            if not self.renderer_available():
+                return None
+            # spawn, not fork: the web server process is multi-threaded
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def _rendered(self, key, future):
+        error = future.exception()
+        with self._lock:
+            self._pending.pop(key, None)
+            if error is None and self._known is not None:
+                self._known.add(key)
+        if error is None:
+            audio_renders.inc('rendered')
+        else:
+            audio_renders.inc('failed')
+            logger.error("Audio render %s failed: %s", key[:12], error)
+
+    def _scan(self):
+        known = set()
+        if not os.path.isdir(self.directory):
+            return known
+        for shard in os.scandir(self.directory):
+            if shard.is_dir():
+                known.update(entry.name[:-len(AUDIO_SUFFIX)] for entry in os.scandir(shard.path)
+                             if entry.name.endswith(AUDIO_SUFFIX))
+        return known
+
+
+_engine = None
+
+
+def render_audio(text, voice, language, path):
+    """Synthesize text to an audio file (runs in a pool process)"""
+    global _engine
+    import pyttsx3
+
+    if _engine is None:
+        _engine = pyttsx3.init()
+    gender = VOICE_GENDERS.get(voice)
+    default_voice = _engine.getProperty('voice')
+    for engine_voice in _engine.getProperty('voices'):
+        if gender and (getattr(engine_voice, 'gender', None) or '').lower() == gender:
+            _engine.setProperty('voice', engine_voice.id)
+            break
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write next to the target and rename, so a half-written file is never served
+    partial = f"{path}.{os.getpid()}.partial{AUDIO_SUFFIX}"
+    try:
+        _engine.save_to_file(text, partial)
+        _engine.runAndWait()
+        if not os.path.exists(partial) or os.path.getsize(partial) == 0:
+            raise RuntimeError("TTS engine produced no audio")
+        os.replace(partial, path)
+    finally:
+        _engine.setProperty('voice', default_voice)
+        if os.path.exists(partial):
+            os.remove(partial)
+    return path
+
+
+def spoken_texts(twiml):
+    """(text, voice, language) of every <Say> in a TwiML document without template slots"""
+    items = []
+    for attrs, body in _SAY.findall(twiml):
+        attrs = dict(_ATTR.findall(attrs))
+        if set(attrs) - {'voice', 'language'} or re.search(r'\{\w+\}', body):
+            continue
+        text = unescape(body, {'&quot;': '"', '&apos;': "'"}).replace('{{', '{').replace('}}', '}')
+        items.append((text, attrs.get('voice', ''), attrs.get('language', '')))
+    return items
+
+
+# Shared cache used by the voice routes
+audio_cache = AudioCache(AUDIO_CACHE_DIR, base_url=AUDIO_CACHE_BASE_URL, workers=AUDIO_CACHE_WORKERS,
+                         max_pending=AUDIO_CACHE_MAX_PENDING, render_on_miss=AUDIO_CACHE_RENDER_ON_MISS)
+
+
+def main():
+    import argparse
+
+    from voice_routes import static_prompts
+
+    parser = argparse.ArgumentParser(description="Pre-render every static voice prompt into the audio cache")
+    parser.add_argument('--workers', type=int, default=AUDIO_CACHE_WORKERS)
+    args = parser.parse_args()
+
+    if not audio_cache.enabled:
+        print("❌ AUDIO_CACHE_DIR is empty; the audio cache is disabled")
+        return
+    audio_cache.workers = args.workers
+    items = static_prompts()
+    print(f"🔊 Rendering {len(set(items))} static prompts into {audio_cache.directory} ({args.workers} workers)")
+    try:
+        rendered, cached, failed = audio_cache.render_all(items)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return
+    finally:
+        audio_cache.shutdown()
+    print(f"✅ {rendered} rendered, {cached} already cached, {failed} failed")
+
+
+if __name__ == "__main__":
+    main()
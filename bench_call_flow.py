@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+End-to-End Call Flow Load Test
+Runs the booking -> arrival -> feedback call flow for many passengers at
+once, entirely offline: the app is served on a local port with its Twilio
+client pointed at fake_twilio.FakeTwilio, which plays every call back into
+/twiml/<call_type> and answers each <Gather> on /handle-*-response with a
+simulated keypress.
+
+Usage: python bench_call_flow.py [passengers] [concurrency] [--latency-ms N]
+                                 [--error-rate F] [--ring-ms N] [--think-ms N]
+                                 [--cps N]
+"""
+
+import argparse
+import logging
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ROOT)
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from fake_twilio import FakeTwilio
+
+FLOW = ('booking', 'arrival', 'feedback')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_app(fake_url, app_port, db_path, workers, cps):
+    """Import and serve the app, configured to call the fake Twilio"""
+    os.environ.update({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{db_path}",
+        'TWILIO_ACCOUNT_SID': 'AC' + '0' * 32,
+        'TWILIO_AUTH_TOKEN': 'fake-token',
+        'TWILIO_PHONE_NUMBER': '+15005550006',
+        'TWILIO_API_BASE': fake_url,
+        'NGROK_BASE': f"http://127.0.0.1:{app_port}",
+        'CALL_DISPATCH_WORKERS': str(workers),
+        'TWILIO_CALLS_PER_SECOND': str(cps)
+    })
+    from werkzeug.serving import make_server
+    import app as weride
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    weride.create_tables()
+    server = make_server('127.0.0.1', app_port, weride.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return weride, server
+
+
+def run_passenger(session, base, index):
+    """Book a ride, then trigger the arrival and feedback calls"""
+    phone = f"+9230{index:08d}"
+    session.post(f"{base}/book", data={'name': f"Passenger {index}", 'phone': phone,
+                                       'pickup': 'Clifton', 'destination': 'Saddar'}).raise_for_status()
+    for call_type in FLOW[1:]:
+        session.post(f"{base}/api/trigger-call", json={'phone': phone, 'type': call_type}).raise_for_status()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline booking/arrival/feedback call flow load test")
+    parser.add_argument('passengers', nargs='?', type=int, default=500)
+    parser.add_argument('concurrency', nargs='?', type=int, default=16)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--ring-ms', type=float, default=200)
+    parser.add_argument('--think-ms', type=float, default=200)
+    parser.add_argument('--dispatch-workers', type=int, default=8)
+    parser.add_argument('--cps', type=float, default=0, help="outbound calls per second (0: unlimited)")
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    fake = FakeTwilio(latency=args.latency_ms / 1000, error_rate=args.error_rate,
+                      ring_seconds=args.ring_ms / 1000, think_seconds=args.think_ms / 1000,
+                      digits='12', seed=1)
+    fake_url = fake.start(port=0)
+    app_port = free_port()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        weride, server = start_app(fake_url, app_port, os.path.join(tmp, 'flow.db'),
+                                  args.dispatch_workers, args.cps)
+        base = f"http://127.0.0.1:{app_port}"
+        session = requests.Session()
+        session.mount('http://', HTTPAdapter(pool_maxsize=args.concurrency))
+
+        expected = args.passengers * len(FLOW)
+        print(f"📞 {args.passengers} passengers x {len(FLOW)} calls, {args.concurrency} concurrent clients, "
+              f"fake API latency {args.latency_ms:.0f} ms, error rate {args.error_rate:.1%}")
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(lambda index: run_passenger(session, base, index), range(args.passengers)))
+        triggered = time.perf_counter()
+
+        # Wait for the dispatcher to place every call, then for the calls to end
+        deadline = time.monotonic() + args.timeout
+        with weride.app.app_context():
+            while time.monotonic() < deadline:
+                states = Counter(status for (status,) in weride.db.session.query(weride.CallJob.status))
+                weride.db.session.rollback()
+                if states['queued'] + states['in_progress'] == 0 and sum(states.values()) >= expected:
+                    break
+                time.sleep(0.1)
+        idle = fake.wait_idle(max(0.0, deadline - time.monotonic()))
+        finished = time.perf_counter()
+
+        stats = fake.stats()
+        print(f"⏱️  triggers: {expected / (triggered - started):.0f} calls/s queued in {triggered - started:.2f}s")
+        print(f"⏱️  end to end: {expected / (finished - started):.0f} calls/s, all calls ended in "
+              f"{finished - started:.2f}s{'' if idle else ' (timed out)'}")
+        print(f"📋 call jobs: {dict(states)}")
+        print(f"📞 fake twilio: created={stats['calls_created']} completed={stats['calls_completed']} "
+              f"failed={stats['calls_failed']} injected_errors={stats['api_errors_injected']}")
+        print(f"🔁 webhooks: {stats['webhooks']} ({stats['webhook_errors']} failed), keypresses: {stats['digits_sent']}")
+        if 'webhook_ms' in stats:
+            latency = stats['webhook_ms']
+            print(f"   webhook latency ms: p50={latency['p50']:.1f} p95={latency['p95']:.1f} "
+                  f"p99={latency['p99']:.1f} max={latency['max']:.1f}")
+
+        server.shutdown()
+        weride.call_dispatcher.shutdown()
+        weride.call_log.flush_all()
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
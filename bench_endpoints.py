@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Endpoint Load Test
+Drives the hot endpoints with a seeded dataset at a fixed concurrency and
+reports throughput and p50/p95/p99 latency per scenario. Requests go through
+the Flask test client in-process, or over HTTP to a local threaded server.
+Results can be written as JSON (stable key order, so two runs diff cleanly)
+and compared against an earlier run.
+
+SQLite runs on a throwaway file. For PostgreSQL pass --db-url and --reset;
+--reset DROPS AND RECREATES every table in that database.
+
+Twilio is left unconfigured, so call-triggering endpoints take the demo-mode
+path and the numbers measure our own code rather than the Twilio API.
+
+Usage:
+    python bench_endpoints.py                          # all scenarios, SQLite, in-process
+    python bench_endpoints.py --mode http -c 32 -n 5000
+    python bench_endpoints.py --db-url postgresql://localhost/weride_bench --reset
+    python bench_endpoints.py --json after.json --compare before.json
+    python bench_endpoints.py --scenarios available-rides,dashboard --drivers 5000 --rides 50000
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ROOT)
+
+# Karachi, where the seeded drivers and rides are scattered
+CENTER_LAT, CENTER_LNG = 24.8607, 67.0011
+
+
+def scenarios(ctx):
+    """scenario name -> function(i) returning (method, path, request kwargs)"""
+    rng = ctx['rng']
+
+    def create_ride(i):
+        return 'POST', '/api/create-ride', {'json': {
+            'name': f"Bench Passenger {i}",
+            'phone': rng.choice(ctx['passenger_phones']),
+            'pickup': 'Clifton Block 5',
+            'destination': 'Saddar',
+            'price_offer': 450,
+            'pickup_lat': CENTER_LAT + rng.uniform(-0.1, 0.1),
+            'pickup_lng': CENTER_LNG + rng.uniform(-0.1, 0.1)
+        }}
+
+    def make_offer(i):
+        return 'POST', '/api/make-offer', {'json': {
+            'ride_id': rng.choice(ctx['pending_ride_ids']),
+            'driver_phone': rng.choice(ctx['driver_phones']),
+            'driver_name': 'Bench Driver',
+            'offered_price': 500,
+            'pickup_time': 6
+        }}
+
+    def accept_offer(i):
+        return 'POST', '/api/accept-offer', {'json': {'offer_id': ctx['offer_ids'][i % len(ctx['offer_ids'])]}}
+
+    def update_location(i):
+        return 'POST', '/api/update-driver-location', {'json': {
+            'driver_phone': rng.choice(ctx['driver_phones']),
+            'lat': CENTER_LAT + rng.uniform(-0.2, 0.2),
+            'lng': CENTER_LNG + rng.uniform(-0.2, 0.2)
+        }}
+
+    return {
+        'twiml': lambda i: ('POST', '/twiml/arrival', {}),
+        'twiml-enhanced': lambda i: ('POST', '/twiml-enhanced?call_type=driver_arrived&driver_name=Ahmed&plate=ABC-123', {}),
+        'voice-response': lambda i: ('POST', '/handle-feedback-response-enhanced', {'data': {'Digits': str(i % 5 + 1)}}),
+        'available-rides': lambda i: ('GET', '/api/available-rides?limit=50', {}),
+        'online-drivers': lambda i: ('GET', '/api/online-drivers', {}),
+        'dashboard': lambda i: ('GET', '/dashboard', {}),
+        'update-driver-location': update_location,
+        'make-offer': make_offer,
+        'create-ride': create_ride,
+        'accept-offer': accept_offer,
+    }
+
+
+# ─────────── DATASET ───────────
+def seed(weride, drivers, rides, offers, rng):
+    """Insert passengers, online drivers, pending/accepted rides and pending offers"""
+    from sqlalchemy import insert
+    db, User, Driver, Ride, RideOffer = weride.db, weride.User, weride.Driver, weride.Ride, weride.RideOffer
+
+    passengers = max(rides // 5, 10)
+    now = datetime.utcnow()
+    db.session.execute(insert(User), [
+        {'name': f"Passenger {n}", 'phone': f"+9231{n:08d}", 'user_type': 'passenger'} for n in range(passengers)
+    ] + [
+        {'name': f"Driver {n}", 'phone': f"+9232{n:08d}", 'user_type': 'driver'} for n in range(drivers)
+    ])
+    passenger_ids = [row.id for row in db.session.query(User.id).filter_by(user_type='passenger')]
+    driver_ids = [row.id for row in db.session.query(User.id).filter_by(user_type='driver')]
+
+    db.session.execute(insert(Driver), [{
+        'user_id': user_id,
+        'license_number': f"LIC-{user_id}",
+        'license_plate': f"KHI-{user_id}",
+        'vehicle_make': 'Toyota',
+        'vehicle_model': 'Corolla',
+        'is_online': n % 4 != 0,
+        'current_lat': CENTER_LAT + rng.uniform(-0.2, 0.2),
+        'current_lng': CENTER_LNG + rng.uniform(-0.2, 0.2),
+        'last_location_update': now
+    } for n, user_id in enumerate(driver_ids)])
+
+    # Half the drivers are on an accepted ride, so location updates also write tracking rows
+    busy = driver_ids[::2]
+    db.session.execute(insert(Ride), [{
+        'passenger_id': rng.choice(passenger_ids),
+        'driver_id': busy[n] if n < len(busy) else None,
+        'pickup_address': f"Pickup {n}",
+        'destination_address': f"Destination {n}",
+        'passenger_offer': rng.randint(200, 1500),
+        'status': 'accepted' if n < len(busy) else 'pending',
+        'requested_at': now - timedelta(seconds=rides - n)
+    } for n in range(rides)])
+    pending_ride_ids = [row.id for row in db.session.query(Ride.id).filter_by(status='pending')]
+
+    # One pending offer per accept-offer request, each on its own ride
+    offer_rides = pending_ride_ids[-offers:]
+    db.session.execute(insert(RideOffer), [{
+        'ride_id': ride_id,
+        'driver_id': rng.choice(driver_ids),
+        'offered_price': 500,
+        'estimated_pickup_time': 5
+    } for ride_id in offer_rides])
+    db.session.commit()
+
+    return {
+        'passenger_phones': [f"+9231{n:08d}" for n in range(passengers)],
+        'driver_phones': [f"+9232{n:08d}" for n in range(drivers)],
+        'pending_ride_ids': pending_ride_ids[:-offers] or pending_ride_ids,
+        'offer_ids': [row.id for row in db.session.query(RideOffer.id).filter(RideOffer.ride_id.in_(offer_rides))]
+    }
+
+
+# ─────────── DRIVERS ───────────
+class InProcessClient:
+    """One Flask test client per thread"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, **kwargs):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client.open(path, method=method, **kwargs).status_code
+
+
+class HttpClient:
+    """One keep-alive requests.Session per thread against a local server"""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url
+        self._requests = requests
+        self._local = threading.local()
+
+    def request(self, method, path, **kwargs):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        return session.request(method, self.base_url + path, **kwargs).status_code
+
+
+def serve(app):
+    import logging
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{port}"
+
+
+def run_scenario(client, build, requests_total, concurrency, warmup):
+    """Fire `requests_total` requests from `concurrency` threads; returns the result dict"""
+    for i in range(warmup):
+        method, path, kwargs = build(i)
+        client.request(method, path, **kwargs)
+
+    counter = itertools.count(warmup)
+    end = warmup + requests_total
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        mine, failed = [], 0
+        while True:
+            i = next(counter)
+            if i >= end:
+                break
+            method, path, kwargs = build(i)
+            started = time.perf_counter()
+            try:
+                status = client.request(method, path, **kwargs)
+            except Exception:
+                status = 599
+            mine.append(time.perf_counter() - started)
+            failed += status >= 400
+        with lock:
+            latencies.extend(mine)
+            errors.append(failed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies) * 1000, 3),
+            'p50': round(percentile(latencies, 50) * 1000, 3),
+            'p95': round(percentile(latencies, 95) * 1000, 3),
+            'p99': round(percentile(latencies, 99) * 1000, 3),
+            'max': round(latencies[-1] * 1000, 3)
+        }
+    }
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of a sorted list"""
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+# ─────────── REPORTING ───────────
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    print(f"{'scenario':<24}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+          + (f"{'Δ req/s':>10}{'Δ p95':>9}" if baseline else ''))
+    for name, result in results.items():
+        latency = result['latency_ms']
+        line = (f"{name:<24}{result['throughput_rps']:>9.0f}{latency['p50']:>9.2f}{latency['p95']:>9.2f}"
+                f"{latency['p99']:>9.2f}{result['errors']:>8}")
+        before = (baseline or {}).get(name)
+        if before:
+            line += (f"{_change(before['throughput_rps'], result['throughput_rps']):>10}"
+                     f"{_change(before['latency_ms']['p95'], latency['p95']):>9}")
+        print(line)
+
+
+def _change(before, after):
+    return f"{(after - before) / before * 100:+.0f}%" if before else 'n/a'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the WeRide endpoints")
+    parser.add_argument('--mode', choices=('inprocess', 'http'), default='inprocess')
+    parser.add_argument('--db-url', help="database to run against (default: temporary SQLite file)")
+    parser.add_argument('--reset', action='store_true', help="drop and recreate all tables in --db-url")
+    parser.add_argument('-c', '--concurrency', type=int, default=8)
+    parser.add_argument('-n', '--requests', type=int, default=1000, help="measured requests per scenario")
+    parser.add_argument('--warmup', type=int, default=20, help="unmeasured requests per scenario")
+    parser.add_argument('--drivers', type=int, default=500)
+    parser.add_argument('--rides', type=int, default=5000)
+    parser.add_argument('--scenarios', help="comma-separated subset to run")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--compare', help="earlier --json output to compare against")
+    args = parser.parse_args()
+
+    if args.db_url and not args.reset:
+        parser.error("--db-url needs --reset: the benchmark drops and reseeds every table")
+
+    tmp = tempfile.TemporaryDirectory()
+    db_url = args.db_url or f"sqlite:///{os.path.join(tmp.name, 'bench.db')}"
+    os.environ['SQLALCHEMY_DATABASE_URI'] = db_url
+    # Demo mode: measure our handlers, not the Twilio API
+    for name in ('TWILIO_ACCOUNT_SID', 'TWILIO_AUTH_TOKEN'):
+        os.environ[name] = ''
+
+    import app as weride
+
+    rng = random.Random(args.seed)
+    with weride.app.app_context():
+        weride.db.drop_all()
+        weride.db.create_all()
+        ctx = seed(weride, args.drivers, args.rides, args.requests + args.warmup, rng)
+    ctx['rng'] = rng
+
+    available = scenarios(ctx)
+    selected = args.scenarios.split(',') if args.scenarios else list(available)
+    unknown = [name for name in selected if name not in available]
+    if unknown:
+        parser.error(f"unknown scenario(s) {', '.join(unknown)}; choose from {', '.join(available)}")
+
+    server = None
+    if args.mode == 'http':
+        server, base_url = serve(weride.app)
+        client = HttpClient(base_url)
+    else:
+        client = InProcessClient(weride.app)
+
+    dialect = db_url.split(':', 1)[0]
+    print(f"⏱️  {args.requests} requests/scenario, concurrency {args.concurrency}, {args.mode}, {dialect}, "
+          f"{args.drivers} drivers, {args.rides} rides")
+
+    results = {}
+    for name in selected:
+        results[name] = run_scenario(client, available[name], args.requests, args.concurrency, args.warmup)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+
+    if args.json:
+        report = {
+            'meta': {
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'mode': args.mode,
+                'database': dialect,
+                'concurrency': args.concurrency,
+                'requests': args.requests,
+                'warmup': args.warmup,
+                'drivers': args.drivers,
+                'rides': args.rides,
+                'seed': args.seed
+            },
+            'results': results
+        }
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"📝 Results written to {args.json}")
+
+    if server is not None:
+        server.shutdown()
+    weride.call_log.flush_all()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
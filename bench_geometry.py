@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Distance and ETA Benchmark
+Times haversine distance plus ETA for the same random pairs two ways:
+
+  python   a loop over the pairs with the math module
+  numpy    geometry.trip_estimates() over the whole batch
+  pickup   geometry.pickup_etas(): every driver against one pickup
+
+and checks the two agree. With --rides N it also backfills estimates for N
+pending rides in a temporary SQLite database via fill_ride_estimates().
+
+Usage: python bench_geometry.py [pairs] [--rides N]
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from flask import Flask
+
+from config import ETA_SPEED_KMH, ROAD_DISTANCE_FACTOR
+from db.models import db, User, Ride
+from geometry import EARTH_RADIUS_KM, fill_ride_estimates, pickup_etas, trip_estimates
+
+CITY = (24.86, 67.01)
+SPREAD_DEG = 0.08
+
+
+def python_estimates(pairs):
+    distances = []
+    minutes = []
+    for lat1, lng1, lat2, lng2 in pairs:
+        phi1, phi2 = math.radians(lat1), math.radians(lat2)
+        a = (math.sin((phi2 - phi1) / 2) ** 2
+             + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+        distance = 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0))) * ROAD_DISTANCE_FACTOR
+        distances.append(distance)
+        minutes.append(max(math.ceil(distance / ETA_SPEED_KMH * 60), 1))
+    return distances, minutes
+
+
+def best_of(runs, function, *args):
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def backfill(rides, rng):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'rides.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            db.session.execute(User.__table__.insert(), [{'name': 'Passenger', 'phone': '+10000000000'}])
+            db.session.execute(Ride.__table__.insert(), [
+                {'passenger_id': 1, 'pickup_address': 'pickup', 'destination_address': 'destination',
+                 'passenger_offer': 500, 'status': 'pending',
+                 'pickup_lat': CITY[0] + rng.gauss(0, SPREAD_DEG), 'pickup_lng': CITY[1] + rng.gauss(0, SPREAD_DEG),
+                 'destination_lat': CITY[0] + rng.gauss(0, SPREAD_DEG),
+                 'destination_lng': CITY[1] + rng.gauss(0, SPREAD_DEG)}
+                for _ in range(rides)
+            ])
+            db.session.commit()
+
+            started = time.perf_counter()
+            updated = fill_ride_estimates()
+            elapsed = time.perf_counter() - started
+    print(f"\nbackfill: {updated} pending rides estimated in {elapsed:.2f}s ({updated / elapsed:,.0f} rides/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pure Python vs NumPy distance and ETA")
+    parser.add_argument('pairs', nargs='?', type=int, default=100_000)
+    parser.add_argument('--rides', type=int, default=0, help="Also backfill this many pending rides in SQLite")
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    pairs = [(CITY[0] + rng.gauss(0, SPREAD_DEG), CITY[1] + rng.gauss(0, SPREAD_DEG),
+              CITY[0] + rng.gauss(0, SPREAD_DEG), CITY[1] + rng.gauss(0, SPREAD_DEG)) for _ in range(args.pairs)]
+    columns = np.array(pairs).T
+
+    python_time, (distances, minutes) = best_of(3, python_estimates, pairs)
+    numpy_time, (np_distances, np_minutes) = best_of(3, trip_estimates, *columns)
+    pickup_time, _ = best_of(3, pickup_etas, CITY[0], CITY[1], columns[2], columns[3])
+    convert_time, _ = best_of(3, lambda: np.array(pairs).T)
+
+    print(f"⏱️  {args.pairs:,} pairs, best of 3")
+    print(f"python   {python_time * 1000:9.1f} ms")
+    print(f"numpy    {numpy_time * 1000:9.1f} ms  ({python_time / numpy_time:.0f}x; "
+          f"+{convert_time * 1000:.1f} ms to build arrays from tuples)")
+    print(f"pickup   {pickup_time * 1000:9.1f} ms  (all drivers against one pickup)")
+    print(f"max distance difference {np.max(np.abs(np_distances - distances)):.2e} km, "
+          f"ETA mismatches {int(np.sum(np_minutes != minutes))}")
+
+    if args.rides:
+        backfill(args.rides, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Batch Matching Benchmark
+Generates pending rides and idle drivers scattered over a city and times
+one matching round:
+
+  candidates  sparse candidate graph from the spatial prefilter
+  greedy      oldest ride first takes its cheapest free candidate (baseline)
+  auction     the global assignment used by MatchingEngine
+  round       a full MatchingEngine.run_once() against a temporary SQLite
+              database: load, candidates + assign, and the offer INSERT,
+              once with the auction in this process and once in the child
+              process, with how much of its usual throughput a busy thread
+              of this process kept meanwhile (what request threads get)
+
+Usage: python bench_matching.py [rides] [drivers] [--candidates K] [--radius KM] [--max-rides N] [--no-db]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+
+from db.models import db, User, Driver, Ride
+from geometry import trip_estimates
+from matching import MatchingEngine, assign
+
+CITY = (24.86, 67.01)
+SPREAD_DEG = 0.08
+
+
+def generate(rides, drivers, seed=7):
+    rng = random.Random(seed)
+
+    def point():
+        return CITY[0] + rng.gauss(0, SPREAD_DEG), CITY[1] + rng.gauss(0, SPREAD_DEG)
+
+    ride_rows = []
+    for index in range(rides):
+        (lat, lng), (dest_lat, dest_lng) = point(), point()
+        ride_rows.append((index, lat, lng, dest_lat, dest_lng, round(rng.uniform(200, 1500))))
+    driver_rows = [(index,) + point() + (rng.uniform(100, 600),) for index in range(drivers)]
+    return ride_rows, driver_rows
+
+
+def greedy(candidates):
+    """Each ride in order takes its cheapest candidate nobody has taken yet"""
+    taken = set()
+    chosen = []
+    for ride_edges in candidates:
+        pick = None
+        for driver, _ in sorted(ride_edges, key=lambda edge: edge[1]):
+            if driver not in taken:
+                pick = driver
+                taken.add(driver)
+                break
+        chosen.append(pick)
+    return chosen
+
+
+def report(label, seconds, candidates, chosen):
+    costs = [dict(ride_edges)[driver] for ride_edges, driver in zip(candidates, chosen) if driver is not None]
+    print(f"{label:<12}{seconds:>9.3f}s{len(costs):>9}{sum(costs):>13.1f}"
+          f"{(sum(costs) / len(costs) if costs else 0.0):>10.3f}")
+
+
+def in_memory(engine, ride_rows, driver_rows):
+    trip_km, _ = trip_estimates(*zip(*(row[1:5] for row in ride_rows)))
+    rides = [(ride_id, -1 - ride_id, lat, lng, km, offer)
+             for (ride_id, lat, lng, _, _, offer), km in zip(ride_rows, trip_km.tolist())]
+    drivers = [(1_000_000 + index, lat, lng, rate) for index, lat, lng, rate in driver_rows]
+
+    started = time.perf_counter()
+    edges = engine.candidate_edges(rides, drivers)
+    built = time.perf_counter() - started
+    candidates = [[(driver, cost) for driver, cost, _, _, _ in ride_edges] for ride_edges in edges]
+    print(f"candidate graph: {sum(map(len, candidates))} edges in {built:.3f}s")
+
+    print(f"\n{'':<12}{'time':>10}{'matched':>9}{'total cost':>13}{'mean':>10}")
+    started = time.perf_counter()
+    chosen = greedy(candidates)
+    report('greedy', time.perf_counter() - started, candidates, chosen)
+
+    started = time.perf_counter()
+    chosen = assign(candidates)
+    report('auction', time.perf_counter() - started, candidates, chosen)
+
+
+def spin(stop, counts):
+    """Busy pure-Python work until stop is set, counting iterations"""
+    count = 0
+    while not stop.is_set():
+        for _ in range(1000):
+            pass
+        count += 1
+    counts.append(count)
+
+
+def spin_rate(seconds):
+    """Iterations per second of spin() with nothing else running"""
+    stop = threading.Event()
+    counts = []
+    thread = threading.Thread(target=spin, args=(stop, counts))
+    thread.start()
+    time.sleep(seconds)
+    stop.set()
+    thread.join()
+    return counts[0] / seconds
+
+
+def full_round(engine, ride_rows, driver_rows, db_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
+    db.init_app(app)
+    engine.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(User.__table__.insert(), [
+            {'name': f"Driver {index}", 'phone': f"+1{index:09d}", 'user_type': 'driver'}
+            for index, _, _, _ in driver_rows
+        ] + [
+            {'name': f"Passenger {index}", 'phone': f"+2{index:09d}", 'user_type': 'passenger'}
+            for index, _, _, _, _, _ in ride_rows
+        ])
+        db.session.execute(Driver.__table__.insert(), [
+            {'user_id': index + 1, 'license_number': f"L{index}", 'license_plate': f"P{index}",
+             'is_online': True, 'current_lat': lat, 'current_lng': lng, 'hourly_rate': rate}
+            for index, lat, lng, rate in driver_rows
+        ])
+        db.session.execute(Ride.__table__.insert(), [
+            {'passenger_id': len(driver_rows) + index + 1, 'pickup_address': 'pickup',
+             'destination_address': 'destination', 'pickup_lat': lat, 'pickup_lng': lng,
+             'destination_lat': dest_lat, 'destination_lng': dest_lng, 'passenger_offer': offer,
+             'status': 'pending'}
+            for index, lat, lng, dest_lat, dest_lng, offer in ride_rows
+        ])
+        db.session.commit()
+
+        # The child process is started before timing, as it would be after a server's first round
+        if engine.isolate:
+            engine._get_pool().submit(int).result()
+        solo = spin_rate(0.5)
+        stop = threading.Event()
+        counts = []
+        spinner = threading.Thread(target=spin, args=(stop, counts))
+        spinner.start()
+        started = time.perf_counter()
+        summary = engine.run_once()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        spinner.join()
+    engine.stop()
+
+    seconds = summary['seconds']
+    print(f"\nround ({'child process' if engine.isolate else 'in process'}): {summary['offers']} offers for "
+          f"{summary['rides']} rides and {summary['drivers']} drivers in {elapsed:.2f}s (load {seconds['load']:.2f}s, "
+          f"candidates + assign {seconds['assign']:.2f}s, write {seconds['write']:.2f}s), "
+          f"busy thread kept {100 * counts[0] / elapsed / solo:.0f}% of its throughput")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time a batch matching round")
+    parser.add_argument('rides', nargs='?', type=int, default=10000)
+    parser.add_argument('drivers', nargs='?', type=int, default=10000)
+    parser.add_argument('--candidates', type=int, default=8)
+    parser.add_argument('--radius', type=float, default=5.0)
+    parser.add_argument('--max-rides', type=int, default=2000, help="Rides per round in the full round")
+    parser.add_argument('--no-db', action='store_true', help="Skip the full round against SQLite")
+    args = parser.parse_args()
+
+    engine = MatchingEngine(radius_km=args.radius, candidates=args.candidates, isolate=False)
+    ride_rows, driver_rows = generate(args.rides, args.drivers)
+    print(f"⏱️  {args.rides} rides x {args.drivers} drivers, {args.candidates} candidates within {args.radius:.0f} km")
+    in_memory(engine, ride_rows, driver_rows)
+
+    if not args.no_db:
+        with tempfile.TemporaryDirectory() as tmp:
+            for isolate in (False, True):
+                engine = MatchingEngine(radius_km=args.radius, candidates=args.candidates,
+                                        max_rides=args.max_rides, isolate=isolate)
+                full_round(engine, ride_rows, driver_rows, os.path.join(tmp, f"matching-{isolate}.db"))
+
+
+if __name__ == "__main__":
+    main()
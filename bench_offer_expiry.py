@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Offer Expiry Benchmark
+Fills a temporary SQLite database with stale and fresh pending offers and
+rides, then expires them with ExpirySweeper while another thread keeps
+writing new offers, as make-offer requests would. This is done twice:
+in batches of --batch rows, and as one UPDATE over everything (batch
+larger than the table). Reported per mode: sweep time, rows expired, the
+longest batch (how long row locks were held), and the concurrent writer's
+worst and median latency.
+
+Usage: python bench_offer_expiry.py [offers] [rides] [--batch N]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+
+from db.models import db, User, Ride, RideOffer
+from offer_expiry import ExpirySweeper, expiry_batches
+
+
+def populate(app, offers, rides, rng):
+    now = datetime.utcnow()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(User.__table__.insert(), [
+            {'name': 'Passenger', 'phone': '+10000000000'},
+            {'name': 'Driver', 'phone': '+20000000000', 'user_type': 'driver'}
+        ])
+        # Rides 1..offers carry one offer each; the rest have none
+        db.session.execute(Ride.__table__.insert(), [
+            {'passenger_id': 1, 'pickup_address': 'pickup', 'destination_address': 'destination',
+             'passenger_offer': 500, 'status': 'pending',
+             'requested_at': now - timedelta(seconds=rng.uniform(0, 7200))}
+            for _ in range(offers + rides)
+        ])
+        db.session.execute(RideOffer.__table__.insert(), [
+            {'ride_id': ride_id, 'driver_id': 2, 'offered_price': 550, 'status': 'pending',
+             'created_at': now - timedelta(seconds=rng.uniform(0, 1200))}
+            for ride_id in range(1, offers + 1)
+        ])
+        db.session.commit()
+
+
+def writer(app, stop, latencies, ride_count):
+    rng = random.Random(1)
+    with app.app_context():
+        while not stop.is_set():
+            started = time.perf_counter()
+            db.session.add(RideOffer(ride_id=rng.randint(1, ride_count), driver_id=2, offered_price=600))
+            db.session.commit()
+            latencies.append(time.perf_counter() - started)
+            time.sleep(0.002)
+
+
+def run(label, offers, rides, batch_size, tmp):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, f'{label}.db')}"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 60}}
+    db.init_app(app)
+    populate(app, offers, rides, random.Random(9))
+    sweeper = ExpirySweeper(app, offer_ttl=600, ride_ttl=1800, batch_size=batch_size)
+
+    latencies = []
+    stop = threading.Event()
+    thread = threading.Thread(target=writer, args=(app, stop, latencies, offers + rides))
+    thread.start()
+    time.sleep(0.2)
+    longest = []
+    observe = expiry_batches.observe
+    expiry_batches.observe = lambda value, *labels: (longest.append(value), observe(value, *labels))
+    try:
+        with app.app_context():
+            summary = sweeper.run_once()
+    finally:
+        expiry_batches.observe = observe
+        time.sleep(0.2)
+        stop.set()
+        thread.join()
+
+    print(f"{label:<10}{summary['seconds']:>8.2f}s{summary['offers']:>9}{summary['rides']:>8}"
+          f"{max(longest) * 1000:>12.1f}ms{max(latencies) * 1000:>12.1f}ms"
+          f"{statistics.median(latencies) * 1000:>10.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the offer/ride expiry sweep under concurrent writes")
+    parser.add_argument('offers', nargs='?', type=int, default=100_000)
+    parser.add_argument('rides', nargs='?', type=int, default=50_000)
+    parser.add_argument('--batch', type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"⏱️  {args.offers} pending offers (about half stale), {args.rides} rides without offers")
+    print(f"\n{'':<10}{'sweep':>9}{'offers':>9}{'rides':>8}{'longest batch':>14}{'writer max':>12}{'median':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        run(f"batch {args.batch}", args.offers, args.rides, args.batch, tmp)
+        run("one shot", args.offers, args.rides, 10 * (args.offers + args.rides), tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Outbound Rate Limiter Benchmark
+Queues a burst of mixed call jobs (a reminder campaign, feedback and
+booking calls, with safety and arrival calls arriving mid-burst) on a
+CallDispatcher whose handler only waits for a rate limiter token, and
+reports how long each lane waited and how much was shed, for:
+
+  fifo        one queue and one token bucket, no lanes (before)
+  priority    lane-ordered dispatch and limiter with shedding (after)
+
+Usage: python bench_rate_limit.py [cps] [reminders] [--workers N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+
+from call_dispatch import CallDispatcher
+from db.models import db, CallJob
+from rate_limit import LANES, PriorityRateLimiter, lane_for, lane_priority, parse_shed_after
+
+URGENT = ('safety', 'arrival')
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def run(mode, cps, reminders, workers, shed_after, db_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
+    db.init_app(app)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+    prioritized = mode == 'priority'
+    limiter = PriorityRateLimiter(cps, shed_after=shed_after if prioritized else {}, channel=mode)
+
+    def handler(job):
+        waited = (datetime.utcnow() - job.created_at).total_seconds()
+        limiter.acquire(job.call_type if prioritized else None, waited)
+        return 'CA' + os.urandom(16).hex()
+
+    dispatcher = CallDispatcher(app, handler=handler, workers=workers,
+                                priority=lane_priority if prioritized else None)
+
+    started = time.monotonic()
+    with app.app_context():
+        jobs = [{'phone': f"+1{index:09d}", 'call_type': call_type, 'url': 'http://localhost/twiml'}
+                for call_type, count in (('campaign', reminders), ('feedback', reminders // 5), ('booking', reminders // 5))
+                for index in range(count)]
+        dispatcher.enqueue_many(jobs)
+
+    # Urgent calls trickle in while the burst is being worked off
+    def urgent():
+        with app.app_context():
+            for index in range(10):
+                for call_type in URGENT:
+                    dispatcher.enqueue(f"+2{index:09d}", call_type, 'http://localhost/twiml')
+                time.sleep(0.5)
+
+    thread = threading.Thread(target=urgent)
+    thread.start()
+    thread.join()
+
+    with app.app_context():
+        while db.session.query(CallJob.id).filter(CallJob.status.in_(('queued', 'in_progress'))).first():
+            db.session.rollback()
+            time.sleep(0.1)
+        rows = db.session.query(CallJob.call_type, CallJob.status, CallJob.created_at, CallJob.finished_at).all()
+    elapsed = time.monotonic() - started
+    dispatcher.shutdown()
+
+    waits = defaultdict(list)
+    shed = defaultdict(int)
+    for call_type, status, created_at, finished_at in rows:
+        lane = lane_for(call_type)
+        if status == 'failed':
+            shed[lane] += 1
+        else:
+            waits[lane].append((finished_at - created_at).total_seconds())
+
+    print(f"\n{mode}: {len(rows)} jobs in {elapsed:.1f}s")
+    print(f"{'lane':<11}{'placed':>8}{'shed':>7}{'p50 s':>9}{'p95 s':>9}{'max s':>9}")
+    for lane in LANES:
+        if waits[lane] or shed[lane]:
+            print(f"{lane:<11}{len(waits[lane]):>8}{shed[lane]:>7}{percentile(waits[lane], 0.5):>9.2f}"
+                  f"{percentile(waits[lane], 0.95):>9.2f}{max(waits[lane], default=0.0):>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-lane wait and shedding under a burst of outbound calls")
+    parser.add_argument('cps', nargs='?', type=float, default=50)
+    parser.add_argument('reminders', nargs='?', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--shed-after', default='arrival=2,booking=5,feedback=8,reminders=6')
+    args = parser.parse_args()
+
+    print(f"⏱️  {args.reminders} reminders + {args.reminders // 5} feedback + {args.reminders // 5} booking calls, "
+          f"then 10 safety + 10 arrival over 5s; {args.cps:.0f} calls/s, {args.workers} workers")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ('fifo', 'priority'):
+            run(mode, args.cps, args.reminders, args.workers, parse_shed_after(args.shed_after),
+                os.path.join(tmp, f"{mode}.db"))
+
+
+if __name__ == "__main__":
+    main()
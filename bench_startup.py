@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Cold Start Benchmark
+Measures what a fresh serverless instance pays before answering its first
+request: the import of api/index.py, then the first request for each route
+group. Every sample runs in a new interpreter so nothing is warm, and the
+heavy dependencies loaded by the end of the request are listed, which shows
+whether TwiML routes stayed clear of the database, Twilio REST and Firebase,
+along with the background threads left running (frozen between invocations
+on a serverless platform, so a cold request shouldn't start any).
+
+Usage: python bench_startup.py [runs]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# group -> (method, path, form data)
+ROUTE_GROUPS = {
+    'twiml': ('POST', '/twiml/booking', None),
+    'twiml-enhanced': ('POST', '/twiml-enhanced?call_type=driver_arrived&driver_name=Ahmed', None),
+    'voice-response': ('POST', '/handle-arrival-response-enhanced', {'Digits': '1'}),
+    'pages': ('GET', '/book', None),
+    'api-db': ('GET', '/api/available-rides', None),
+    'dashboard': ('GET', '/dashboard', None),
+}
+
+HEAVY_MODULES = ['sqlalchemy', 'flask_sqlalchemy', 'twilio.rest', 'firebase_admin', 'psycopg2']
+
+# Runs in the child interpreter
+PROBE = r'''
+import json, sys, threading, time
+method, path, data = json.loads(sys.argv[1])
+started = time.perf_counter()
+from api.index import app
+imported = time.perf_counter()
+from werkzeug.test import Client
+response = Client(app).open(path, method=method, data=data)
+finished = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (finished - imported) * 1000,
+    'status': response.status_code,
+    'loaded': [name for name in json.loads(sys.argv[2]) if name in sys.modules],
+    'threads': sorted(thread.name for thread in threading.enumerate() if thread is not threading.main_thread())
+}))
+'''
+
+
+def prepare_database(env):
+    """Create the schema once so DB routes answer 200 rather than erroring"""
+    subprocess.run(
+        [sys.executable, '-c', 'from app import create_tables; create_tables()'],
+        cwd=ROOT, env=env, check=True, capture_output=True
+    )
+
+
+def sample(group, env):
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE, json.dumps(ROUTE_GROUPS[group]), json.dumps(HEAVY_MODULES)],
+        cwd=ROOT, env=env, check=True, capture_output=True, text=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONPATH=ROOT,
+                   SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        prepare_database(env)
+
+        print(f"⏱️  Cold start, median of {runs} fresh interpreters per route group")
+        print(f"{'group':<16}{'status':>7}{'import ms':>11}{'1st req ms':>12}{'total ms':>10}{'threads':>9}  "
+              f"heavy modules loaded")
+        for group in ROUTE_GROUPS:
+            samples = [sample(group, env) for _ in range(runs)]
+            import_ms = statistics.median(s['import_ms'] for s in samples)
+            request_ms = statistics.median(s['first_request_ms'] for s in samples)
+            loaded = ', '.join(samples[-1]['loaded']) or '-'
+            threads = max(len(s['threads']) for s in samples)
+            print(f"{group:<16}{samples[-1]['status']:>7}{import_ms:>11.1f}{request_ms:>12.1f}"
+                  f"{import_ms + request_ms:>10.1f}{threads:>9}  {loaded}")
+            started = sorted({name for s in samples for name in s['threads']})
+            if started:
+                print(f"{'':<16}background threads: {', '.join(started)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Track Compaction Benchmark
+Fills a temporary SQLite database with finished rides whose GPS tracks
+follow a few straight road segments with GPS noise, runs TrackCompactor
+over them and reports RideTracking rows before and after, compaction
+throughput, and the largest distance of a dropped point from the
+simplified track (which must stay within the tolerance).
+
+Usage: python bench_track_compaction.py [rides] [points] [--tolerance M] [--noise M]
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+
+from db.models import db, User, Ride, RideTracking
+from driver_index import KM_PER_DEGREE
+from track_compaction import TrackCompactor, simplify
+
+CITY = (24.86, 67.01)
+METRES_PER_DEGREE = KM_PER_DEGREE * 1000
+
+
+def track(rng, points, noise_m):
+    """A drive along 3-8 straight segments, one ping every ~10 m, with GPS noise"""
+    lat, lng = CITY[0] + rng.uniform(-0.05, 0.05), CITY[1] + rng.uniform(-0.05, 0.05)
+    cos_lat = math.cos(math.radians(lat))
+    turns = sorted(rng.sample(range(1, points - 1), rng.randint(2, 7)))
+    heading = rng.uniform(0, 2 * math.pi)
+    result = []
+    for index in range(points):
+        if turns and index == turns[0]:
+            turns.pop(0)
+            heading += rng.choice((-1, 1)) * rng.uniform(math.pi / 6, math.pi / 2)
+        lat += 10 * math.cos(heading) / METRES_PER_DEGREE
+        lng += 10 * math.sin(heading) / (METRES_PER_DEGREE * cos_lat)
+        result.append((lat + rng.gauss(0, noise_m) / METRES_PER_DEGREE,
+                       lng + rng.gauss(0, noise_m) / (METRES_PER_DEGREE * cos_lat)))
+    return result
+
+
+def max_deviation(points, kept):
+    """Largest distance in metres from a dropped point to its simplified segment"""
+    cos_lat = math.cos(math.radians(points[0][0]))
+    xy = [(lng * METRES_PER_DEGREE * cos_lat, lat * METRES_PER_DEGREE) for lat, lng in points]
+    worst = 0.0
+    for first, last in zip(kept, kept[1:]):
+        (ax, ay), (bx, by) = xy[first], xy[last]
+        dx, dy = bx - ax, by - ay
+        length_sq = dx * dx + dy * dy
+        for index in range(first + 1, last):
+            px, py = xy[index][0] - ax, xy[index][1] - ay
+            t = min(1.0, max(0.0, (px * dx + py * dy) / length_sq)) if length_sq else 0.0
+            worst = max(worst, math.hypot(px - t * dx, py - t * dy))
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rows saved and throughput of ride track compaction")
+    parser.add_argument('rides', nargs='?', type=int, default=500)
+    parser.add_argument('points', nargs='?', type=int, default=500)
+    parser.add_argument('--tolerance', type=float, default=10.0, help="Metres")
+    parser.add_argument('--noise', type=float, default=3.0, help="GPS noise in metres")
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    tracks = [track(rng, args.points, args.noise) for _ in range(args.rides)]
+    finished = datetime.utcnow() - timedelta(days=10)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'tracks.db')}"
+        db.init_app(app)
+        compactor = TrackCompactor(app, tolerance_m=args.tolerance, retention_hours=72)
+
+        with app.app_context():
+            db.create_all()
+            db.session.execute(User.__table__.insert(), [{'name': 'Passenger', 'phone': '+10000000000'}])
+            db.session.execute(Ride.__table__.insert(), [
+                {'passenger_id': 1, 'pickup_address': 'pickup', 'destination_address': 'destination',
+                 'passenger_offer': 500, 'status': 'completed', 'requested_at': finished, 'completed_at': finished}
+                for _ in tracks
+            ])
+            db.session.execute(RideTracking.__table__.insert(), [
+                {'ride_id': ride_id, 'driver_lat': lat, 'driver_lng': lng,
+                 'timestamp': finished + timedelta(seconds=index)}
+                for ride_id, points in enumerate(tracks, start=1)
+                for index, (lat, lng) in enumerate(points)
+            ])
+            db.session.commit()
+
+            before = db.session.query(RideTracking.id).count()
+            summary = compactor.run_once()
+            after = db.session.query(RideTracking.id).count()
+
+    started = time.perf_counter()
+    worst = max(max_deviation(points, simplify(points, args.tolerance)) for points in tracks)
+    simplify_only = time.perf_counter() - started
+
+    print(f"⏱️  {args.rides} rides x {args.points} points, {args.noise:.0f} m GPS noise, "
+          f"{args.tolerance:.0f} m tolerance")
+    print(f"RideTracking rows: {before} -> {after} ({100 * (1 - after / before):.1f}% removed)")
+    print(f"compaction: {summary['seconds']:.2f}s, {summary['points_per_second']} points/s "
+          f"(simplify alone + check: {simplify_only:.2f}s)")
+    print(f"largest distance of a dropped point from the track: {worst:.2f} m")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Track Store Benchmark
+Writes the same GPS tracks once as RideTracking rows and once as packed
+RideTrack blobs, each into its own temporary SQLite database, then
+compares database size, write time and the time to read every track back:
+
+  orm      RideTracking objects, as the ORM hydrates them
+  packed   PackedTrack.points(), decoded to (lat, lng, timestamp) tuples
+  numpy    PackedTrack.as_numpy(), coordinates decoded in bulk
+
+Usage: python bench_track_store.py [rides] [points] [--batch N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+
+from db.models import db, User, Ride, RideTracking
+from track_store import TrackStore
+
+CITY = (24.86, 67.01)
+
+
+def generate(rides, points, seed=3):
+    rng = random.Random(seed)
+    started = datetime.utcnow() - timedelta(hours=1)
+    tracks = []
+    for _ in range(rides):
+        lat, lng = CITY[0] + rng.uniform(-0.05, 0.05), CITY[1] + rng.uniform(-0.05, 0.05)
+        track = []
+        for index in range(points):
+            lat += rng.gauss(0, 1e-4)
+            lng += rng.gauss(0, 1e-4)
+            track.append((lat, lng, started + timedelta(seconds=2 * index, milliseconds=rng.randrange(1000))))
+        tracks.append(track)
+    return tracks
+
+
+def database(path, rides):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.execute(User.__table__.insert(), [{'name': 'Passenger', 'phone': '+10000000000'}])
+        db.session.execute(Ride.__table__.insert(), [
+            {'passenger_id': 1, 'pickup_address': 'pickup', 'destination_address': 'destination',
+             'passenger_offer': 500, 'status': 'accepted'}
+            for _ in range(rides)
+        ])
+        db.session.commit()
+    return app
+
+
+def size_mb(app, path):
+    with app.app_context():
+        db.session.execute(db.text("VACUUM"))
+        db.session.remove()
+        db.engine.dispose()
+    return os.path.getsize(path) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare RideTracking rows with packed ride tracks")
+    parser.add_argument('rides', nargs='?', type=int, default=200)
+    parser.add_argument('points', nargs='?', type=int, default=1800)
+    parser.add_argument('--batch', type=int, default=50, help="Points per write, like a location flush")
+    args = parser.parse_args()
+
+    tracks = generate(args.rides, args.points)
+    ride_ids = range(1, args.rides + 1)
+    store = TrackStore()
+    print(f"⏱️  {args.rides} rides x {args.points} points, written {args.batch} points at a time")
+    print(f"\n{'':<8}{'size MB':>10}{'B/point':>9}{'write':>9}{'read':>9}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'rows.db')
+        app = database(path, args.rides)
+        with app.app_context():
+            started = time.perf_counter()
+            for start in range(0, args.points, args.batch):
+                db.session.execute(RideTracking.__table__.insert(), [
+                    {'ride_id': ride_id, 'driver_lat': lat, 'driver_lng': lng, 'timestamp': timestamp}
+                    for ride_id, track in zip(ride_ids, tracks)
+                    for lat, lng, timestamp in track[start:start + args.batch]
+                ])
+                db.session.commit()
+            write = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for ride_id in ride_ids:
+                RideTracking.query.filter_by(ride_id=ride_id).order_by(RideTracking.timestamp).all()
+                db.session.expunge_all()
+            read = time.perf_counter() - started
+        size = size_mb(app, path)
+        print(f"{'orm':<8}{size:>10.2f}{size * 1e6 / (args.rides * args.points):>9.1f}{write:>8.2f}s{read:>8.2f}s")
+
+        path = os.path.join(tmp, 'packed.db')
+        app = database(path, args.rides)
+        with app.app_context():
+            started = time.perf_counter()
+            for start in range(0, args.points, args.batch):
+                for ride_id, track in zip(ride_ids, tracks):
+                    store.append(ride_id, track[start:start + args.batch])
+                db.session.commit()
+            write = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for ride_id in ride_ids:
+                store.read(ride_id).points()
+            read = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for ride_id in ride_ids:
+                store.read(ride_id).as_numpy()
+            read_numpy = time.perf_counter() - started
+        size = size_mb(app, path)
+        print(f"{'packed':<8}{size:>10.2f}{size * 1e6 / (args.rides * args.points):>9.1f}{write:>8.2f}s{read:>8.2f}s")
+        print(f"{'numpy':<8}{'':>10}{'':>9}{'':>9}{read_numpy:>8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
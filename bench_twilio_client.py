@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Twilio Client Throughput Benchmark
+Places calls.create() requests against a local HTTP stub of the Twilio REST
+API from several threads and reports calls per second and TCP connections
+opened, for:
+
+  per-call    a new twilio.rest.Client for every call (no connection reuse)
+  default     one Client with Twilio's default HTTP session (before)
+  pooled      the shared client from twilio_pool (after)
+
+Usage: python bench_twilio_client.py [calls] [threads] [stub latency ms]
+"""
+
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from twilio.rest import Client
+
+from twilio_pool import get_twilio_client
+
+ACCOUNT_SID = 'AC' + '0' * 32
+AUTH_TOKEN = 'bench-token'
+
+
+class StubTwilioHandler(BaseHTTPRequestHandler):
+    """Answers POST .../Calls.json like the Twilio API, over keep-alive HTTP/1.1"""
+
+    protocol_version = 'HTTP/1.1'
+    # One buffered write per response: split header/body writes on a reused
+    # connection stall on delayed ACKs and would penalize keep-alive
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    latency = 0.0
+    connections = None
+
+    def setup(self):
+        super().setup()
+        with self.connections.get_lock():
+            self.connections.value += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.latency:
+            time.sleep(self.latency)
+        body = json.dumps({
+            'sid': 'CA' + os.urandom(16).hex(),
+            'account_sid': ACCOUNT_SID,
+            'status': 'queued'
+        }).encode()
+        self.send_response(201)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def serve_stub(port, latency, connections):
+    """Run the stub in its own process so it doesn't compete for the client's GIL"""
+    StubTwilioHandler.latency = latency
+    StubTwilioHandler.connections = connections
+    StubServer(('127.0.0.1', port), StubTwilioHandler).serve_forever()
+
+
+def free_port():
+    import socket
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(port):
+    import socket
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("stub server did not start")
+
+
+def with_base_url(client, base_url):
+    client.api.base_url = base_url
+    return client
+
+
+def place_call(client):
+    return client.calls.create(to='+920000000000', from_='+10000000000', url='http://localhost/twiml/booking').sid
+
+
+def run(name, client_for_call, calls, threads, connections):
+    connections.value = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        sids = list(pool.map(lambda _: place_call(client_for_call()), range(calls)))
+    elapsed = time.perf_counter() - started
+    assert len(set(sids)) == calls
+    print(f"{name:<10}{calls / elapsed:>12.0f}{elapsed / calls * 1000:>12.2f}{connections.value:>14}")
+    return calls / elapsed
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 20.0) / 1000
+
+    port = free_port()
+    connections = multiprocessing.Value('i', 0)
+    server = multiprocessing.Process(target=serve_stub, args=(port, latency, connections), daemon=True)
+    server.start()
+    wait_for(port)
+    base_url = f"http://127.0.0.1:{port}"
+
+    default_client = with_base_url(Client(ACCOUNT_SID, AUTH_TOKEN), base_url)
+    pooled_client = get_twilio_client(ACCOUNT_SID, AUTH_TOKEN, base_url=base_url)
+
+    print(f"⏱️  {calls} calls.create() from {threads} threads, stub latency {latency * 1000:.1f} ms")
+    print(f"{'client':<10}{'calls/s':>12}{'ms/call':>12}{'connections':>14}")
+    run('per-call', lambda: with_base_url(Client(ACCOUNT_SID, AUTH_TOKEN), base_url), calls, threads, connections)
+    before = run('default', lambda: default_client, calls, threads, connections)
+    after = run('pooled', lambda: pooled_client, calls, threads, connections)
+    print(f"pooled vs default: {after / before:.2f}x")
+
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+TwiML Rendering Microbenchmark
+Compares the precompiled template registry behind /twiml-enhanced with the
+previous per-request VoiceResponse/Gather construction, for every call type.
+
+Usage: python bench_twiml.py [iterations]
+"""
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from twilio.twiml.voice_response import VoiceResponse, Gather
+
+from voice_routes import AI_RESPONSES
+from twiml_templates import twiml_templates
+
+CONTEXT = {
+    'booking_id': 'WR12345',
+    'driver_name': 'Ahmed Khan',
+    'vehicle': 'Toyota Corolla',
+    'plate': 'ABC-123',
+    'pickup': 'Clifton Block 5',
+    'destination': 'Jinnah International Airport',
+    'price': '850',
+    'final_price': '850',
+    'eta': '7',
+    'rating': '4.8',
+    'reason': 'driver unavailable'
+}
+
+
+def legacy_render(call_type, ctx):
+    """The old /twiml-enhanced body: if/elif, random.choice, format, object tree, XML"""
+    response = VoiceResponse()
+    if call_type == 'booking_confirmed':
+        message = random.choice(AI_RESPONSES['booking_confirmed']).format(
+            pickup=ctx['pickup'], destination=ctx['destination'], price=ctx['price'], booking_id=ctx['booking_id'])
+        response.say(message, voice='Polly.Joanna', language='en-US')
+    elif call_type == 'driver_assigned':
+        message = random.choice(AI_RESPONSES['driver_assigned']).format(
+            driver_name=ctx['driver_name'], vehicle=ctx['vehicle'], plate=ctx['plate'], rating=ctx['rating'], eta=ctx['eta'])
+        response.say(message, voice='Polly.Joanna', language='en-US')
+    elif call_type == 'driver_arrived':
+        message = random.choice(AI_RESPONSES['driver_arrived']).format(
+            driver_name=ctx['driver_name'], vehicle=ctx['vehicle'], plate=ctx['plate'])
+        response.say(message, voice='Polly.Joanna', language='en-US')
+        gather = Gather(numDigits=1, action='/handle-arrival-response-enhanced', method='POST')
+        gather.say("Press 1 when you see your driver, or 2 if you need more time.",
+                   voice='Polly.Joanna', language='en-US')
+        response.append(gather)
+    elif call_type == 'safety_check':
+        message = random.choice(AI_RESPONSES['safety_check']).format(driver_name=ctx['driver_name'])
+        gather = Gather(numDigits=1, action='/handle-safety-response-enhanced', method='POST')
+        gather.say(message, voice='Polly.Matthew', language='en-US')
+        response.append(gather)
+    elif call_type == 'feedback_request':
+        message = random.choice(AI_RESPONSES['feedback_request']).format(
+            driver_name=ctx['driver_name'], pickup=ctx['pickup'], destination=ctx['destination'])
+        gather = Gather(numDigits=1, action='/handle-feedback-response-enhanced', method='POST')
+        gather.say(message, voice='Polly.Ivy', language='en-US')
+        response.append(gather)
+    elif call_type == 'ride_completed':
+        message = random.choice(AI_RESPONSES['ride_completed']).format(
+            destination=ctx['destination'], final_price=ctx['final_price'], driver_name=ctx['driver_name'])
+        response.say(message, voice='Polly.Joanna', language='en-US')
+    elif call_type == 'ride_cancelled':
+        message = random.choice(AI_RESPONSES['ride_cancelled']).format(
+            pickup=ctx['pickup'], destination=ctx['destination'], reason=ctx['reason'])
+        response.say(message, voice='Polly.Joanna', language='en-US')
+    else:
+        response.say("Hello from WeRide AI Assistant. Thank you for using our service.",
+                     voice='Polly.Joanna', language='en-US')
+    return str(response)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    call_types = ['booking_confirmed', 'driver_assigned', 'driver_arrived', 'safety_check',
+                  'feedback_request', 'ride_completed', 'ride_cancelled', 'unknown']
+
+    print(f"⏱️  TwiML rendering, {iterations} renders per call type")
+    print(f"{'call type':<20}{'legacy µs':>12}{'compiled µs':>14}{'speedup':>10}")
+
+    total_legacy = total_compiled = 0.0
+    for call_type in call_types:
+        # Same seed, same variant: both paths must produce identical XML
+        random.seed(call_type)
+        expected = legacy_render(call_type, CONTEXT)
+        random.seed(call_type)
+        actual = twiml_templates.render(call_type, **CONTEXT)
+        assert actual == expected, f"{call_type} output differs:\n{expected}\n{actual}"
+
+        legacy = timeit.timeit(lambda: legacy_render(call_type, CONTEXT), number=iterations)
+        compiled = timeit.timeit(lambda: twiml_templates.render(call_type, **CONTEXT), number=iterations)
+        total_legacy += legacy
+        total_compiled += compiled
+        print(f"{call_type:<20}{legacy / iterations * 1e6:>12.2f}{compiled / iterations * 1e6:>14.2f}"
+              f"{legacy / compiled:>9.1f}x")
+
+    print(f"{'overall':<20}{total_legacy / iterations / len(call_types) * 1e6:>12.2f}"
+          f"{total_compiled / iterations / len(call_types) * 1e6:>14.2f}{total_legacy / total_compiled:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
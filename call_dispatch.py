@@ -0,0 +1,287 @@
+"""
+Outbound Call Dispatch
+======================
+
+Persistent queue for outbound Twilio calls. Request handlers enqueue a
+CallJob row and return immediately; a pool of worker threads places the
+calls concurrently and records the outcome on the job so its status can be
+looked up by ID. Workers take the most urgent queued job first, as ranked
+by the dispatcher's priority function.
+
+Jobs outlive the process that queued them. start() re-queues every job
+still 'queued' in the database, and a periodic sweep picks up queued jobs
+no worker has claimed after `stale_after` seconds (e.g. queued by a
+process that died before placing them). The sweep also fails jobs stuck
+'in_progress' for that long, since their worker is gone. They are not
+retried, because Twilio may already have placed the call.
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import queue
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from db.models import db, CallJob
+
+logger = logging.getLogger(__name__)
+
+# Shutdown markers sort after every job, so queued work drains first
+_STOP = float('inf')
+
+
+class CallDispatcher:
+    """Queue outbound calls in the database and place them from worker threads"""
+
+    def __init__(self, app=None, handler=None, workers=4, priority=None, stale_after=300, sweep_interval=60):
+        self.app = None
+        self.handler = handler
+        self.workers = workers
+        self.priority = priority or (lambda call_type: 0)
+        self.stale_after = stale_after
+        self.sweep_interval = sweep_interval
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._pending = Counter()
+        self._queued = set()  # job IDs waiting in this process's queue
+        self._threads = []
+        self._lock = threading.Lock()
+        self._started = False
+        self._stopping = threading.Event()
+        self._sweeper = None
+
+        if app is not None:
+            self.init_app(app, handler)
+
+    def init_app(self, app, handler=None, workers=None, priority=None, stale_after=None, sweep_interval=None):
+        """
+        Bind the dispatcher to a Flask app
+
+        Args:
+            app: Flask application whose database holds the job queue
+            handler: Callable taking a CallJob and returning the call SID
+            workers: Number of worker threads placing calls
+            priority: Callable mapping a call type to a sort key; lower
+                values are placed first
+            stale_after: Seconds after which an unclaimed queued job is
+                re-queued and an in_progress job is failed
+            sweep_interval: Seconds between sweeps for such jobs
+        """
+        self.app = app
+        if handler is not None:
+            self.handler = handler
+        if workers is not None:
+            self.workers = workers
+        if priority is not None:
+            self.priority = priority
+        if stale_after is not None:
+            self.stale_after = stale_after
+        if sweep_interval is not None:
+            self.sweep_interval = sweep_interval
+        app.extensions['call_dispatcher'] = self
+
+    def start(self):
+        """Start the workers and the sweeper, and pick up jobs left in the database (idempotent)"""
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"call-dispatch-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._stopping = threading.Event()
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="call-dispatch-sweeper", daemon=True)
+            self._sweeper.start()
+            self._started = True
+        atexit.register(self.shutdown)
+        try:
+            self.recover(all_queued=True)
+        except Exception as e:
+            logger.error(f"Call job recovery failed: {e}")
+
+    def enqueue(self, phone, call_type, url, context=None):
+        """
+        Persist a call job and hand it to the worker pool
+
+        Returns:
+            ID of the queued CallJob
+        """
+        job = CallJob(
+            phone=phone,
+            call_type=call_type,
+            url=url,
+            context=json.dumps(context, default=str) if context else None
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        self.start()
+        self._put(job.id, call_type)
+        return job.id
+
+    def enqueue_many(self, jobs, on_insert=None):
+        """
+        Persist a batch of call jobs with one INSERT and hand them to the worker pool
+
+        Args:
+            jobs: Dicts with phone, call_type, url and optional context
+            on_insert: Called with the new job IDs before the commit, e.g. to
+                link them to another row in the same transaction
+
+        Returns:
+            IDs of the queued CallJobs, in the order given
+        """
+        if not jobs:
+            return []
+        now = datetime.utcnow()
+        rows = [{
+            'phone': job['phone'],
+            'call_type': job['call_type'],
+            'url': job['url'],
+            'context': json.dumps(job['context'], default=str) if job.get('context') else None,
+            'status': 'queued',
+            'attempts': 0,
+            'created_at': now
+        } for job in jobs]
+        job_ids = db.session.scalars(
+            insert(CallJob).returning(CallJob.id, sort_by_parameter_order=True), rows).all()
+        if on_insert is not None:
+            on_insert(job_ids)
+        db.session.commit()
+
+        self.start()
+        for job_id, job in zip(job_ids, jobs):
+            self._put(job_id, job['call_type'])
+        return job_ids
+
+    def get_job(self, job_id):
+        """Look up a call job by ID"""
+        return CallJob.query.get(job_id)
+
+    def pending(self):
+        """Number of jobs waiting for a worker in this process"""
+        with self._lock:
+            return sum(self._pending.values())
+
+    def pending_by_priority(self):
+        """Jobs waiting for a worker in this process, by priority"""
+        with self._lock:
+            return {priority: count for priority, count in self._pending.items() if count}
+
+    def recover(self, all_queued=False):
+        """
+        Re-queue queued jobs nobody is working on, and fail in_progress jobs
+        whose worker is gone (both: older than stale_after seconds)
+
+        Args:
+            all_queued: Re-queue every queued job regardless of age, as at
+                startup, when none can be waiting in this process yet
+
+        Returns:
+            (requeued, failed) job counts
+        """
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=self.stale_after)
+        with self.app.app_context():
+            # Failing is done with a conditional UPDATE, so a job that
+            # finishes meanwhile keeps its real outcome
+            failed = CallJob.query.filter(
+                CallJob.status == 'in_progress', CallJob.started_at < cutoff
+            ).update({
+                'status': 'failed',
+                'error': f"Worker stopped before the call finished (in progress for over {self.stale_after:.0f}s)",
+                'finished_at': now
+            }, synchronize_session=False)
+            db.session.commit()
+            queued = (db.session.query(CallJob.id, CallJob.call_type)
+                      .filter(CallJob.status == 'queued', CallJob.created_at < (now if all_queued else cutoff))
+                      .order_by(CallJob.id)
+                      .all())
+            db.session.rollback()
+
+        with self._lock:
+            queued = [(job_id, call_type) for job_id, call_type in queued if job_id not in self._queued]
+        for job_id, call_type in queued:
+            self._put(job_id, call_type)
+        if queued:
+            logger.info(f"Recovered {len(queued)} queued call jobs")
+        if failed:
+            logger.warning(f"Failed {failed} call jobs stuck in progress")
+        return len(queued), failed
+
+    def shutdown(self, wait=True):
+        """Stop the worker threads once the queued jobs are drained"""
+        with self._lock:
+            if not self._started:
+                return
+            for _ in self._threads:
+                self._queue.put((_STOP, next(self._seq), None))
+            threads, self._threads = self._threads, []
+            self._stopping.set()
+            self._started = False
+
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    # ─────────── WORKERS ───────────
+    def _put(self, job_id, call_type):
+        priority = self.priority(call_type)
+        with self._lock:
+            self._pending[priority] += 1
+            self._queued.add(job_id)
+        self._queue.put((priority, next(self._seq), job_id))
+
+    def _sweep_loop(self):
+        stopping = self._stopping
+        while not stopping.wait(self.sweep_interval):
+            try:
+                self.recover()
+            except Exception as e:
+                logger.error(f"Call job sweep failed: {e}")
+
+    def _worker(self):
+        while True:
+            priority, _, job_id = self._queue.get()
+            try:
+                if job_id is None:
+                    return
+                with self._lock:
+                    self._pending[priority] -= 1
+                    self._queued.discard(job_id)
+                with self.app.app_context():
+                    self._run(job_id)
+            except Exception as e:
+                logger.error(f"Call job {job_id} crashed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id):
+        # Claim the job atomically so a job queued twice (or recovered by
+        # another process) is only ever placed once
+        claimed = CallJob.query.filter_by(id=job_id, status='queued').update({
+            'status': 'in_progress',
+            'attempts': CallJob.attempts + 1,
+            'started_at': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            return
+
+        job = CallJob.query.get(job_id)
+        try:
+            job.call_sid = self.handler(job)
+            job.status = 'completed'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)[:500]
+            logger.error(f"Call job {job_id} to {job.phone} failed: {e}")
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
@@ -0,0 +1,146 @@
+"""
+Call Log
+========
+
+Bounded log of outbound AI calls. The most recent entries live in a
+fixed-size ring buffer of compact records; entries pushed out of the ring
+are written to the CallLog table in batches, and whatever is still in
+memory is persisted on shutdown.
+"""
+
+import atexit
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from db.models import db, CallLog
+
+logger = logging.getLogger(__name__)
+
+
+class CallLogEntry:
+    __slots__ = ('id', 'phone', 'call_type', 'status', 'call_sid', 'error', 'ride_id', 'timestamp')
+
+    def __init__(self, id, phone, call_type, status, call_sid, error, ride_id, timestamp):
+        self.id = id
+        self.phone = phone
+        self.call_type = call_type
+        self.status = status
+        self.call_sid = call_sid
+        self.error = error
+        self.ride_id = ride_id
+        self.timestamp = timestamp
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'phone': self.phone,
+            'type': self.call_type,
+            'status': self.status,
+            'call_sid': self.call_sid,
+            'error': self.error,
+            'ride_id': self.ride_id,
+            'timestamp': self.timestamp.isoformat()
+        }
+
+    def to_row(self):
+        return {
+            'phone': self.phone,
+            'call_type': self.call_type,
+            'status': self.status,
+            'call_sid': self.call_sid,
+            'error': self.error,
+            'ride_id': self.ride_id,
+            'created_at': self.timestamp
+        }
+
+
+class CallLogBuffer:
+    """Ring buffer of recent call log entries with batched overflow to the database"""
+
+    def __init__(self, app=None, capacity=1000, batch_size=100):
+        self.app = None
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self._recent = deque()
+        self._overflow = []
+        self._lock = threading.Lock()
+        self._persisted = None
+        self._recorded = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['call_log'] = self
+        atexit.register(self.flush_all)
+
+    def record(self, phone, call_type, status, call_sid=None, error=None, context=None):
+        """Append a call outcome; only the ride ID is kept from the context"""
+        ride_id = context.get('ride_id') if isinstance(context, dict) else None
+        self._load_baseline()
+        batch = None
+        with self._lock:
+            self._recorded += 1
+            entry = CallLogEntry(
+                self._recorded, phone, call_type, status, call_sid,
+                str(error)[:500] if error else None,
+                ride_id if isinstance(ride_id, int) else None,
+                datetime.utcnow()
+            )
+            self._recent.append(entry)
+            if len(self._recent) > self.capacity:
+                self._overflow.append(self._recent.popleft())
+                if len(self._overflow) >= self.batch_size:
+                    batch, self._overflow = self._overflow, []
+
+        if batch:
+            self._write(batch)
+        return entry
+
+    def recent(self, limit=50):
+        """Newest entries first"""
+        with self._lock:
+            entries = list(self._recent)[-limit:]
+        return [entry.to_dict() for entry in reversed(entries)]
+
+    @property
+    def total(self):
+        """Calls logged ever: rows persisted before startup plus everything since"""
+        self._load_baseline()
+        return self._persisted + self._recorded
+
+    def _load_baseline(self):
+        # Counted once, before this process writes anything to the table
+        if self._persisted is not None:
+            return
+        try:
+            with self.app.app_context():
+                persisted = db.session.query(CallLog.id).count()
+        except Exception as e:
+            logger.error(f"Could not count persisted call logs: {e}")
+            persisted = 0
+        with self._lock:
+            if self._persisted is None:
+                self._persisted = persisted
+
+    def flush_all(self):
+        """Persist everything still held in memory (used on shutdown)"""
+        with self._lock:
+            batch = self._overflow + list(self._recent)
+            self._overflow = []
+            self._recent.clear()
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch):
+        try:
+            with self.app.app_context():
+                db.session.execute(insert(CallLog), [entry.to_row() for entry in batch])
+                db.session.commit()
+        except Exception as e:
+            logger.error(f"Could not persist {len(batch)} call log entries: {e}")
@@ -0,0 +1,276 @@
+"""
+Call Campaigns
+==============
+
+Bulk voice calls and SMS to many riders at once, e.g. outage notices or
+payment reminders. A campaign takes a recipient list or a ride query,
+renders one message template per recipient (voice calls fetch it from
+/twiml/message/<template>, SMS bodies are rendered up front) and queues the
+jobs on the CallDispatcher in batches of one INSERT each.
+
+progress() follows a campaign as its jobs finish, paging through them in
+job ID order, so neither queueing nor streaming holds the whole recipient
+set in memory.
+"""
+
+import json
+import logging
+import time
+from datetime import datetime
+from itertools import islice
+from urllib.parse import urlencode
+
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+
+from db.models import db, CallJob, Campaign, CampaignRecipient, Ride, User
+from message_templates import get_template, render_text
+
+logger = logging.getLogger(__name__)
+
+CHANNELS = ('voice', 'sms')
+FINISHED_STATUSES = ('completed', 'failed')
+JOB_STATUSES = ('queued', 'in_progress', 'completed', 'failed')
+
+
+class CampaignError(ValueError):
+    """A campaign request that can't be queued"""
+
+
+class CampaignRunner:
+    """Queue campaign messages through the call dispatcher and report progress"""
+
+    def __init__(self, app=None, dispatcher=None, base_url='', batch_size=500,
+                 max_recipients=50000, page_size=200, poll_interval=1.0, stats_interval=5.0):
+        self.app = None
+        self.dispatcher = dispatcher
+        self.base_url = base_url.rstrip('/')
+        self.batch_size = batch_size
+        self.max_recipients = max_recipients
+        self.page_size = page_size
+        self.poll_interval = poll_interval
+        self.stats_interval = stats_interval
+
+        if app is not None:
+            self.init_app(app, dispatcher)
+
+    def init_app(self, app, dispatcher=None):
+        self.app = app
+        if dispatcher is not None:
+            self.dispatcher = dispatcher
+        app.extensions['campaigns'] = self
+
+    def launch(self, name, template, recipients, channel='voice', values=None):
+        """
+        Create a campaign and queue a job for every recipient
+
+        Args:
+            name: Label for the campaign
+            template: message_templates name, e.g. 'call_status.payment_reminder'
+            recipients: Iterable of (phone, values) pairs; phone is None for
+                entries that should be skipped
+            channel: 'voice' or 'sms'
+            values: Template values shared by every recipient
+
+        Returns:
+            The Campaign
+        """
+        if channel not in CHANNELS:
+            raise CampaignError(f"Unknown channel '{channel}'")
+        if get_template(template) is None:
+            raise CampaignError(f"Unknown message template '{template}'")
+
+        campaign = Campaign(name=name, channel=channel, template=template, status='queueing')
+        db.session.add(campaign)
+        db.session.commit()
+        campaign_id = campaign.id
+        shared = values or {}
+
+        def link(job_ids):
+            db.session.execute(CampaignRecipient.__table__.insert(),
+                               [{'campaign_id': campaign_id, 'call_job_id': job_id} for job_id in job_ids])
+
+        total = skipped = 0
+        recipients = iter(recipients)
+        try:
+            while True:
+                batch = list(islice(recipients, self.batch_size))
+                if not batch:
+                    break
+                jobs = []
+                for phone, recipient_values in batch:
+                    if not phone:
+                        skipped += 1
+                        continue
+                    jobs.append(self._job(campaign_id, template, channel, phone, {**shared, **recipient_values}))
+                self.dispatcher.enqueue_many(jobs, on_insert=link)
+                total += len(jobs)
+            status = 'queued'
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Campaign %s stopped after queueing %d jobs: %s", campaign_id, total, e)
+            status = 'failed'
+
+        Campaign.query.filter_by(id=campaign_id).update({
+            'status': status,
+            'total_recipients': total,
+            'skipped_recipients': skipped
+        })
+        db.session.commit()
+        logger.info("Campaign %s queued %d %s jobs (%d skipped)", campaign_id, total, channel, skipped)
+        return db.session.get(Campaign, campaign_id)
+
+    def stats(self, campaign_id):
+        """Job counts by status for a campaign"""
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        counts.update(db.session.query(CallJob.status, func.count())
+                      .join(CampaignRecipient, CampaignRecipient.call_job_id == CallJob.id)
+                      .filter(CampaignRecipient.campaign_id == campaign_id)
+                      .group_by(CallJob.status)
+                      .all())
+        counts['finished'] = sum(counts[status] for status in FINISHED_STATUSES)
+        return counts
+
+    def progress(self, campaign_id):
+        """
+        Generate newline-delimited JSON progress for a campaign
+
+        Yields one 'recipient' line per job as it finishes (in job order), a
+        'stats' line every stats_interval seconds while waiting, and a final
+        'done' line with the totals once every job has finished.
+        """
+        cursor = 0
+        last_stats = time.monotonic()
+        while True:
+            rows = (db.session.query(CallJob.id, CallJob.phone, CallJob.status, CallJob.call_sid, CallJob.error)
+                    .join(CampaignRecipient, CampaignRecipient.call_job_id == CallJob.id)
+                    .filter(CampaignRecipient.campaign_id == campaign_id,
+                            CampaignRecipient.call_job_id > cursor)
+                    .order_by(CampaignRecipient.call_job_id)
+                    .limit(self.page_size)
+                    .all())
+
+            waiting = False
+            for job_id, phone, status, call_sid, error in rows:
+                if status not in FINISHED_STATUSES:
+                    waiting = True
+                    break
+                cursor = job_id
+                yield _line({'type': 'recipient', 'job_id': job_id, 'phone': phone,
+                             'status': status, 'call_sid': call_sid, 'error': error})
+            if rows and not waiting:
+                continue
+
+            campaign_status = db.session.query(Campaign.status).filter_by(id=campaign_id).scalar()
+            if not waiting and campaign_status != 'queueing':
+                yield _line(dict(self.summary(campaign_id), type='done'))
+                return
+            if time.monotonic() - last_stats >= self.stats_interval:
+                last_stats = time.monotonic()
+                yield _line(dict(self.summary(campaign_id), type='stats'))
+
+            # End the read transaction so the next poll sees newly finished jobs
+            db.session.rollback()
+            time.sleep(self.poll_interval)
+
+    def summary(self, campaign_id):
+        """Campaign details and job counts, or None for an unknown campaign"""
+        campaign = db.session.get(Campaign, campaign_id)
+        if campaign is None:
+            return None
+        summary = {
+            'campaign_id': campaign.id,
+            'name': campaign.name,
+            'channel': campaign.channel,
+            'template': campaign.template,
+            'status': campaign.status,
+            'total': campaign.total_recipients,
+            'skipped': campaign.skipped_recipients,
+            'created_at': campaign.created_at.isoformat()
+        }
+        summary.update(self.stats(campaign_id))
+        return summary
+
+    def _job(self, campaign_id, template, channel, phone, values):
+        context = {'campaign_id': campaign_id, 'template': template}
+        if channel == 'sms':
+            context['body'] = render_text(template, values)
+            return {'phone': phone, 'call_type': 'campaign_sms', 'url': '', 'context': context}
+
+        params = urlencode({key: value for key, value in values.items() if value is not None})
+        url = f"{self.base_url}/twiml/message/{template}" + (f"?{params}" if params else '')
+        return {'phone': phone, 'call_type': 'campaign', 'url': url, 'context': context}
+
+
+def recipients_from_list(items):
+    """(phone, values) pairs from request JSON: phone strings or objects with a phone and template values"""
+    for item in items:
+        if isinstance(item, str):
+            yield item.strip() or None, {}
+        elif isinstance(item, dict):
+            values = {key: value for key, value in item.items() if key != 'phone'}
+            phone = item.get('phone')
+            yield (phone.strip() or None) if isinstance(phone, str) else None, values
+        else:
+            yield None, {}
+
+
+def ride_query(filters):
+    """
+    Rides to message, with the template values each one provides
+
+    Args:
+        filters: Dict with optional 'status' (string or list), 'since' and
+            'until' (ISO timestamps bounding requested_at)
+    """
+    passenger = aliased(User)
+    driver = aliased(User)
+    query = (db.session.query(Ride.id, Ride.final_price, Ride.passenger_offer, Ride.requested_at,
+                              Ride.pickup_address, Ride.destination_address,
+                              passenger.name, passenger.phone, driver.name)
+             .join(passenger, Ride.passenger_id == passenger.id)
+             .outerjoin(driver, Ride.driver_id == driver.id))
+
+    status = filters.get('status')
+    if status:
+        query = query.filter(Ride.status.in_([status] if isinstance(status, str) else status))
+    try:
+        if filters.get('since'):
+            query = query.filter(Ride.requested_at >= datetime.fromisoformat(filters['since']))
+        if filters.get('until'):
+            query = query.filter(Ride.requested_at < datetime.fromisoformat(filters['until']))
+    except ValueError as e:
+        raise CampaignError(f"Invalid ride_query time: {e}")
+    return query.order_by(Ride.id)
+
+
+def recipients_from_rides(query, batch_size=1000):
+    """
+    (phone, values) pairs for the rides of a ride_query()
+
+    Rides are loaded a page at a time by ID, not through one open cursor,
+    because launch() commits between batches.
+    """
+    last_id = 0
+    while True:
+        rows = query.filter(Ride.id > last_id).limit(batch_size).all()
+        if not rows:
+            return
+        for (ride_id, final_price, passenger_offer, requested_at, pickup, destination,
+             passenger_name, phone, driver_name) in rows:
+            last_id = ride_id
+            amount = final_price if final_price is not None else passenger_offer
+            yield phone, {
+                'ride_id': ride_id,
+                'passenger_name': passenger_name,
+                'driver_name': driver_name or 'your driver',
+                'amount': amount,
+                'fare': amount,
+                'ride_date': requested_at.strftime('%B %d') if requested_at else '',
+                'pickup_location': pickup,
+                'destination': destination
+            }
+
+
+def _line(data):
+    return json.dumps(data, default=str) + '\n'
@@ -11,3 +11,104 @@ SQLALCHEMY_DATABASE_URI = os.getenv("SQLALCHEMY_DATABASE_URI")
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
+
+# Outbound call dispatch
+CALL_DISPATCH_WORKERS = int(os.getenv("CALL_DISPATCH_WORKERS", "4"))
+# Queued jobs unclaimed and in-progress jobs unfinished after this many seconds
+# are re-queued / failed by a sweep every CALL_DISPATCH_SWEEP_INTERVAL seconds
+CALL_JOB_STALE_SECONDS = float(os.getenv("CALL_JOB_STALE_SECONDS", "300"))
+CALL_DISPATCH_SWEEP_INTERVAL = float(os.getenv("CALL_DISPATCH_SWEEP_INTERVAL", "60"))
+
+# Online driver spatial index
+DRIVER_INDEX_CELL_DEG = float(os.getenv("DRIVER_INDEX_CELL_DEG", "0.01"))
+DRIVER_INDEX_REFRESH_SECONDS = int(os.getenv("DRIVER_INDEX_REFRESH_SECONDS", "60"))
+
+# Bulk driver location ingestion
+LOCATION_FLUSH_SIZE = int(os.getenv("LOCATION_FLUSH_SIZE", "500"))
+LOCATION_FLUSH_INTERVAL = float(os.getenv("LOCATION_FLUSH_INTERVAL", "2.0"))
+LOCATION_BUFFER_MAX = int(os.getenv("LOCATION_BUFFER_MAX", "50000"))
+LOCATION_FLUSH_MAX_ATTEMPTS = int(os.getenv("LOCATION_FLUSH_MAX_ATTEMPTS", "5"))
+
+# Call log (recent entries kept in memory, older ones persisted in batches)
+CALL_LOG_CAPACITY = int(os.getenv("CALL_LOG_CAPACITY", "1000"))
+CALL_LOG_BATCH_SIZE = int(os.getenv("CALL_LOG_BATCH_SIZE", "100"))
+
+# Dashboard statistics (seconds between full recomputes)
+DASHBOARD_STATS_TTL = int(os.getenv("DASHBOARD_STATS_TTL", "30"))
+
+# Shared Twilio REST client (keep-alive pool size, timeouts in seconds)
+TWILIO_POOL_SIZE = int(os.getenv("TWILIO_POOL_SIZE", "10"))
+TWILIO_CONNECT_TIMEOUT = float(os.getenv("TWILIO_CONNECT_TIMEOUT", "3.05"))
+TWILIO_READ_TIMEOUT = float(os.getenv("TWILIO_READ_TIMEOUT", "15"))
+TWILIO_CONNECT_RETRIES = int(os.getenv("TWILIO_CONNECT_RETRIES", "2"))
+# Point the REST client somewhere other than api.twilio.com, e.g. fake_twilio.py
+TWILIO_API_BASE = os.getenv("TWILIO_API_BASE")
+
+# Idempotency keys (seconds a stored response is replayed for)
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+
+# Call campaigns (jobs per INSERT, recipients per campaign)
+CAMPAIGN_BATCH_SIZE = int(os.getenv("CAMPAIGN_BATCH_SIZE", "500"))
+CAMPAIGN_MAX_RECIPIENTS = int(os.getenv("CAMPAIGN_MAX_RECIPIENTS", "50000"))
+
+# Outbound rate limits (Twilio requests per second; 0 disables) and the
+# seconds after which queued work is shed, per lane (safety is never shed)
+TWILIO_CALLS_PER_SECOND = float(os.getenv("TWILIO_CALLS_PER_SECOND", "1"))
+TWILIO_MESSAGES_PER_SECOND = float(os.getenv("TWILIO_MESSAGES_PER_SECOND", "1"))
+OUTBOUND_SHED_AFTER = os.getenv("OUTBOUND_SHED_AFTER", "arrival=120,booking=300,feedback=900,reminders=7200")
+
+# Circuit breakers for Twilio and Firebase (consecutive failures that open a
+# circuit, seconds before a trial call) and retries of transient errors
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.2"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "2.0"))
+
+# Pre-rendered audio for <Say> prompts (empty dir disables; base URL defaults
+# to the TwiML host), TTS processes and renders queued at once. Rendering on
+# a miss also caches per-ride text, so it is off unless messages repeat
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", "instance/audio_cache")
+AUDIO_CACHE_BASE_URL = os.getenv("AUDIO_CACHE_BASE_URL", "")
+AUDIO_CACHE_WORKERS = int(os.getenv("AUDIO_CACHE_WORKERS", "2"))
+AUDIO_CACHE_MAX_PENDING = int(os.getenv("AUDIO_CACHE_MAX_PENDING", "100"))
+AUDIO_CACHE_RENDER_ON_MISS = os.getenv("AUDIO_CACHE_RENDER_ON_MISS", "false").lower() == "true"
+
+# Batch ride matching (off by default; run it in one process only): seconds
+# between rounds, pickup radius, nearest drivers per ride, pickup km one unit
+# of price gap is worth, average speed for ETAs and rides per round (the
+# auction runs in a child process and takes ~1s for 2000 rides, ~10s for 10000)
+MATCHING_ENABLED = os.getenv("MATCHING_ENABLED", "false").lower() == "true"
+MATCHING_INTERVAL = float(os.getenv("MATCHING_INTERVAL", "5"))
+MATCHING_RADIUS_KM = float(os.getenv("MATCHING_RADIUS_KM", "5"))
+MATCHING_CANDIDATES = int(os.getenv("MATCHING_CANDIDATES", "8"))
+MATCHING_PRICE_WEIGHT = float(os.getenv("MATCHING_PRICE_WEIGHT", "0.1"))
+MATCHING_SPEED_KMH = float(os.getenv("MATCHING_SPEED_KMH", "30"))
+MATCHING_MAX_RIDES = int(os.getenv("MATCHING_MAX_RIDES", "2000"))
+
+# Ride track compaction (off by default): seconds between runs, metres a
+# dropped point may be from the simplified track, hours finished rides keep
+# every raw point, and rides per transaction
+TRACK_COMPACTION_ENABLED = os.getenv("TRACK_COMPACTION_ENABLED", "false").lower() == "true"
+TRACK_COMPACTION_INTERVAL = float(os.getenv("TRACK_COMPACTION_INTERVAL", "3600"))
+TRACK_SIMPLIFY_TOLERANCE_M = float(os.getenv("TRACK_SIMPLIFY_TOLERANCE_M", "10"))
+TRACK_RAW_RETENTION_HOURS = float(os.getenv("TRACK_RAW_RETENTION_HOURS", "72"))
+TRACK_COMPACTION_BATCH = int(os.getenv("TRACK_COMPACTION_BATCH", "100"))
+
+# Where ride GPS tracks are written: "rows" (one RideTracking row per point)
+# or "packed" (one RideTrack row per ride, 12 bytes per point)
+TRACK_STORE = os.getenv("TRACK_STORE", "rows").lower()
+
+# Ride distance and ETA estimates: average driving speed, and how much
+# longer the road distance is than the straight line
+ETA_SPEED_KMH = float(os.getenv("ETA_SPEED_KMH", "30"))
+ROAD_DISTANCE_FACTOR = float(os.getenv("ROAD_DISTANCE_FACTOR", "1.3"))
+
+# Expiry of stale requests (off by default; safe to run in every worker):
+# seconds a pending offer stays open, seconds a pending ride without offers
+# stays open, seconds between sweeps and rows per UPDATE batch
+OFFER_EXPIRY_ENABLED = os.getenv("OFFER_EXPIRY_ENABLED", "false").lower() == "true"
+OFFER_TTL_SECONDS = float(os.getenv("OFFER_TTL_SECONDS", "600"))
+RIDE_TTL_SECONDS = float(os.getenv("RIDE_TTL_SECONDS", "1800"))
+OFFER_EXPIRY_INTERVAL = float(os.getenv("OFFER_EXPIRY_INTERVAL", "30"))
+OFFER_EXPIRY_BATCH = int(os.getenv("OFFER_EXPIRY_BATCH", "500"))
@@ -0,0 +1,137 @@
+"""
+Dashboard Statistics
+====================
+
+Ride and driver counters for /dashboard, served from memory. Ride lifecycle
+handlers bump the counters as rides move between states, and a background
+recompute every `ttl` seconds corrects any drift (e.g. from writes made by
+other workers). The recent-rides list is loaded with its passenger and
+driver eagerly and kept as plain dicts, so rendering never touches the
+database.
+"""
+
+import logging
+import threading
+import time
+
+from sqlalchemy.orm import joinedload
+
+from db.models import db, User, Driver, Ride
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('pending', 'accepted', 'arrived', 'in_progress')
+
+
+class DashboardStats:
+    """In-memory dashboard counters with incremental updates and TTL recompute"""
+
+    def __init__(self, app=None, ttl=30, recent_limit=10):
+        self.app = None
+        self.ttl = ttl
+        self.recent_limit = recent_limit
+        self.computed_at = None
+        self._counts = {'total_rides': 0, 'active_rides': 0, 'total_drivers': 0, 'online_drivers': 0}
+        self._recent = []
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['dashboard_stats'] = self
+
+    def snapshot(self):
+        """Current counters plus the recent rides, computing them on first use"""
+        self._ensure_fresh()
+        with self._lock:
+            return dict(self._counts, recent_rides=[dict(ride) for ride in self._recent])
+
+    def recompute(self):
+        """Reload every counter and the recent rides from the database"""
+        counts = {
+            'total_rides': Ride.query.count(),
+            'active_rides': Ride.query.filter(Ride.status.in_(ACTIVE_STATUSES)).count(),
+            'total_drivers': User.query.filter_by(user_type='driver').count(),
+            'online_drivers': db.session.query(Driver).filter_by(is_online=True).count()
+        }
+        recent = (Ride.query
+                  .options(joinedload(Ride.passenger), joinedload(Ride.driver))
+                  .order_by(Ride.requested_at.desc())
+                  .limit(self.recent_limit)
+                  .all())
+
+        with self._lock:
+            self._counts = counts
+            self._recent = [_summarize(ride) for ride in recent]
+            self.computed_at = time.monotonic()
+
+    # ─────────── INCREMENTAL UPDATES ───────────
+    def ride_created(self, ride):
+        if self.computed_at is None:
+            return
+        summary = _summarize(ride)
+        with self._lock:
+            self._counts['total_rides'] += 1
+            if ride.status in ACTIVE_STATUSES:
+                self._counts['active_rides'] += 1
+            self._recent.insert(0, summary)
+            del self._recent[self.recent_limit:]
+
+    def ride_status_changed(self, ride, old_status):
+        if self.computed_at is None:
+            return
+        was_active = old_status in ACTIVE_STATUSES
+        is_active = ride.status in ACTIVE_STATUSES
+        with self._lock:
+            if was_active != is_active:
+                self._counts['active_rides'] += 1 if is_active else -1
+            recent = next((summary for summary in self._recent if summary['id'] == ride.id), None)
+        if recent is not None:
+            summary = _summarize(ride)
+            with self._lock:
+                recent.update(summary)
+
+    def driver_registered(self):
+        with self._lock:
+            if self.computed_at is not None:
+                self._counts['total_drivers'] += 1
+
+    def _ensure_fresh(self):
+        if self.computed_at is None:
+            self.recompute()
+            return
+
+        if time.monotonic() - self.computed_at < self.ttl or self._refreshing:
+            return
+
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def refresh():
+            try:
+                with self.app.app_context():
+                    self.recompute()
+            except Exception as e:
+                logger.error(f"Dashboard stats refresh failed: {e}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=refresh, name="dashboard-stats-refresh", daemon=True).start()
+
+
+def _summarize(ride):
+    return {
+        'id': ride.id,
+        'passenger_name': ride.passenger.name if ride.passenger else None,
+        'driver_name': ride.driver.name if ride.driver else None,
+        'pickup': ride.pickup_address,
+        'destination': ride.destination_address,
+        'status': ride.status,
+        'price': ride.final_price or ride.passenger_offer,
+        'requested_at': ride.requested_at
+    }
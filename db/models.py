@@ -21,6 +21,10 @@ class User(db.Model):
     # Relationships
     rides_as_passenger = db.relationship('Ride', foreign_keys='Ride.passenger_id', backref='passenger', lazy='dynamic')
     rides_as_driver = db.relationship('Ride', foreign_keys='Ride.driver_id', backref='driver', lazy='dynamic')
+    
+    __table_args__ = (
+        db.Index('ix_user_user_type', 'user_type'),
+    )
 
 class Driver(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -40,6 +44,11 @@ class Driver(db.Model):
     
     # Relationship to user
     user = db.relationship('User', backref='driver_profile')
+    
+    __table_args__ = (
+        db.Index('ix_driver_user_id', 'user_id'),
+        db.Index('ix_driver_is_online', 'is_online'),
+    )
 
 class Ride(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -64,7 +73,7 @@ class Ride(db.Model):
     estimated_duration = db.Column(db.Integer)  # in minutes
     
     # Status tracking
-    status = db.Column(db.String(30), default='pending')  # pending, accepted, en_route, arrived, in_progress, completed, cancelled
+    status = db.Column(db.String(30), default='pending')  # pending, accepted, en_route, arrived, in_progress, completed, cancelled, expired
     
     # Timestamps
     requested_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -77,6 +86,16 @@ class Ride(db.Model):
     safety_check_made = db.Column(db.Boolean, default=False)
     feedback_call_made = db.Column(db.Boolean, default=False)
     
+    __table_args__ = (
+        # Pending feed (status filter, oldest first) and status counts
+        db.Index('ix_ride_status_requested_at', 'status', 'requested_at', 'id'),
+        # A driver's active ride
+        db.Index('ix_ride_driver_id_status', 'driver_id', 'status'),
+        # Most recent rides on the dashboard
+        db.Index('ix_ride_requested_at', 'requested_at'),
+        db.Index('ix_ride_passenger_id', 'passenger_id'),
+    )
+    
 class RideOffer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     ride_id = db.Column(db.Integer, db.ForeignKey('ride.id'), nullable=False)
@@ -91,6 +110,14 @@ class RideOffer(db.Model):
     ride = db.relationship('Ride', backref='offers')
     driver = db.relationship('User', backref='ride_offers')
     
+    __table_args__ = (
+        db.Index('ix_ride_offer_ride_id_status', 'ride_id', 'status'),
+        # Drivers with an open offer, skipped by batch matching
+        db.Index('ix_ride_offer_driver_id_status', 'driver_id', 'status'),
+        # Oldest pending offers first, for the expiry sweeper
+        db.Index('ix_ride_offer_status_created_at', 'status', 'created_at'),
+    )
+    
 class RideTracking(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     ride_id = db.Column(db.Integer, db.ForeignKey('ride.id'), nullable=False)
@@ -100,6 +127,28 @@ class RideTracking(db.Model):
     
     # Relationship
     ride = db.relationship('Ride', backref='tracking_points')
+    
+    __table_args__ = (
+        db.Index('ix_ride_tracking_ride_id_timestamp', 'ride_id', 'timestamp'),
+    )
+
+class TrackCompaction(db.Model):
+    # One row per ride whose track was simplified; its presence marks the ride as done
+    ride_id = db.Column(db.Integer, db.ForeignKey('ride.id'), primary_key=True)
+    raw_points = db.Column(db.Integer, nullable=False)
+    kept_points = db.Column(db.Integer, nullable=False)
+    tolerance_m = db.Column(db.Float, nullable=False)
+    compacted_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class RideTrack(db.Model):
+    # A ride's whole track in one row, packed by track_store (alternative to RideTracking rows)
+    ride_id = db.Column(db.Integer, db.ForeignKey('ride.id'), primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=False)  # time offsets are ms after this
+    point_count = db.Column(db.Integer, nullable=False, default=0)
+    last_lat_e7 = db.Column(db.Integer, nullable=False, default=0)  # deltas of the next append start here
+    last_lng_e7 = db.Column(db.Integer, nullable=False, default=0)
+    data = db.Column(db.LargeBinary, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Rating(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -114,3 +163,60 @@ class Rating(db.Model):
     ride = db.relationship('Ride', backref='ratings')
     rater = db.relationship('User', foreign_keys=[rater_id], backref='ratings_given')
     rated = db.relationship('User', foreign_keys=[rated_id], backref='ratings_received')
+
+class CallJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    phone = db.Column(db.String(20), nullable=False)
+    call_type = db.Column(db.String(30), nullable=False)
+    url = db.Column(db.String(1000), nullable=False)
+    context = db.Column(db.Text)  # JSON-encoded call context
+    status = db.Column(db.String(20), default='queued')  # queued, in_progress, completed, failed
+    call_sid = db.Column(db.String(64))
+    error = db.Column(db.String(500))
+    attempts = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_call_job_status', 'status'),
+    )
+
+class Campaign(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    channel = db.Column(db.String(10), default='voice')  # voice or sms
+    template = db.Column(db.String(100), nullable=False)  # message_templates name
+    total_recipients = db.Column(db.Integer, default=0)
+    skipped_recipients = db.Column(db.Integer, default=0)
+    status = db.Column(db.String(20), default='queueing')  # queueing, queued, failed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CampaignRecipient(db.Model):
+    # Links a campaign to its call jobs; the key orders a campaign's jobs for progress paging
+    campaign_id = db.Column(db.Integer, db.ForeignKey('campaign.id'), primary_key=True)
+    call_job_id = db.Column(db.Integer, db.ForeignKey('call_job.id'), primary_key=True)
+
+class CallLog(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    phone = db.Column(db.String(20), nullable=False)
+    call_type = db.Column(db.String(30), nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # demo, initiated, failed
+    call_sid = db.Column(db.String(64))
+    error = db.Column(db.String(500))
+    ride_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class IdempotencyKey(db.Model):
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)  # sha256 of method, path and body
+    status = db.Column(db.String(20), default='in_progress')  # in_progress, completed
+    response_status = db.Column(db.Integer)
+    response_body = db.Column(db.Text)
+    response_mimetype = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_idempotency_key_expires_at', 'expires_at'),
+    )
@@ -0,0 +1,226 @@
+"""
+Online Driver Spatial Index
+===========================
+
+In-memory grid index over the positions of online drivers. Drivers are
+bucketed into fixed-size lat/lng cells so a nearest-drivers query only
+looks at the cells around the pickup point instead of every online driver.
+"""
+
+import heapq
+import logging
+import math
+import threading
+import time
+
+from db.models import db, User, Driver
+
+logger = logging.getLogger(__name__)
+
+KM_PER_DEGREE = 111.32
+
+
+class _IndexedDriver:
+    __slots__ = ('driver_id', 'lat', 'lng', 'cell', 'info')
+
+    def __init__(self, driver_id, lat, lng, cell, info):
+        self.driver_id = driver_id
+        self.lat = lat
+        self.lng = lng
+        self.cell = cell
+        self.info = info
+
+
+class DriverIndex:
+    """Grid-bucketed index of online driver locations, keyed by user ID"""
+
+    def __init__(self, cell_size_deg=0.01, refresh_seconds=60):
+        self.cell_size = cell_size_deg
+        self.refresh_seconds = refresh_seconds
+        self.loaded_at = None
+        self._cells = {}
+        self._drivers = {}
+        self._lock = threading.RLock()
+        self._refreshing = False
+
+    def __len__(self):
+        return len(self._drivers)
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_size), math.floor(lng / self.cell_size))
+
+    def upsert(self, driver_id, lat, lng, info=None):
+        """Insert a driver or move it to a new position"""
+        if lat is None or lng is None:
+            return self.remove(driver_id)
+
+        cell = self._cell(lat, lng)
+        with self._lock:
+            entry = self._drivers.get(driver_id)
+            if entry is None:
+                entry = _IndexedDriver(driver_id, lat, lng, cell, info or {})
+                self._drivers[driver_id] = entry
+                self._cells.setdefault(cell, {})[driver_id] = entry
+                return
+
+            if info is not None:
+                entry.info = info
+            entry.lat = lat
+            entry.lng = lng
+            if entry.cell != cell:
+                old = self._cells.get(entry.cell)
+                if old is not None:
+                    old.pop(driver_id, None)
+                    if not old:
+                        del self._cells[entry.cell]
+                entry.cell = cell
+                self._cells.setdefault(cell, {})[driver_id] = entry
+
+    def remove(self, driver_id):
+        """Drop a driver from the index (e.g. when they go offline)"""
+        with self._lock:
+            entry = self._drivers.pop(driver_id, None)
+            if entry is None:
+                return
+            bucket = self._cells.get(entry.cell)
+            if bucket is not None:
+                bucket.pop(driver_id, None)
+                if not bucket:
+                    del self._cells[entry.cell]
+
+    def nearest(self, lat, lng, radius_km=5.0, k=10):
+        """
+        Find the closest indexed drivers to a point
+
+        Cells are scanned in rings around the query cell, stopping as soon
+        as the next ring cannot contain anything closer than the current
+        k-th result. Distances use the equirectangular approximation, which
+        is well within a percent of haversine at city scale.
+
+        Returns:
+            List of (distance_km, driver_id, lat, lng, info), closest first
+        """
+        if k <= 0 or not 0 < radius_km < math.inf:
+            return []
+
+        cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+        cell_km = self.cell_size * KM_PER_DEGREE * cos_lat
+        max_ring = int(math.ceil(radius_km / cell_km)) + 1
+        row0, col0 = self._cell(lat, lng)
+        radius_sq = radius_km * radius_km
+
+        best = []  # max-heap of (-distance_sq, driver_id, entry)
+
+        def consider(bucket):
+            for entry in bucket.values():
+                dy = (entry.lat - lat) * KM_PER_DEGREE
+                dx = (entry.lng - lng) * KM_PER_DEGREE * cos_lat
+                dist_sq = dx * dx + dy * dy
+                if dist_sq > radius_sq:
+                    continue
+                if len(best) < k:
+                    heapq.heappush(best, (-dist_sq, entry.driver_id, entry))
+                elif dist_sq < -best[0][0]:
+                    heapq.heapreplace(best, (-dist_sq, entry.driver_id, entry))
+
+        with self._lock:
+            cells = self._cells
+            if (2 * max_ring + 1) ** 2 > len(cells):
+                # Huge radius over a sparse grid: visiting the occupied
+                # cells is cheaper than walking empty rings
+                for bucket in cells.values():
+                    consider(bucket)
+            else:
+                for ring in range(max_ring + 1):
+                    if len(best) == k:
+                        bound = (ring - 1) * cell_km
+                        if bound > 0 and bound * bound > -best[0][0]:
+                            break
+                    for cell in _ring_cells(row0, col0, ring):
+                        bucket = cells.get(cell)
+                        if bucket:
+                            consider(bucket)
+
+            results = [
+                (math.sqrt(-neg_sq), entry.driver_id, entry.lat, entry.lng, entry.info)
+                for neg_sq, _, entry in best
+            ]
+
+        results.sort(key=lambda item: item[0])
+        return results
+
+    # ─────────── DATABASE SYNC ───────────
+    def load(self):
+        """Rebuild the index from the online drivers in the database"""
+        rows = db.session.query(User, Driver).join(Driver, User.id == Driver.user_id).filter(Driver.is_online == True).all()
+
+        cells = {}
+        drivers = {}
+        for user, driver in rows:
+            if driver.current_lat is None or driver.current_lng is None:
+                continue
+            cell = self._cell(driver.current_lat, driver.current_lng)
+            entry = _IndexedDriver(user.id, driver.current_lat, driver.current_lng, cell, driver_info(user, driver))
+            drivers[user.id] = entry
+            cells.setdefault(cell, {})[user.id] = entry
+
+        with self._lock:
+            self._cells = cells
+            self._drivers = drivers
+            self.loaded_at = time.monotonic()
+        logger.info(f"Driver index loaded with {len(drivers)} online drivers")
+
+    def ensure_fresh(self, app):
+        """
+        Load the index on first use and refresh it in the background once it
+        is older than refresh_seconds, so other workers' updates are picked up
+        """
+        if self.loaded_at is None:
+            with self._lock:
+                if self.loaded_at is None:
+                    self.load()
+            return
+
+        if time.monotonic() - self.loaded_at < self.refresh_seconds or self._refreshing:
+            return
+
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def refresh():
+            try:
+                with app.app_context():
+                    self.load()
+            except Exception as e:
+                logger.error(f"Driver index refresh failed: {e}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=refresh, name="driver-index-refresh", daemon=True).start()
+
+
+def driver_info(user, driver):
+    """Static driver details returned alongside index hits"""
+    return {
+        'name': user.name,
+        'phone': user.phone,
+        'rating': user.rating,
+        'vehicle': f"{driver.vehicle_make} {driver.vehicle_model}",
+        'license_plate': driver.license_plate,
+        'hourly_rate': driver.hourly_rate
+    }
+
+
+def _ring_cells(row0, col0, ring):
+    """Cells at Chebyshev distance `ring` from (row0, col0)"""
+    if ring == 0:
+        yield row0, col0
+        return
+    for col in range(col0 - ring, col0 + ring + 1):
+        yield row0 - ring, col
+        yield row0 + ring, col
+    for row in range(row0 - ring + 1, row0 + ring):
+        yield row, col0 - ring
+        yield row, col0 + ring
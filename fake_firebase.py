@@ -0,0 +1,151 @@
+"""
+Fake Firebase
+=============
+
+In-memory stand-in for the parts of the Firebase Realtime Database that
+WeRide reads (reference(path).get() and .listen(callback)), so
+RideStatusMirror can be driven without firebase_admin or a network.
+
+Writes go through put/patch/delete and are delivered to listeners as the
+same events firebase_admin sends: an initial 'put' of the whole subtree at
+path '/', then 'put' or 'patch' events with paths relative to the
+listener's root. drop_streams() kills every open stream the way a dropped
+connection does, without a close() from the client.
+
+Usage:
+    firebase = FakeFirebase({'rides': {...}})
+    mirror = RideStatusMirror(firebase.reference)
+    firebase.patch('rides/42', {'status': 'arrived'})
+"""
+
+import copy
+import threading
+
+
+def _parts(path):
+    return [part for part in (path or '').split('/') if part]
+
+
+class Event:
+    """A listener event, shaped like firebase_admin.db.Event"""
+
+    def __init__(self, event_type, path, data):
+        self.event_type = event_type
+        self.path = path
+        self.data = data
+
+
+class Registration:
+    """What listen() returns: close() it to stop the stream"""
+
+    def __init__(self, firebase, root, callback):
+        self.firebase = firebase
+        self.root = root
+        self.callback = callback
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+    def close(self):
+        self.alive = False
+        self.firebase._remove(self)
+
+
+class Reference:
+    def __init__(self, firebase, path):
+        self.firebase = firebase
+        self.path = _parts(path)
+
+    def get(self):
+        self.firebase.gets += 1
+        return self.firebase._read(self.path)
+
+    def listen(self, callback):
+        return self.firebase._listen(self.path, callback)
+
+
+class FakeFirebase:
+    """An in-memory database tree with Firebase-style streaming listeners"""
+
+    def __init__(self, data=None):
+        self.data = copy.deepcopy(data) if data else {}
+        self.gets = 0  # direct reads, to tell mirror hits from fallbacks
+        self._lock = threading.RLock()
+        self._registrations = []
+
+    def reference(self, path='/'):
+        return Reference(self, path)
+
+    # ─────────── WRITES ───────────
+    def put(self, path, data):
+        """Replace the value at path (None deletes it)"""
+        parts = _parts(path)
+        with self._lock:
+            self._set(parts, copy.deepcopy(data))
+            self._notify('put', parts, data)
+
+    def patch(self, path, data):
+        """Update some children of path (a None value deletes that child)"""
+        parts = _parts(path)
+        with self._lock:
+            for key, value in data.items():
+                self._set(parts + _parts(key), copy.deepcopy(value))
+            self._notify('patch', parts, data)
+
+    def delete(self, path):
+        self.put(path, None)
+
+    def drop_streams(self):
+        """Kill every open stream, as a lost connection would"""
+        with self._lock:
+            for registration in self._registrations:
+                registration.alive = False
+            self._registrations = []
+
+    # ─────────── INTERNALS ───────────
+    def _read(self, parts):
+        with self._lock:
+            node = self.data
+            for part in parts:
+                if not isinstance(node, dict) or part not in node:
+                    return None
+                node = node[part]
+            return copy.deepcopy(node)
+
+    def _set(self, parts, value):
+        if not parts:
+            self.data = value if isinstance(value, dict) else {}
+            return
+        node = self.data
+        for part in parts[:-1]:
+            if not isinstance(node.get(part), dict):
+                node[part] = {}
+            node = node[part]
+        if value is None:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = value
+
+    def _listen(self, root, callback):
+        registration = Registration(self, root, callback)
+        with self._lock:
+            self._registrations.append(registration)
+            callback(Event('put', '/', self._read(root)))
+        return registration
+
+    def _remove(self, registration):
+        with self._lock:
+            if registration in self._registrations:
+                self._registrations.remove(registration)
+
+    def _notify(self, event_type, parts, data):
+        for registration in list(self._registrations):
+            root = registration.root
+            if parts[:len(root)] == root:
+                # Inside the listener's subtree
+                path = '/' + '/'.join(parts[len(root):])
+                registration.callback(Event(event_type, path, copy.deepcopy(data)))
+            elif root[:len(parts)] == parts:
+                # Above it: the listener sees its subtree replaced
+                registration.callback(Event('put', '/', self._read(root)))
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+Fake Twilio
+===========
+
+Local stand-in for the parts of the Twilio REST API WeRide uses
+(calls.create, messages.create, call and account fetches), for offline
+end-to-end and load testing. Created calls are played against our own
+webhooks like a real handset would: the call's TwiML URL is fetched, every
+<Gather> is answered with a simulated DTMF digit posted to its action
+(/handle-*-response*), <Redirect> is followed, and the StatusCallback gets
+the final status.
+
+Ringing and "thinking" before a keypress are timers rather than sleeping
+threads, so thousands of calls can be in flight at once; only the webhook
+requests themselves occupy the callback worker pool.
+
+Latency and failures can be injected per API request. Point the app at it
+with:
+
+    TWILIO_API_BASE=http://127.0.0.1:4010 NGROK_BASE=http://127.0.0.1:5000
+
+Usage:
+    python fake_twilio.py [--port 4010] [--latency-ms 50] [--error-rate 0.01]
+                          [--digits 12] [--ring-ms 500] [--think-ms 500]
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urljoin
+from xml.etree import ElementTree
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Twilio error codes returned for injected failures, by HTTP status
+ERROR_CODES = {
+    400: (21211, "The 'To' number is not a valid phone number."),
+    429: (20429, "Too Many Requests"),
+    500: (20500, "An internal server error has occurred"),
+    503: (20503, "Service unavailable")
+}
+
+MAX_DOCUMENTS = 10
+
+_CALLS = re.compile(r'^/2010-04-01/Accounts/(\w+)/Calls(?:/(\w+))?\.json$')
+_MESSAGES = re.compile(r'^/2010-04-01/Accounts/(\w+)/Messages\.json$')
+_ACCOUNT = re.compile(r'^/2010-04-01/Accounts/(\w+)\.json$')
+
+
+class FakeCall:
+    __slots__ = ('sid', 'account_sid', 'to', 'from_', 'url', 'method', 'status_callback',
+                 'status', 'digits', 'documents', 'created_at', 'ended_at')
+
+    def __init__(self, sid, account_sid, to, from_, url, method, status_callback):
+        self.sid = sid
+        self.account_sid = account_sid
+        self.to = to
+        self.from_ = from_
+        self.url = url
+        self.method = method
+        self.status_callback = status_callback
+        self.status = 'queued'
+        self.digits = []
+        self.documents = 0
+        self.created_at = time.time()
+        self.ended_at = None
+
+    def to_dict(self):
+        return {
+            'sid': self.sid,
+            'account_sid': self.account_sid,
+            'to': self.to,
+            'from': self.from_,
+            'status': self.status,
+            'direction': 'outbound-api',
+            'date_created': _rfc2822(self.created_at),
+            'end_time': _rfc2822(self.ended_at) if self.ended_at else None,
+            'uri': f"/2010-04-01/Accounts/{self.account_sid}/Calls/{self.sid}.json"
+        }
+
+
+class FakeTwilio:
+    """Fake Twilio REST API that plays created calls against the app's webhooks"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_statuses=(500,),
+                 no_answer_rate=0.0, ring_seconds=0.5, think_seconds=0.5, digits='12',
+                 callback_workers=32, callback_timeout=10.0, max_calls=100000, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.no_answer_rate = no_answer_rate
+        self.ring_seconds = ring_seconds
+        self.think_seconds = think_seconds
+        self.digits = digits
+        self.callback_timeout = callback_timeout
+        self.max_calls = max_calls
+        self.random = random.Random(seed)
+
+        self.calls = {}
+        self.messages = 0
+        self.counters = {
+            'calls_created': 0, 'calls_completed': 0, 'calls_failed': 0, 'calls_no_answer': 0,
+            'api_errors_injected': 0, 'webhooks': 0, 'webhook_errors': 0, 'digits_sent': 0
+        }
+        self.webhook_latencies = deque(maxlen=max_calls)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+        self._timers = []
+        self._timer_ready = threading.Condition()
+        self._callbacks = ThreadPoolExecutor(max_workers=callback_workers, thread_name_prefix='fake-twilio-call')
+        self._session = requests.Session()
+        self._session.mount('http://', HTTPAdapter(pool_maxsize=callback_workers))
+        self._session.mount('https://', HTTPAdapter(pool_maxsize=callback_workers))
+        self._server = None
+        self._running = True
+        threading.Thread(target=self._run_timers, name='fake-twilio-timers', daemon=True).start()
+
+    # ─────────── SERVER ───────────
+    def start(self, host='127.0.0.1', port=4010):
+        """Serve the REST API from a background thread; returns the base URL"""
+        handler = type('FakeTwilioHandler', (_Handler,), {'fake': self})
+        self._server = _Server((host, port), handler)
+        threading.Thread(target=self._server.serve_forever, name='fake-twilio-http', daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def stop(self):
+        self._running = False
+        with self._timer_ready:
+            self._timer_ready.notify()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        self._callbacks.shutdown(wait=False, cancel_futures=True)
+
+    def in_flight(self):
+        with self._lock:
+            done = self.counters['calls_completed'] + self.counters['calls_failed'] + self.counters['calls_no_answer']
+            return self.counters['calls_created'] - done
+
+    def wait_idle(self, timeout=60.0):
+        """Block until every created call has ended; returns False on timeout"""
+        deadline = time.monotonic() + timeout
+        while self.in_flight():
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters, messages_created=self.messages)
+            latencies = sorted(self.webhook_latencies)
+        stats['in_flight'] = self.in_flight()
+        if latencies:
+            stats['webhook_ms'] = {
+                'p50': _percentile(latencies, 50) * 1000,
+                'p95': _percentile(latencies, 95) * 1000,
+                'p99': _percentile(latencies, 99) * 1000,
+                'max': latencies[-1] * 1000
+            }
+        return stats
+
+    # ─────────── REST API ───────────
+    def handle_api(self, method, path, form, authorized):
+        """Route one REST request; returns (status, JSON body)"""
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        if path == '/_fake/stats':
+            return 200, self.stats()
+        if not authorized:
+            return 401, _error(401, 20003, "Authenticate")
+
+        if method == 'POST' and self.error_rate and self.random.random() < self.error_rate:
+            status = self.random.choice(self.error_statuses)
+            code, message = ERROR_CODES.get(status, (20500, "Injected error"))
+            with self._lock:
+                self.counters['api_errors_injected'] += 1
+            return status, _error(status, code, message)
+
+        match = _CALLS.match(path)
+        if match and method == 'POST' and not match.group(2):
+            return self.create_call(match.group(1), form)
+        if match and method == 'GET' and match.group(2):
+            call = self.calls.get(match.group(2))
+            return (200, call.to_dict()) if call else (404, _error(404, 20404, "Not Found"))
+
+        match = _MESSAGES.match(path)
+        if match and method == 'POST':
+            with self._lock:
+                self.messages += 1
+            return 201, {
+                'sid': f"SM{next(self._ids):032x}",
+                'account_sid': match.group(1),
+                'to': form.get('To'),
+                'from': form.get('From'),
+                'body': form.get('Body'),
+                'status': 'queued',
+                'date_created': _rfc2822(time.time())
+            }
+
+        match = _ACCOUNT.match(path)
+        if match and method == 'GET':
+            return 200, {'sid': match.group(1), 'friendly_name': 'Fake Twilio', 'status': 'active'}
+
+        return 404, _error(404, 20404, "Not Found")
+
+    def create_call(self, account_sid, form):
+        if not form.get('To') or not form.get('From'):
+            return 400, _error(400, 21201, "No 'To' or 'From' number is specified")
+        if not form.get('Url') and not form.get('Twiml'):
+            return 400, _error(400, 21205, "Url parameter is required")
+
+        call = FakeCall(f"CA{next(self._ids):032x}", account_sid, form['To'], form['From'],
+                        form.get('Url'), form.get('Method', 'POST').upper(), form.get('StatusCallback'))
+        with self._lock:
+            self.counters['calls_created'] += 1
+            self.calls[call.sid] = call
+            if len(self.calls) > self.max_calls:
+                # Forget the oldest calls; dicts keep insertion order
+                del self.calls[next(iter(self.calls))]
+
+        self._after(self.ring_seconds, self._answer, call)
+        return 201, call.to_dict()
+
+    # ─────────── CALL SIMULATION ───────────
+    def _answer(self, call):
+        if self.no_answer_rate and self.random.random() < self.no_answer_rate:
+            self._end(call, 'no-answer')
+            return
+        call.status = 'in-progress'
+        self._fetch(call, call.url, call.method, {})
+
+    def _fetch(self, call, url, method, extra):
+        """Fetch a TwiML document for the call and act on it"""
+        if call.documents >= MAX_DOCUMENTS:
+            self._end(call, 'completed')
+            return
+        call.documents += 1
+
+        params = {
+            'CallSid': call.sid,
+            'AccountSid': call.account_sid,
+            'From': call.from_,
+            'To': call.to,
+            'CallStatus': call.status,
+            'Direction': 'outbound-api',
+            'ApiVersion': '2010-04-01'
+        }
+        params.update(extra)
+
+        started = time.perf_counter()
+        try:
+            if method == 'GET':
+                response = self._session.get(url, params=params, timeout=self.callback_timeout)
+            else:
+                response = self._session.post(url, data=params, timeout=self.callback_timeout)
+            response.raise_for_status()
+            document = ElementTree.fromstring(response.content)
+        except (requests.RequestException, ElementTree.ParseError) as e:
+            logger.warning(f"Webhook {url} failed for {call.sid}: {e}")
+            with self._lock:
+                self.counters['webhooks'] += 1
+                self.counters['webhook_errors'] += 1
+            self._end(call, 'failed')
+            return
+        with self._lock:
+            self.counters['webhooks'] += 1
+            self.webhook_latencies.append(time.perf_counter() - started)
+
+        for verb in document:
+            if verb.tag == 'Gather':
+                action = urljoin(url, verb.get('action') or url)
+                digits = ''.join(self.random.choice(self.digits) for _ in range(int(verb.get('numDigits') or 1)))
+                self._after(self.think_seconds, self._press, call, action,
+                            (verb.get('method') or 'POST').upper(), digits)
+                return
+            if verb.tag == 'Redirect' and verb.text:
+                self._fetch(call, urljoin(url, verb.text.strip()), (verb.get('method') or 'POST').upper(), {})
+                return
+            if verb.tag in ('Hangup', 'Reject'):
+                break
+
+        self._end(call, 'completed')
+
+    def _press(self, call, action, method, digits):
+        call.digits.append(digits)
+        with self._lock:
+            self.counters['digits_sent'] += 1
+        self._fetch(call, action, method, {'Digits': digits, 'FinishedOnKey': ''})
+
+    def _end(self, call, status):
+        call.status = status
+        call.ended_at = time.time()
+        counter = {'completed': 'calls_completed', 'no-answer': 'calls_no_answer'}.get(status, 'calls_failed')
+        with self._lock:
+            self.counters[counter] += 1
+
+        if call.status_callback:
+            try:
+                self._session.post(call.status_callback, timeout=self.callback_timeout, data={
+                    'CallSid': call.sid,
+                    'AccountSid': call.account_sid,
+                    'CallStatus': status,
+                    'CallDuration': str(int(call.ended_at - call.created_at))
+                })
+            except requests.RequestException as e:
+                logger.warning(f"Status callback for {call.sid} failed: {e}")
+
+    # ─────────── TIMERS ───────────
+    def _after(self, delay, fn, *args):
+        """Run fn(*args) on the callback pool after `delay` seconds"""
+        with self._timer_ready:
+            heapq.heappush(self._timers, (time.monotonic() + delay, next(self._ids), fn, args))
+            self._timer_ready.notify()
+
+    def _run_timers(self):
+        while self._running:
+            with self._timer_ready:
+                while self._running and (not self._timers or self._timers[0][0] > time.monotonic()):
+                    wait = self._timers[0][0] - time.monotonic() if self._timers else None
+                    self._timer_ready.wait(wait)
+                if not self._running:
+                    return
+                _, _, fn, args = heapq.heappop(self._timers)
+            try:
+                self._callbacks.submit(fn, *args)
+            except RuntimeError:
+                return
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    fake = None
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode() if length else ''
+        form = {key: values[-1] for key, values in parse_qs(body).items()}
+        path = self.path.split('?', 1)[0]
+
+        status, payload = self.fake.handle_api(self.command, path, form, 'Authorization' in self.headers)
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _error(status, code, message):
+    return {'code': code, 'message': message, 'more_info': f"https://www.twilio.com/docs/errors/{code}", 'status': status}
+
+
+def _rfc2822(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%a, %d %b %Y %H:%M:%S +0000')
+
+
+def _percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Twilio REST API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.getenv('FAKE_TWILIO_PORT', '4010')))
+    parser.add_argument('--latency-ms', type=float, default=0, help="delay added to every API request")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="extra random delay, 0..N ms")
+    parser.add_argument('--error-rate', type=float, default=0, help="fraction of POSTs answered with an error")
+    parser.add_argument('--error-status', type=int, action='append', help="HTTP status(es) for injected errors")
+    parser.add_argument('--no-answer-rate', type=float, default=0, help="fraction of calls never answered")
+    parser.add_argument('--ring-ms', type=float, default=500, help="delay before a call fetches its TwiML")
+    parser.add_argument('--think-ms', type=float, default=500, help="delay before each keypress")
+    parser.add_argument('--digits', default='12', help="digits to pick from for each <Gather>")
+    parser.add_argument('--workers', type=int, default=32, help="concurrent webhook requests")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    fake = FakeTwilio(
+        latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate, error_statuses=args.error_status or (500,),
+        no_answer_rate=args.no_answer_rate, ring_seconds=args.ring_ms / 1000,
+        think_seconds=args.think_ms / 1000, digits=args.digits,
+        callback_workers=args.workers, seed=args.seed
+    )
+    base_url = fake.start(args.host, args.port)
+    print(f"📞 Fake Twilio listening on {base_url} (stats: {base_url}/_fake/stats)")
+    try:
+        while True:
+            time.sleep(10)
+            stats = fake.stats()
+            print(f"📊 created={stats['calls_created']} completed={stats['calls_completed']} "
+                  f"failed={stats['calls_failed']} in_flight={stats['in_flight']} "
+                  f"webhooks={stats['webhooks']} digits={stats['digits_sent']}")
+    except KeyboardInterrupt:
+        print(json.dumps(fake.stats(), indent=2))
+        fake.stop()
@@ -1,8 +1,14 @@
 import firebase_admin
-from firebase_admin import credentials, db
+from firebase_admin import credentials, db, exceptions as firebase_errors
 import os
+import requests
 from dotenv import load_dotenv
 
+from config import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS, RETRY_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY
+from lazy_init import LazyResource
+from resilience import CircuitBreaker
+from ride_status_mirror import RideStatusMirror
+
 # 🔄 Load .env
 load_dotenv()
 
@@ -10,17 +16,60 @@ load_dotenv()
 cred_path = os.getenv("FIREBASE_CRED_PATH")
 db_url = os.getenv("FIREBASE_DB")
 
-if not cred_path or not db_url:
-    raise Exception("❌ Firebase config missing in .env")
 
-cred = credentials.Certificate(cred_path)
-firebase_admin.initialize_app(cred, {
-    'databaseURL': db_url
-})
+def _initialize_firebase():
+    if not cred_path or not db_url:
+        raise Exception("❌ Firebase config missing in .env")
+
+    cred = credentials.Certificate(cred_path)
+    return firebase_admin.initialize_app(cred, {
+        'databaseURL': db_url
+    })
+
+
+# Credentials are loaded on the first database access, not at import
+firebase_app = LazyResource(_initialize_firebase, 'firebase')
+
+
+def reference(path):
+    """firebase_admin.db.reference, initializing the Firebase app on first use"""
+    firebase_app.get()
+    return db.reference(path)
+
+
+def is_firebase_failure(exc):
+    """Errors that say Firebase is unreachable or unhealthy, rather than a bad request"""
+    return isinstance(exc, (
+        firebase_errors.UnavailableError,
+        firebase_errors.DeadlineExceededError,
+        firebase_errors.InternalError,
+        firebase_errors.UnknownError,
+        requests.exceptions.RequestException,
+        ConnectionError,
+        TimeoutError
+    ))
+
+
+# Reads are idempotent, so every failure above is retried
+firebase_breaker = CircuitBreaker(
+    'firebase',
+    failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=CIRCUIT_RESET_SECONDS,
+    attempts=RETRY_ATTEMPTS,
+    base_delay=RETRY_BASE_DELAY,
+    max_delay=RETRY_MAX_DELAY,
+    is_failure=is_firebase_failure
+)
+
 
-# ✅ THIS is the missing part: 'db' is the firebase_admin.db now available
+rides_mirror = RideStatusMirror(
+    reference,
+    max_active=int(os.getenv("FIREBASE_MIRROR_MAX_ACTIVE", "10000")),
+    max_finished=int(os.getenv("FIREBASE_MIRROR_MAX_FINISHED", "1000")),
+    breaker=firebase_breaker
+)
 
 # 🎯 Function you need
 def get_realtime_status(ride_id):
-    ref = db.reference(f"rides/{ride_id}")
-    return ref.get() or {}
+    rides_mirror.start()
+    return rides_mirror.get(ride_id)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Vectorized Distances and ETAs
+=============================
+
+Haversine distances and drive-time estimates over NumPy arrays, so a
+batch (every pending ride, or every online driver against one pickup) is
+a few array operations instead of a Python loop per pair. Straight-line
+distance is scaled by ROAD_DISTANCE_FACTOR to approximate the distance by
+road, and ETAs assume an average speed of ETA_SPEED_KMH.
+
+Rides created before estimates were filled in can be backfilled with:
+
+    python geometry.py
+"""
+
+import numpy as np
+from sqlalchemy import bindparam
+
+from config import ETA_SPEED_KMH, ROAD_DISTANCE_FACTOR
+from db.models import db, Ride
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """
+    Great-circle distance, element-wise
+
+    Args:
+        lat1, lng1, lat2, lng2: Degrees, as scalars or arrays that broadcast
+            together (e.g. one pickup against arrays of driver positions)
+
+    Returns:
+        Kilometres as a float64 array; NaN where a coordinate is None
+    """
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(value, dtype=np.float64))
+                              for value in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    # Rounding can push a hair past 1 for antipodal points
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def eta_minutes(distance_km, speed_kmh=ETA_SPEED_KMH):
+    """Whole minutes to drive each distance, at least 1 (NaN stays NaN)"""
+    return np.maximum(np.ceil(np.asarray(distance_km, dtype=np.float64) / speed_kmh * 60), 1)
+
+
+def trip_estimates(pickup_lat, pickup_lng, dest_lat, dest_lng,
+                   speed_kmh=ETA_SPEED_KMH, road_factor=ROAD_DISTANCE_FACTOR):
+    """
+    Road distance and drive time of trips, element-wise
+
+    Returns:
+        (distance_km, duration_min) float64 arrays
+    """
+    distance = haversine_km(pickup_lat, pickup_lng, dest_lat, dest_lng) * road_factor
+    return distance, eta_minutes(distance, speed_kmh)
+
+
+def pickup_etas(pickup_lat, pickup_lng, driver_lats, driver_lngs,
+                speed_kmh=ETA_SPEED_KMH, road_factor=ROAD_DISTANCE_FACTOR):
+    """
+    Road distance and drive time from each driver to one pickup
+
+    Returns:
+        (distance_km, minutes) float64 arrays, one entry per driver
+    """
+    return trip_estimates(driver_lats, driver_lngs, pickup_lat, pickup_lng, speed_kmh, road_factor)
+
+
+def estimate_ride(ride):
+    """Set a ride's estimated_distance and estimated_duration if both ends have coordinates"""
+    coordinates = (ride.pickup_lat, ride.pickup_lng, ride.destination_lat, ride.destination_lng)
+    if None in coordinates:
+        return
+    distance, duration = trip_estimates(*(float(value) for value in coordinates))
+    ride.estimated_distance = round(float(distance), 2)
+    ride.estimated_duration = int(duration)
+
+
+def fill_ride_estimates(status='pending', batch_size=5000):
+    """
+    Compute estimates for every ride in a status that has coordinates but
+    no estimate yet: one vectorized pass and one UPDATE executemany per batch
+
+    Returns:
+        Number of rides updated
+    """
+    table = Ride.__table__
+    update = (table.update()
+              .where(table.c.id == bindparam('ride_id'))
+              .values(estimated_distance=bindparam('distance'), estimated_duration=bindparam('duration')))
+    updated = 0
+    last_id = 0
+    while True:
+        rows = (db.session.query(Ride.id, Ride.pickup_lat, Ride.pickup_lng,
+                                 Ride.destination_lat, Ride.destination_lng)
+                .filter(Ride.status == status, Ride.estimated_distance.is_(None), Ride.id > last_id,
+                        Ride.pickup_lat.isnot(None), Ride.pickup_lng.isnot(None),
+                        Ride.destination_lat.isnot(None), Ride.destination_lng.isnot(None))
+                .order_by(Ride.id)
+                .limit(batch_size)
+                .all())
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        columns = np.array([row[1:] for row in rows], dtype=np.float64).T
+        distance, duration = trip_estimates(*columns)
+        db.session.execute(update, [
+            {'ride_id': row[0], 'distance': km, 'duration': minutes}
+            for row, km, minutes in zip(rows, np.round(distance, 2).tolist(), duration.astype(int).tolist())
+        ])
+        db.session.commit()
+        updated += len(rows)
+    return updated
+
+
+def main():
+    import argparse
+    import os
+
+    from dotenv import load_dotenv
+    from flask import Flask
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Fill in distance and duration estimates for rides missing them")
+    parser.add_argument('--status', default='pending', help="Rides in this status (default: pending)")
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI', 'sqlite:///weride.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    with app.app_context():
+        updated = fill_ride_estimates(args.status, args.batch_size)
+    print(f"✅ Estimated distance and duration for {updated} {args.status} rides")
+
+
+if __name__ == "__main__":
+    main()
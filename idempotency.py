@@ -0,0 +1,190 @@
+"""
+Idempotency Keys
+================
+
+Safe retries for POST endpoints that create rows or place calls. A client
+sends an `Idempotency-Key` header (Twilio's `I-Twilio-Idempotency-Token` is
+honoured the same way); the first request with a key claims it in the
+IdempotencyKey table and runs the handler, and its response is stored for
+`ttl` seconds. A repeat of the same request is answered from the table
+without running the handler again, so no second ride, offer or call is made.
+
+The claim is an INSERT on the primary key, so two workers racing on one key
+can't both run the handler: the loser gets 409 while the first is still in
+progress, and the stored response once it finishes. Reusing a key for a
+different request body gets 422. Server errors (5xx) release the key so the
+request can be retried. Requests without a key are not affected.
+"""
+
+import hashlib
+import logging
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import Response, jsonify, request
+from sqlalchemy.exc import IntegrityError
+
+from db.models import db, IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+KEY_HEADERS = ('Idempotency-Key', 'I-Twilio-Idempotency-Token')
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyStore:
+    """Database-backed idempotency keys with stored responses and a TTL"""
+
+    def __init__(self, app=None, ttl=86400, lock_timeout=60, purge_interval=300):
+        self.app = None
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.purge_interval = purge_interval
+        self._purged_at = 0.0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['idempotency'] = self
+
+    def idempotent(self, view):
+        """Decorator for a view whose repeats should replay the first response"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request_key()
+            if key is None:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({'success': False, 'error': 'Idempotency key is too long'}), 400
+
+            fingerprint = request_fingerprint()
+            existing = self.claim(key, fingerprint)
+            if existing is not None:
+                return self._replay(existing, fingerprint)
+
+            try:
+                response = view(*args, **kwargs)
+            except Exception:
+                self.release(key)
+                raise
+
+            response = self.app.make_response(response)
+            if response.status_code >= 500 or response.is_streamed:
+                self.release(key)
+            else:
+                self.complete(key, response)
+            return response
+
+        return wrapper
+
+    def claim(self, key, fingerprint):
+        """
+        Claim a key for the current request
+
+        Returns:
+            None if the caller now owns the key, otherwise the existing IdempotencyKey
+        """
+        now = datetime.utcnow()
+        db.session.rollback()
+
+        # An expired key, or one whose owner died mid-request, can be taken over
+        IdempotencyKey.query.filter(
+            IdempotencyKey.key == key,
+            (IdempotencyKey.expires_at <= now) | (
+                (IdempotencyKey.status == 'in_progress') &
+                (IdempotencyKey.created_at <= now - timedelta(seconds=self.lock_timeout))
+            )
+        ).delete(synchronize_session=False)
+        self._purge_expired(now)
+
+        db.session.add(IdempotencyKey(
+            key=key,
+            fingerprint=fingerprint,
+            status='in_progress',
+            created_at=now,
+            expires_at=now + timedelta(seconds=self.ttl)
+        ))
+        try:
+            db.session.commit()
+            return None
+        except IntegrityError:
+            db.session.rollback()
+
+        existing = IdempotencyKey.query.get(key)
+        if existing is None:
+            # Released between our INSERT and SELECT; try once more
+            return self.claim(key, fingerprint)
+        return existing
+
+    def complete(self, key, response):
+        """Store the response for replay"""
+        try:
+            IdempotencyKey.query.filter_by(key=key).update({
+                'status': 'completed',
+                'response_status': response.status_code,
+                'response_body': response.get_data(as_text=True),
+                'response_mimetype': response.mimetype
+            }, synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Failed to store response for idempotency key %s: %s", key, e)
+
+    def release(self, key):
+        """Forget an unfinished key so the request can be retried"""
+        try:
+            db.session.rollback()
+            IdempotencyKey.query.filter_by(key=key, status='in_progress').delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Failed to release idempotency key %s: %s", key, e)
+
+    def _replay(self, existing, fingerprint):
+        if existing.fingerprint != fingerprint:
+            return jsonify({
+                'success': False,
+                'error': 'Idempotency key was already used for a different request'
+            }), 422
+        if existing.status != 'completed':
+            response = jsonify({'success': False, 'error': 'A request with this idempotency key is in progress'})
+            response.status_code = 409
+            response.headers['Retry-After'] = '1'
+            return response
+
+        response = Response(existing.response_body, status=existing.response_status,
+                            mimetype=existing.response_mimetype)
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+
+    def _purge_expired(self, now):
+        # Bulk-delete expired keys at most once per purge_interval
+        if time.monotonic() - self._purged_at < self.purge_interval:
+            return
+        self._purged_at = time.monotonic()
+        purged = IdempotencyKey.query.filter(IdempotencyKey.expires_at <= now).delete(synchronize_session=False)
+        if purged:
+            logger.info("Purged %d expired idempotency keys", purged)
+
+
+def request_key():
+    """The idempotency key sent with the current request, if any"""
+    for header in KEY_HEADERS:
+        key = request.headers.get(header)
+        if key:
+            return key.strip()
+    return None
+
+
+def request_fingerprint():
+    """sha256 of the request method, path and body"""
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(b'\0')
+    digest.update(request.path.encode())
+    digest.update(b'\0')
+    digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
@@ -0,0 +1,51 @@
+"""
+Lazy Initialization
+===================
+
+Deferred construction of expensive process-wide clients (the Twilio REST
+client, the Firebase app). The factory runs on first use - once, even when
+concurrent requests race for it - so a serverless cold start only pays for
+the clients the request actually touches.
+"""
+
+import threading
+
+_UNSET = object()
+
+
+class LazyResource:
+    """A value built by `factory` on the first get()"""
+
+    def __init__(self, factory, name=None):
+        self.factory = factory
+        self.name = name or getattr(factory, '__name__', 'resource')
+        self._value = _UNSET
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self):
+        return self._value is not _UNSET
+
+    def get(self):
+        """
+        Return the value, building it on first use
+
+        A factory that raises is retried on the next call; any return value,
+        including None (e.g. "no credentials, run in demo mode"), is kept.
+        """
+        value = self._value
+        if value is not _UNSET:
+            return value
+        with self._lock:
+            if self._value is _UNSET:
+                self._value = self.factory()
+            return self._value
+
+    def reset(self):
+        """Drop the built value so the next get() rebuilds it"""
+        with self._lock:
+            self._value = _UNSET
+
+    def __repr__(self):
+        state = 'initialized' if self.initialized else 'pending'
+        return f"<LazyResource {self.name} ({state})>"
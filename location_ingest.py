@@ -0,0 +1,320 @@
+"""
+Driver Location Ingestion
+=========================
+
+Write-behind buffer for driver GPS pings. Pings from many drivers are
+accepted in bulk, held in memory and flushed to Driver and RideTracking in
+periodic bulk statements instead of one lookup, insert and commit per ping.
+
+A batch that keeps failing (anything but the database being unreachable) is
+retried max_attempts times, then written again in flush_size chunks; chunks
+that still fail are dropped to the "location_ingest.dead_letter" logger so a
+single bad ping can't hold the buffer hostage.
+"""
+
+import atexit
+import logging
+import signal
+import sys
+import threading
+from datetime import datetime, timezone
+from itertools import groupby
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import OperationalError, StatementError
+
+from db.models import db, User, Driver, Ride, RideTracking
+from driver_index import driver_info
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+# One line per dropped ping, so they can be routed to a file and replayed
+dead_letter = logging.getLogger(f"{__name__}.dead_letter")
+
+pings_dropped = registry.counter(
+    'location_pings_dropped_total', "GPS pings or track points dropped instead of written", ('reason',))
+
+
+class LocationPing:
+    __slots__ = ('phone', 'lat', 'lng', 'timestamp')
+
+    def __init__(self, phone, lat, lng, timestamp):
+        self.phone = phone
+        self.lat = lat
+        self.lng = lng
+        self.timestamp = timestamp
+
+
+class LocationIngestBuffer:
+    """Buffer driver location pings and flush them to the database in batches"""
+
+    def __init__(self, app=None, flush_size=500, flush_interval=2.0, max_buffered=50000, driver_index=None, ride_events=None,
+                 track_store=None, max_attempts=5):
+        self.app = None
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.max_attempts = max_attempts
+        self.driver_index = driver_index
+        self.ride_events = ride_events
+        # When set, ride tracks are appended here instead of as RideTracking rows
+        self.track_store = track_store
+        self._pings = []
+        # Consecutive failed flushes of the batch at the head of the buffer
+        self._failures = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['location_ingest'] = self
+
+        # Buffered pings must reach the database on a graceful shutdown
+        atexit.register(self.stop)
+        _exit_on_sigterm()
+
+    def __len__(self):
+        return len(self._pings)
+
+    def add(self, pings):
+        """
+        Buffer a batch of validated pings
+
+        Args:
+            pings: Iterable of LocationPing
+
+        Returns:
+            Number of pings accepted; 0 if the buffer is full
+        """
+        pings = list(pings)
+        with self._lock:
+            if len(self._pings) + len(pings) > self.max_buffered:
+                return 0
+            self._pings.extend(pings)
+            size = len(self._pings)
+
+        self._ensure_started()
+        if size >= self.flush_size:
+            self._wakeup.set()
+        return len(pings)
+
+    def flush(self):
+        """Write every buffered ping to the database; returns the number written"""
+        with self._flush_lock:
+            with self._lock:
+                pings, self._pings = self._pings, []
+            if not pings:
+                return 0
+
+            try:
+                with self.app.app_context():
+                    self._write(pings)
+            except Exception as e:
+                logger.error(f"Location flush of {len(pings)} pings failed: {e}")
+                # An unreachable database isn't the batch's fault; keep it until the database is back
+                if not isinstance(e, OperationalError):
+                    self._failures += 1
+                if self._failures < self.max_attempts:
+                    self._requeue(pings)
+                    raise
+                self._failures = 0
+                return self._salvage(pings)
+            self._failures = 0
+            return len(pings)
+
+    def stop(self):
+        """Stop the flusher thread and write out whatever is still buffered"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval + 30)
+        try:
+            self.flush()
+        except Exception:
+            with self._lock:
+                pings, self._pings = self._pings, []
+            logger.error(f"Dropping {len(pings)} buffered location pings on shutdown")
+            self._drop(pings, 'shutdown')
+
+    # ─────────── FAILED BATCHES ───────────
+    def _requeue(self, pings):
+        # Put the batch back in front of anything that arrived meanwhile
+        with self._lock:
+            self._pings[:0] = pings
+
+    def _salvage(self, pings):
+        """Write a batch that kept failing in flush_size chunks, dropping the chunks that still fail"""
+        written = 0
+        for start in range(0, len(pings), self.flush_size):
+            chunk = pings[start:start + self.flush_size]
+            try:
+                with self.app.app_context():
+                    self._write(chunk)
+            except OperationalError:
+                # The database went away mid-salvage: keep the rest for the next tick
+                self._requeue(pings[start:])
+                raise
+            except Exception as e:
+                logger.error(f"Dropping {len(chunk)} location pings after {self.max_attempts} failed flushes: {e}")
+                self._drop(chunk, 'failed_batch')
+            else:
+                written += len(chunk)
+        return written
+
+    @staticmethod
+    def _drop(pings, reason):
+        for ping in pings:
+            dead_letter.warning(f"{reason} {ping.phone} {ping.lat} {ping.lng} {ping.timestamp.isoformat()}")
+        pings_dropped.inc(reason, amount=len(pings))
+
+    # ─────────── BACKGROUND FLUSHER ───────────
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="location-ingest", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                return
+            try:
+                self.flush()
+            except Exception:
+                # Already logged; the batch stays buffered for the next tick
+                pass
+
+    def _write(self, pings):
+        phones = {ping.phone for ping in pings}
+        drivers = db.session.query(User, Driver).join(Driver, User.id == Driver.user_id).filter(User.phone.in_(phones)).all()
+        by_phone = {user.phone: (user, driver) for user, driver in drivers}
+
+        user_ids = [user.id for user, _ in drivers]
+        active_rides = dict(
+            db.session.query(Ride.driver_id, Ride.id)
+            .filter(Ride.driver_id.in_(user_ids), Ride.status == 'accepted')
+            .all()
+        ) if user_ids else {}
+
+        latest = {}
+        latest_by_ride = {}
+        tracking_rows = []
+        for ping in pings:
+            match = by_phone.get(ping.phone)
+            if match is None:
+                continue
+            current = latest.get(ping.phone)
+            if current is None or ping.timestamp >= current.timestamp:
+                latest[ping.phone] = ping
+            ride_id = active_rides.get(match[0].id)
+            if ride_id is not None:
+                tracking_rows.append({
+                    'ride_id': ride_id,
+                    'driver_lat': ping.lat,
+                    'driver_lng': ping.lng,
+                    'timestamp': ping.timestamp
+                })
+                if ride_id not in latest_by_ride or ping.timestamp >= latest_by_ride[ride_id].timestamp:
+                    latest_by_ride[ride_id] = ping
+
+        # Only the newest ping per driver matters for the Driver row
+        driver_rows = [{
+            'id': by_phone[phone][1].id,
+            'current_lat': ping.lat,
+            'current_lng': ping.lng,
+            'last_location_update': ping.timestamp
+        } for phone, ping in latest.items()]
+
+        if driver_rows:
+            db.session.execute(update(Driver), driver_rows)
+        if tracking_rows and self.track_store is not None:
+            tracking_rows.sort(key=lambda row: (row['ride_id'], row['timestamp']))
+            for ride_id, rows in groupby(tracking_rows, key=lambda row: row['ride_id']):
+                points = [(row['driver_lat'], row['driver_lng'], row['timestamp']) for row in rows]
+                try:
+                    # Savepoint: one ride's bad track mustn't roll back the Driver updates
+                    with db.session.begin_nested():
+                        self.track_store.append(ride_id, points)
+                except OperationalError:
+                    raise
+                except (ValueError, RuntimeError, StatementError) as e:
+                    # A bogus client timestamp or a contended track mustn't keep the whole batch buffered
+                    logger.warning(f"Dropped {len(points)} track points for ride {ride_id}: {e}")
+                    pings_dropped.inc('bad_track', amount=len(points))
+        elif tracking_rows:
+            db.session.execute(insert(RideTracking), tracking_rows)
+        db.session.commit()
+
+        if self.driver_index is not None:
+            for phone, ping in latest.items():
+                user, driver = by_phone[phone]
+                if driver.is_online:
+                    self.driver_index.upsert(user.id, ping.lat, ping.lng, driver_info(user, driver))
+                else:
+                    self.driver_index.remove(user.id)
+
+        if self.ride_events is not None:
+            for ride_id, ping in latest_by_ride.items():
+                self.ride_events.publish(ride_id, 'driver-location', {
+                    'lat': ping.lat,
+                    'lng': ping.lng,
+                    'timestamp': ping.timestamp
+                })
+
+        skipped = len(pings) - sum(1 for ping in pings if ping.phone in by_phone)
+        logger.info(f"Flushed {len(pings)} location pings: {len(driver_rows)} drivers, "
+                    f"{len(tracking_rows)} tracking points, {skipped} unknown")
+
+
+def parse_ping(data):
+    """
+    Validate one ping from a bulk request
+
+    Returns:
+        LocationPing, or None if the ping is malformed
+    """
+    try:
+        phone = data['driver_phone']
+        lat = float(data['lat'])
+        lng = float(data['lng'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not phone or not -90 <= lat <= 90 or not -180 <= lng <= 180:
+        return None
+
+    timestamp = data.get('timestamp')
+    try:
+        if isinstance(timestamp, (int, float)):
+            timestamp = datetime.utcfromtimestamp(timestamp)
+        elif timestamp:
+            timestamp = datetime.fromisoformat(str(timestamp).replace('Z', '+00:00'))
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        else:
+            timestamp = datetime.utcnow()
+    except (ValueError, OverflowError, OSError):
+        return None
+
+    return LocationPing(phone, lat, lng, timestamp)
+
+
+def _exit_on_sigterm():
+    """Turn SIGTERM into a normal interpreter exit so atexit flushes run"""
+    if threading.current_thread() is not threading.main_thread():
+        return
+    try:
+        if signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    except (ValueError, OSError):
+        pass
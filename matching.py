@@ -0,0 +1,444 @@
+"""
+Batch Ride Matching
+===================
+
+Optional dispatcher that offers pending rides to idle drivers in rounds,
+instead of waiting for drivers to find rides in /api/available-rides. Each
+round takes every pending ride without an open offer and every online
+driver with no active ride and no open offer, and assigns them together:
+
+- Candidates come from a spatial prefilter (a DriverIndex over the idle
+  drivers): each ride only considers its `candidates` nearest drivers
+  within `radius_km`, so the graph stays sparse.
+- Pickup and trip distances are road estimates from geometry (haversine
+  times ROAD_DISTANCE_FACTOR), computed per ride over all its candidates
+  at once. An edge costs the pickup distance in km plus `price_weight` km
+  per unit the driver's ask (hourly_rate over pickup and trip time)
+  exceeds the passenger's offer.
+- assign() solves the whole graph with an epsilon-scaling auction, so a
+  ride never takes the one driver a neighbouring ride can't do without.
+- The candidate graph and the auction are pure CPU work. They run in a
+  child process, so a round doesn't hold the web process's GIL. A round
+  takes at most `max_rides` rides, oldest first, because the auction grows
+  faster than linearly: about 1 s for 2,000 rides and 10 s for 10,000. The
+  rest wait for the next round. The city's graph is one connected
+  component, so splitting it into components wouldn't help.
+
+The resulting offers are inserted in one transaction. Each insert re-checks
+that the ride is still pending and the driver still free, so a manual offer
+or acceptance made during the round wins. Passengers accept them through
+/api/accept-offer as usual.
+"""
+
+import logging
+import math
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import bindparam, exists, literal, select
+
+from db.models import db, User, Driver, Ride, RideOffer
+from driver_index import KM_PER_DEGREE, DriverIndex
+from geometry import pickup_etas, trip_estimates
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_RIDE_STATUSES = ('accepted', 'en_route', 'arrived', 'in_progress')
+OFFER_MESSAGE = 'Matched automatically'
+
+matching_rounds = registry.histogram(
+    'matching_round_seconds', "Time to load, assign and write one matching round", ('phase',),
+    (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+matching_offers = registry.counter(
+    'matching_offers_total', "Offers from the matcher, by whether they were written", ('outcome',))
+
+
+class MatchingEngine:
+    """Periodic global assignment of pending rides to idle drivers"""
+
+    def __init__(self, app=None, interval=5.0, radius_km=5.0, candidates=8, price_weight=0.1,
+                 speed_kmh=30.0, max_rides=2000, on_offers=None, isolate=True):
+        """
+        Args:
+            interval: Seconds between rounds
+            radius_km: Furthest pickup a driver is offered
+            candidates: Nearest drivers considered per ride
+            price_weight: Pickup km one unit of price gap is worth
+            speed_kmh: Average speed for pickup ETAs and drivers' asks
+            max_rides: Pending rides per round, oldest first
+            on_offers: Called with the list of written offers after each round
+            isolate: Build the graph and run the auction in a child process
+        """
+        self.app = None
+        self.interval = interval
+        self.radius_km = radius_km
+        self.candidates = candidates
+        self.price_weight = price_weight
+        self.speed_kmh = speed_kmh
+        self.max_rides = max_rides
+        self.on_offers = on_offers
+        self.isolate = isolate
+        self._pool = None
+        self._round_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['matching'] = self
+
+    def start(self):
+        """Run a round every interval seconds in a background thread"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="ride-matching", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.interval + 30)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def run_once(self, wait=True):
+        """
+        Match one round and write its offers
+
+        Args:
+            wait: Wait for a round already in progress to finish first;
+                if False, return None instead
+
+        Returns:
+            Summary dict: rides and drivers considered, candidate edges,
+            offers written, total pickup km and per-phase seconds
+        """
+        if not self._round_lock.acquire(blocking=wait):
+            return None
+        try:
+            started = time.perf_counter()
+            rides, drivers = self.load()
+            loaded = time.perf_counter()
+
+            proposals, edge_count = self.solve(rides, drivers)
+            solved = time.perf_counter()
+
+            offers = self.write(proposals)
+            written = time.perf_counter()
+        finally:
+            self._round_lock.release()
+
+        matching_rounds.observe(loaded - started, 'load')
+        matching_rounds.observe(solved - loaded, 'assign')
+        matching_rounds.observe(written - solved, 'write')
+        matching_offers.inc('written', amount=len(offers))
+        matching_offers.inc('stale', amount=len(proposals) - len(offers))
+
+        if offers and self.on_offers is not None:
+            self.on_offers(offers)
+        return {
+            'rides': len(rides),
+            'drivers': len(drivers),
+            'edges': edge_count,
+            'offers': len(offers),
+            'pickup_km': round(sum(offer['pickup_km'] for offer in offers), 3),
+            'seconds': {
+                'load': round(loaded - started, 4),
+                'assign': round(solved - loaded, 4),
+                'write': round(written - solved, 4)
+            }
+        }
+
+    def solve(self, rides, drivers):
+        """
+        Candidate graph and assignment, in the child process when isolated
+
+        Returns:
+            (proposals, edge_count): proposals as (ride_id, driver_id,
+            offered_price, pickup_km, pickup_minutes)
+        """
+        if not self.isolate or not rides or not drivers:
+            return self.propose(rides, drivers)
+        settings = (self.radius_km, self.candidates, self.price_weight, self.speed_kmh)
+        try:
+            return self._get_pool().submit(_propose, settings, rides, drivers).result()
+        except BrokenProcessPool:
+            # The child died (e.g. killed for memory); start a fresh one next round
+            self._pool = None
+            raise
+
+    def propose(self, rides, drivers):
+        """Build the candidate graph, assign it and pick each matched ride's edge"""
+        edges = self.candidate_edges(rides, drivers)
+        chosen = assign([[(driver_id, cost) for driver_id, cost, _, _, _ in ride_edges] for ride_edges in edges])
+        proposals = []
+        for ride, ride_edges, driver_id in zip(rides, edges, chosen):
+            if driver_id is None:
+                continue
+            for candidate, _, price, pickup_km, pickup_min in ride_edges:
+                if candidate == driver_id:
+                    proposals.append((ride[0], driver_id, price, pickup_km, pickup_min))
+                    break
+        return proposals, sum(len(ride_edges) for ride_edges in edges)
+
+    def _get_pool(self):
+        # One long-lived child, started by the first round; spawn, since the web process runs threads
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def load(self):
+        """
+        Pending rides without an open offer and idle online drivers
+
+        Returns:
+            (rides, drivers): rides as (id, passenger_id, pickup_lat, pickup_lng,
+            trip_km, passenger_offer) oldest first; drivers as (user_id, lat,
+            lng, hourly_rate)
+        """
+        open_offer = exists().where(RideOffer.ride_id == Ride.id, RideOffer.status == 'pending')
+        rows = (db.session.query(Ride.id, Ride.passenger_id, Ride.pickup_lat, Ride.pickup_lng,
+                                 Ride.destination_lat, Ride.destination_lng, Ride.estimated_distance,
+                                 Ride.passenger_offer)
+                .filter(Ride.status == 'pending', Ride.pickup_lat.isnot(None), Ride.pickup_lng.isnot(None),
+                        ~open_offer)
+                .order_by(Ride.requested_at, Ride.id)
+                .limit(self.max_rides)
+                .all())
+        # Rides created before estimates were stored get theirs here, in one pass
+        missing = [row for row in rows if row[6] is None and row[4] is not None and row[5] is not None]
+        estimated = {}
+        if missing:
+            columns = np.array([row[2:6] for row in missing], dtype=np.float64).T
+            distances, _ = trip_estimates(*columns, speed_kmh=self.speed_kmh)
+            estimated = dict(zip((row[0] for row in missing), distances.tolist()))
+        rides = [(ride_id, passenger_id, lat, lng, estimated.get(ride_id, distance) or 0.0, passenger_offer)
+                 for ride_id, passenger_id, lat, lng, _, _, distance, passenger_offer in rows]
+
+        busy = exists().where(Ride.driver_id == User.id, Ride.status.in_(ACTIVE_RIDE_STATUSES))
+        offering = exists().where(RideOffer.driver_id == User.id, RideOffer.status == 'pending')
+        drivers = (db.session.query(User.id, Driver.current_lat, Driver.current_lng, Driver.hourly_rate)
+                   .join(Driver, User.id == Driver.user_id)
+                   .filter(Driver.is_online == True, Driver.current_lat.isnot(None),
+                           Driver.current_lng.isnot(None), ~busy, ~offering)
+                   .all())
+        db.session.rollback()
+        return rides, [tuple(driver) for driver in drivers]
+
+    def candidate_edges(self, rides, drivers):
+        """
+        Sparse candidate graph: for each ride, its nearest idle drivers
+
+        Returns:
+            One list per ride of (driver_id, cost, offered_price, pickup_km,
+            pickup_minutes), the pickup by road
+        """
+        index = DriverIndex(cell_size_deg=max(self.radius_km / KM_PER_DEGREE / 4, 0.005))
+        for driver_id, lat, lng, hourly_rate in drivers:
+            index.upsert(driver_id, lat, lng, {'hourly_rate': hourly_rate or 0.0})
+
+        edges = []
+        for ride_id, passenger_id, lat, lng, trip_km, passenger_offer in rides:
+            nearby = [(driver_id, driver_lat, driver_lng, info['hourly_rate'])
+                      for _, driver_id, driver_lat, driver_lng, info
+                      in index.nearest(lat, lng, self.radius_km, self.candidates)
+                      if driver_id != passenger_id]
+            if not nearby:
+                edges.append([])
+                continue
+            driver_ids, driver_lats, driver_lngs, rates = zip(*nearby)
+            pickup_km, pickup_min = pickup_etas(lat, lng, driver_lats, driver_lngs, speed_kmh=self.speed_kmh)
+            asks = np.asarray(rates) * (pickup_km + trip_km) / self.speed_kmh
+            gaps = np.maximum(asks - passenger_offer, 0.0)
+            costs = pickup_km + self.price_weight * gaps
+            prices = np.round(passenger_offer + gaps, 2)
+            edges.append(list(zip(driver_ids, costs.tolist(), prices.tolist(), pickup_km.tolist(),
+                                  pickup_min.astype(int).tolist())))
+        return edges
+
+    def write(self, proposals):
+        """
+        Insert the proposed offers in one transaction
+
+        A proposal is skipped if its ride stopped being pending or its driver
+        took a ride or made an offer since the round loaded them.
+
+        Returns:
+            The written offers as dicts
+        """
+        if not proposals:
+            return []
+        now = datetime.utcnow()
+        ride_id = bindparam('ride_id')
+        driver_id = bindparam('driver_id')
+        still_free = select(ride_id, driver_id, bindparam('offered_price'), bindparam('pickup_time'),
+                            literal(OFFER_MESSAGE), literal('pending'), literal(now)).where(
+            exists().where(Ride.id == ride_id, Ride.status == 'pending'),
+            # Spelled out as binds: an expanding IN can't be used with executemany
+            ~exists().where(Ride.driver_id == driver_id,
+                            Ride.status.in_([literal(status) for status in ACTIVE_RIDE_STATUSES])),
+            ~exists().where(RideOffer.driver_id == driver_id, RideOffer.status == 'pending'),
+            ~exists().where(RideOffer.ride_id == ride_id, RideOffer.status == 'pending')
+        )
+        statement = RideOffer.__table__.insert().from_select(
+            ['ride_id', 'driver_id', 'offered_price', 'estimated_pickup_time', 'message', 'status', 'created_at'],
+            still_free)
+
+        rows = [{
+            'ride_id': ride,
+            'driver_id': driver,
+            'offered_price': price,
+            'pickup_time': pickup_min
+        } for ride, driver, price, _, pickup_min in proposals]
+        pickup = {ride: pickup_km for ride, _, _, pickup_km, _ in proposals}
+
+        try:
+            db.session.execute(statement, rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        offers = []
+        ride_ids = list(pickup)
+        for start in range(0, len(ride_ids), 500):
+            for offer_id, ride, driver, price, pickup_time in (
+                    db.session.query(RideOffer.id, RideOffer.ride_id, RideOffer.driver_id,
+                                     RideOffer.offered_price, RideOffer.estimated_pickup_time)
+                    .filter(RideOffer.ride_id.in_(ride_ids[start:start + 500]),
+                            RideOffer.status == 'pending', RideOffer.created_at == now,
+                            RideOffer.message == OFFER_MESSAGE)):
+                offers.append({'offer_id': offer_id, 'ride_id': ride, 'driver_id': driver,
+                               'offered_price': price, 'pickup_time': pickup_time,
+                               'pickup_km': round(pickup[ride], 3), 'message': OFFER_MESSAGE})
+        db.session.rollback()
+        return offers
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            if multiprocessing.parent_process() is not None:
+                # A spawned solver re-imports the main module (app.py under `python app.py`);
+                # it mustn't run rounds, and start solvers, of its own
+                return
+            try:
+                with self.app.app_context():
+                    summary = self.run_once()
+                if summary['offers']:
+                    logger.info("Matching round: %d offers for %d rides and %d drivers",
+                                summary['offers'], summary['rides'], summary['drivers'])
+            except Exception as e:
+                logger.error("Matching round failed: %s", e)
+
+
+def _propose(settings, rides, drivers):
+    """MatchingEngine.propose in the child process"""
+    radius_km, candidates, price_weight, speed_kmh = settings
+    engine = MatchingEngine(radius_km=radius_km, candidates=candidates, price_weight=price_weight,
+                            speed_kmh=speed_kmh, isolate=False)
+    return engine.propose(rides, drivers)
+
+
+def assign(candidates, unmatched_cost=None, min_epsilon=1e-3, scaling=5.0):
+    """
+    Minimum-cost assignment over a sparse bipartite graph (auction algorithm)
+
+    Rides bid for drivers; a driver's price rises with every bid, so a ride
+    is outbid by one that needs the driver more. Leaving a ride unmatched
+    costs unmatched_cost, which by default is high enough that any
+    candidate beats it.
+
+    The auction runs on the usual symmetric extension of the graph so that
+    every bidder ends up with something: each ride may also take its own
+    "unmatched" slot, and each driver has a stand-in bidder that takes the
+    driver when it stays free, or the unmatched slot of a neighbouring ride
+    whose place it filled. Epsilon shrinks by `scaling` each phase down to
+    min_epsilon, reusing prices, and the result is within (rides + drivers)
+    * min_epsilon of the optimal total cost.
+
+    Args:
+        candidates: One list per ride of (driver, cost) pairs
+        unmatched_cost: Cost of leaving a ride without a driver
+
+    Returns:
+        The chosen driver per ride, None for unmatched rides
+    """
+    n = len(candidates)
+    # Drivers are slots 0..m-1, numbered densely; ride i's unmatched slot is m + i
+    slots = {}
+    edges = [[(slots.setdefault(driver, len(slots)), cost) for driver, cost in ride_edges]
+             for ride_edges in candidates]
+    m = len(slots)
+    if not m:
+        return [None] * n
+    if unmatched_cost is None:
+        unmatched_cost = 2 * max(cost for ride_edges in edges for _, cost in ride_edges) + 1.0
+
+    # Bidders 0..n-1 are rides; n + j stands in for driver j
+    options = []
+    stand_ins = [[(j, 0.0)] for j in range(m)]
+    for ride, ride_edges in enumerate(edges):
+        options.append(ride_edges + [(m + ride, unmatched_cost)] if ride_edges else [])
+        for j, _ in ride_edges:
+            stand_ins[j].append((m + ride, 0.0))
+    options.extend(stand_ins)
+
+    prices = [0.0] * (m + n)
+    owner = [-1] * (m + n)
+    held = [-1] * (n + m)
+    held_cost = [0.0] * (n + m)
+    epsilon = max(unmatched_cost / scaling, min_epsilon)
+    while True:
+        # Keep what still holds at the new epsilon; only the rest bid again
+        queue = []
+        for bidder, bidder_options in enumerate(options):
+            if not bidder_options:
+                continue
+            slot = held[bidder]
+            if slot >= 0:
+                cheapest = min(cost + prices[other] for other, cost in bidder_options)
+                if held_cost[bidder] + prices[slot] <= cheapest + epsilon:
+                    continue
+                owner[slot] = -1
+                held[bidder] = -1
+            queue.append(bidder)
+
+        pop = queue.pop
+        push = queue.append
+        while queue:
+            bidder = pop()
+            best_slot = -1
+            best = second = math.inf
+            for slot, cost in options[bidder]:
+                value = cost + prices[slot]
+                if value < second:
+                    if value < best:
+                        second = best
+                        best = value
+                        best_slot = slot
+                        best_cost = cost
+                    else:
+                        second = value
+            prices[best_slot] += second - best + epsilon
+            previous = owner[best_slot]
+            owner[best_slot] = bidder
+            held[bidder] = best_slot
+            held_cost[bidder] = best_cost
+            if previous >= 0:
+                held[previous] = -1
+                push(previous)
+        if epsilon <= min_epsilon:
+            break
+        epsilon = max(epsilon / scaling, min_epsilon)
+
+    drivers = list(slots)
+    return [drivers[held[ride]] if 0 <= held[ride] < m else None for ride in range(n)]
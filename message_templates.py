@@ -0,0 +1,180 @@
+"""
+Message Templates
+=================
+
+Spoken message text for ride status and account calls. Every template is
+compiled into TwiML once at import (twiml_templates names such as
+'call_status.payment_reminder'), and render_text() builds the same message
+as plain text for SMS.
+"""
+
+import inspect
+
+from twiml_templates import twiml_templates
+
+
+# AI Voice Message Templates
+class AIVoiceTemplates:
+    """Pre-defined AI voice message templates for different ride statuses"""
+    
+    @staticmethod
+    def booking_confirmation(passenger_name, ride_id, pickup_location, destination):
+        """Booking confirmation message"""
+        return f"""
+        Hello {passenger_name}! This is WeRide AI calling to confirm your booking.
+        Your ride has been successfully booked with ID {ride_id}.
+        We will pick you up from {pickup_location} and take you to {destination}.
+        We're finding the best driver for you. You'll receive another call when a driver is assigned.
+        Thank you for choosing WeRide!
+        """
+    
+    @staticmethod
+    def driver_assigned(passenger_name, driver_name, vehicle_info, eta_minutes):
+        """Driver assignment notification"""
+        return f"""
+        Hello {passenger_name}! Great news from WeRide AI.
+        Your driver {driver_name} has been assigned to your ride.
+        They're driving a {vehicle_info} and will arrive in approximately {eta_minutes} minutes.
+        You can track your driver's location in the WeRide app.
+        We'll call you again when your driver arrives at the pickup location.
+        """
+    
+    @staticmethod
+    def driver_arrival(passenger_name, driver_name, location):
+        """Driver arrival notification with interaction"""
+        return f"""
+        Hello {passenger_name}! This is WeRide AI.
+        Your driver {driver_name} has arrived at {location}.
+        Please come to the pickup point and look for your assigned vehicle.
+        If you can see your driver and are ready to start your ride, press 1.
+        If you need more time or can't find your driver, press 2.
+        If you want to cancel this ride, press 3.
+        """
+    
+    @staticmethod
+    def safety_check(passenger_name, driver_name):
+        """Mid-ride safety check with interaction"""
+        return f"""
+        Hello {passenger_name}! This is WeRide AI conducting a routine safety check.
+        You're currently on a ride with driver {driver_name}.
+        If everything is going well and you feel safe, press 1.
+        If you need assistance or feel unsafe, press 9 immediately.
+        If you don't respond, we'll follow up with additional safety measures.
+        Your safety is our top priority.
+        """
+    
+    @staticmethod
+    def ride_completion(passenger_name, destination, fare):
+        """Ride completion notification"""
+        return f"""
+        Hello {passenger_name}! This is WeRide AI.
+        Your ride to {destination} has been completed successfully.
+        The total fare is ${fare}.
+        We hope you had a pleasant journey with WeRide.
+        You'll receive a receipt via email shortly.
+        Thank you for choosing WeRide for your transportation needs!
+        """
+    
+    @staticmethod
+    def feedback_request(passenger_name, driver_name):
+        """Post-ride feedback collection"""
+        return f"""
+        Hello {passenger_name}! This is WeRide AI.
+        We hope you enjoyed your ride with driver {driver_name}.
+        We'd love to hear about your experience to help us improve our service.
+        To rate your ride, press a number from 1 to 5, where 5 is excellent and 1 is poor.
+        Press 5 for excellent, 4 for good, 3 for average, 2 for below average, or 1 for poor.
+        Your feedback helps us maintain high service quality.
+        """
+
+# Call Status Templates
+class CallStatusTemplates:
+    """Templates for different call status scenarios"""
+    
+    @staticmethod
+    def driver_delay(passenger_name, driver_name, new_eta):
+        """Driver delay notification"""
+        return f"""
+        Hello {passenger_name}! This is WeRide AI with an update.
+        Your driver {driver_name} is experiencing a slight delay due to traffic conditions.
+        The new estimated arrival time is {new_eta} minutes.
+        We apologize for any inconvenience and appreciate your patience.
+        You can track the driver's real-time location in the WeRide app.
+        """
+    
+    @staticmethod
+    def ride_cancellation(passenger_name, reason, refund_info=None):
+        """Ride cancellation notification"""
+        base_message = f"""
+        Hello {passenger_name}! This is WeRide AI calling about your recent booking.
+        Unfortunately, your ride has been cancelled due to {reason}.
+        We sincerely apologize for the inconvenience.
+        """
+        
+        if refund_info:
+            base_message += f" {refund_info}"
+        
+        base_message += """
+        You can immediately book a new ride through the WeRide app.
+        Thank you for your understanding and for choosing WeRide.
+        """
+        
+        return base_message
+    
+    @staticmethod
+    def payment_reminder(passenger_name, amount, ride_date):
+        """Payment reminder for outstanding rides"""
+        return f"""
+        Hello {passenger_name}! This is WeRide AI calling regarding your ride on {ride_date}.
+        We notice there's an outstanding payment of ${amount} for your recent trip.
+        Please complete the payment through the WeRide app at your earliest convenience.
+        If you've already made the payment, please disregard this call.
+        For payment assistance, you can contact our support team.
+        Thank you for using WeRide!
+        """
+    
+    @staticmethod
+    def service_outage(passenger_name, details):
+        """Service disruption notice"""
+        return f"""
+        Hello {passenger_name}! This is WeRide AI with a service update.
+        {details}
+        We're working to restore normal service as quickly as possible and apologize for the inconvenience.
+        Thank you for your patience and for choosing WeRide.
+        """
+
+
+# Template classes by twiml_templates name prefix
+MESSAGE_TEMPLATES = {
+    'ai_voice': AIVoiceTemplates,
+    'call_status': CallStatusTemplates
+}
+
+# Precompile the message templates above into TwiML, e.g.
+# twiml_templates.render('ai_voice.safety_check', passenger_name=..., driver_name=...)
+for template_prefix, template_class in MESSAGE_TEMPLATES.items():
+    twiml_templates.register_functions(template_prefix, template_class)
+
+
+def get_template(name):
+    """The message function registered as e.g. 'call_status.payment_reminder', or None"""
+    prefix, _, attr = name.partition('.')
+    source = MESSAGE_TEMPLATES.get(prefix)
+    if source is None or attr.startswith('_'):
+        return None
+    func = getattr(source, attr, None)
+    return func if inspect.isfunction(func) else None
+
+
+def template_names():
+    return sorted(name for name in twiml_templates.names() if name.partition('.')[0] in MESSAGE_TEMPLATES)
+
+
+def render_text(name, values):
+    """Render a message template as plain text; missing values are left blank"""
+    func = get_template(name)
+    if func is None:
+        raise KeyError(f"Unknown message template: {name}")
+    params = inspect.signature(func).parameters
+    text = func(**{param: values.get(param) or '' for param in params})
+    return ' '.join(text.split())
@@ -0,0 +1,238 @@
+"""
+Metrics
+=======
+
+In-process counters and histograms rendered in the Prometheus text format
+for /metrics. RequestMetrics records, per Flask route: a latency histogram,
+response counts by status code and the number of SQL statements each
+request ran. twilio_timer() records Twilio REST latency and outcome per
+call type.
+
+Recording is a perf_counter pair plus one short critical section per metric;
+labels are route templates (not raw paths), so series stay bounded.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import Response, g, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            yield self.name, self._label_pairs(label_values), value
+
+    def _label_pairs(self, label_values, extra=()):
+        return tuple(zip(self.labels, label_values)) + extra
+
+
+class Histogram(Counter):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, then sum
+                series = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(label_values, list(series)) for label_values, series in self._values.items()]
+        for label_values, series in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format_number(bound)
+                yield f"{self.name}_bucket", self._label_pairs(label_values, (('le', le),)), cumulative
+            yield f"{self.name}_sum", self._label_pairs(label_values), series[-1]
+            yield f"{self.name}_count", self._label_pairs(label_values), cumulative
+
+
+class Gauge:
+    """A value read from a callback at scrape time; with labels, a dict of label values -> value"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, read, labels=()):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.labels = tuple(labels)
+
+    def samples(self):
+        if not self.labels:
+            yield self.name, (), self.read()
+            return
+        for label_values, value in self.read().items():
+            yield self.name, tuple(zip(self.labels, label_values)), value
+
+
+class MetricsRegistry:
+    def __init__(self, prefix='weride_'):
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help, labels=()):
+        return self._register(name, lambda full: Counter(full, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(name, lambda full: Histogram(full, help, labels, buckets))
+
+    def gauge(self, name, help, read, labels=()):
+        return self._register(name, lambda full: Gauge(full, help, read, labels))
+
+    def _register(self, name, build):
+        # Registering the same name again returns the existing metric
+        full = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(full)
+            if metric is None:
+                metric = self._metrics[full] = build(full)
+            return metric
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                for name, labels, value in metric.samples():
+                    if labels:
+                        pairs = ','.join(f'{key}="{_escape(value_)}"' for key, value_ in labels)
+                        lines.append(f"{name}{{{pairs}}} {_format_number(value)}")
+                    else:
+                        lines.append(f"{name} {_format_number(value)}")
+            except Exception as e:
+                lines.append(f"# {metric.name} unavailable: {_escape(str(e))}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    'http_requests_total', "HTTP responses by route, method and status code", ('route', 'method', 'status'))
+http_latency = registry.histogram(
+    'http_request_duration_seconds', "Time to produce a response, by route", ('route', 'method'))
+db_queries = registry.histogram(
+    'http_request_db_queries', "SQL statements executed per request, by route", ('route', 'method'), QUERY_BUCKETS)
+twilio_requests = registry.histogram(
+    'twilio_request_duration_seconds', "Twilio REST request latency by operation, call type and outcome",
+    ('operation', 'call_type', 'outcome'))
+
+# Statement count for the request running on this thread, if any
+_queries = threading.local()
+
+
+class RequestMetrics:
+    """Per-route request timing, status counts and DB query counts"""
+
+    def __init__(self, app=None, count_queries=True):
+        self.count_queries = count_queries
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.extensions['request_metrics'] = self
+        if self.count_queries:
+            _listen_for_queries()
+
+    def _before(self):
+        g._metrics_started = time.perf_counter()
+        _queries.count = 0
+
+    def _after(self, response):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return response
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        http_latency.observe(time.perf_counter() - started, route, request.method)
+        http_requests.inc(route, request.method, str(response.status_code))
+        if self.count_queries:
+            db_queries.observe(_queries.count or 0, route, request.method)
+        # Stop counting: later statements on this thread aren't this request's
+        _queries.count = None
+        return response
+
+
+def _listen_for_queries():
+    # Imported here so apps that never count queries don't load SQLAlchemy
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    if event.contains(Engine, 'before_cursor_execute', _count_query):
+        return
+    event.listen(Engine, 'before_cursor_execute', _count_query)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    count = getattr(_queries, 'count', None)
+    if count is not None:
+        _queries.count = count + 1
+
+
+@contextmanager
+def twilio_timer(operation, call_type=None):
+    """Time a Twilio REST request, e.g. with twilio_timer('calls.create', 'arrival'): ..."""
+    started = time.perf_counter()
+    outcome = 'success'
+    try:
+        yield
+    except Exception:
+        outcome = 'error'
+        raise
+    finally:
+        twilio_requests.observe(time.perf_counter() - started, operation, call_type or 'other', outcome)
+
+
+def metrics_response():
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_number(value):
+    if isinstance(value, float):
+        if value == float('inf'):
+            return '+Inf'
+        return repr(value)
+    return str(value)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+WeRide Index Migration
+Adds the indexes declared in db/models.py to an existing database and checks
+that the hot queries behind /api/available-rides, /api/update-driver-location
+and /dashboard use them instead of sequential scans.
+
+On PostgreSQL indexes are built with CREATE INDEX CONCURRENTLY, so rides keep
+flowing while they build; invalid leftovers from an interrupted build are
+dropped and rebuilt. SQLite gets plain CREATE INDEX IF NOT EXISTS.
+
+Usage:
+    python migrate_indexes.py             # create missing indexes
+    python migrate_indexes.py --dry-run   # print the DDL without running it
+    python migrate_indexes.py --check     # migrate, then EXPLAIN the hot queries
+"""
+
+import argparse
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from sqlalchemy import func, inspect, text
+from sqlalchemy.schema import CreateIndex
+from dotenv import load_dotenv
+
+from db.models import db, User, Driver, Ride
+
+load_dotenv()
+
+app = Flask(__name__)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI', 'sqlite:///weride.db')
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+db.init_app(app)
+
+
+def invalid_postgres_indexes(conn):
+    """Indexes left INVALID by an interrupted CREATE INDEX CONCURRENTLY"""
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE NOT i.indisvalid"
+    ))
+    return {row[0] for row in rows}
+
+
+def migrate(dry_run=False):
+    """Create every model index that is missing from the database"""
+    engine = db.engine
+    is_postgres = engine.dialect.name == 'postgresql'
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    created = 0
+    # CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        invalid = invalid_postgres_indexes(conn) if is_postgres else set()
+
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                print(f"⚠️  Table {table.name} does not exist yet - create_all() will add it with its indexes")
+                continue
+
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda ix: ix.name):
+                if index.name in existing and index.name not in invalid:
+                    continue
+
+                ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+                if is_postgres:
+                    ddl = ddl.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1)
+
+                if index.name in invalid:
+                    drop = f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'
+                    print(f"🧹 {drop}")
+                    if not dry_run:
+                        conn.execute(text(drop))
+
+                print(f"🔧 {ddl}")
+                if not dry_run:
+                    conn.execute(text(ddl))
+                created += 1
+
+    print(f"✅ {created} index(es) {'to create' if dry_run else 'created'}")
+    return created
+
+
+def hot_queries():
+    """The statements the hot endpoints run, keyed by endpoint"""
+    active_statuses = ['pending', 'accepted', 'arrived', 'in_progress']
+    return {
+        'get_available_rides: pending feed':
+            Ride.query.filter_by(status='pending').order_by(Ride.requested_at, Ride.id).limit(50),
+        'update_driver_location: driver by phone':
+            User.query.filter_by(phone='+920000000000'),
+        'update_driver_location: active ride':
+            Ride.query.filter_by(driver_id=1, status='accepted').limit(1),
+        'real_dashboard: total rides':
+            db.session.query(func.count(Ride.id)),
+        'real_dashboard: active rides':
+            db.session.query(func.count(Ride.id)).filter(Ride.status.in_(active_statuses)),
+        'real_dashboard: total drivers':
+            db.session.query(func.count(User.id)).filter(User.user_type == 'driver'),
+        'real_dashboard: online drivers':
+            db.session.query(func.count(Driver.id)).filter(Driver.is_online == True),
+        'real_dashboard: recent rides':
+            Ride.query.order_by(Ride.requested_at.desc()).limit(10),
+    }
+
+
+def check_query_plans():
+    """
+    EXPLAIN each hot query and report sequential scans
+
+    On PostgreSQL sequential scans are disabled for the check so that small
+    test tables still show whether an index *can* serve the query.
+
+    Returns:
+        Number of queries that still scan a whole table
+    """
+    engine = db.engine
+    is_postgres = engine.dialect.name == 'postgresql'
+    failures = 0
+
+    with engine.connect() as conn:
+        if is_postgres:
+            conn.execute(text("SET enable_seqscan = off"))
+
+        for name, query in hot_queries().items():
+            sql = str(query.statement.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True}))
+            if is_postgres:
+                plan = [row[0] for row in conn.execute(text(f"EXPLAIN {sql}"))]
+                seq_scans = [line.strip() for line in plan if 'Seq Scan' in line]
+            else:
+                plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+                seq_scans = [line for line in plan if line.startswith('SCAN') and 'INDEX' not in line]
+
+            if seq_scans:
+                failures += 1
+                print(f"❌ {name}: {'; '.join(seq_scans)}")
+            else:
+                print(f"✅ {name}: {plan[0].strip()}")
+
+        if is_postgres:
+            conn.execute(text("RESET enable_seqscan"))
+
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add hot-query indexes to an existing WeRide database")
+    parser.add_argument('--dry-run', action='store_true', help="print the DDL without running it")
+    parser.add_argument('--check', action='store_true', help="EXPLAIN the hot queries after migrating")
+    args = parser.parse_args()
+
+    with app.app_context():
+        migrate(dry_run=args.dry_run)
+        if args.check and check_query_plans():
+            sys.exit(1)
@@ -0,0 +1,181 @@
+"""
+Offer and Ride Expiry
+=====================
+
+Background sweeper for requests nobody acted on. Pending offers older than
+`offer_ttl` seconds become 'expired', and so do pending rides older than
+`ride_ttl` that have no pending offer left.
+
+Each sweep is a set-based UPDATE ... WHERE id IN (oldest `batch_size`
+pending rows past the cutoff), committed on its own and repeated until a
+batch comes back short. Row locks are only held for one small batch at a
+time. On PostgreSQL the inner SELECT uses SKIP LOCKED, so the sweeper
+passes over rows that a request is accepting right now instead of waiting
+on them. Several processes can run the sweeper safely.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import exists, select, tuple_
+
+from db.models import db, Ride, RideOffer
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+expired_total = registry.counter(
+    'expiry_expired_total', "Pending offers and rides marked expired by the sweeper", ('kind',))
+expiry_batches = registry.histogram(
+    'expiry_batch_seconds', "Duration of one expiry UPDATE batch, i.e. how long its row locks are held", ('kind',),
+    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+
+class ExpirySweeper:
+    """Expire stale pending offers and rides in short batches"""
+
+    def __init__(self, app=None, offer_ttl=600, ride_ttl=1800, batch_size=500, interval=30,
+                 pause=0.05, on_expired=None):
+        """
+        Args:
+            offer_ttl: Seconds a pending offer stays open
+            ride_ttl: Seconds a pending ride without offers stays open
+            batch_size: Rows per UPDATE
+            interval: Seconds between sweeps
+            pause: Seconds between batches, so other writers get in
+            on_expired: Called with (offers, rides) after each batch:
+                offers as (offer_id, ride_id) pairs, rides as ride IDs
+        """
+        self.app = None
+        self.offer_ttl = offer_ttl
+        self.ride_ttl = ride_ttl
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pause = pause
+        self.on_expired = on_expired
+        self._run_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['offer_expiry'] = self
+
+    def start(self):
+        """Sweep in a background thread every interval seconds"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="offer-expiry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    def run_once(self):
+        """
+        One sweep: stale offers first, so their rides can expire in the same pass
+
+        Returns:
+            Summary dict: offers and rides expired, and seconds taken
+        """
+        with self._run_lock:
+            started = time.perf_counter()
+            now = datetime.utcnow()
+            offer_cutoff = now - timedelta(seconds=self.offer_ttl)
+            ride_cutoff = now - timedelta(seconds=self.ride_ttl)
+            offers = self._sweep('offer', lambda after: self.offer_statement(offer_cutoff, after))
+            rides = self._sweep('ride', lambda after: self.ride_statement(ride_cutoff, after))
+        return {'offers': offers, 'rides': rides, 'seconds': round(time.perf_counter() - started, 3)}
+
+    def offer_statement(self, cutoff, after=None):
+        """
+        UPDATE expiring the oldest batch of pending offers created before
+        cutoff (and after the (created_at, id) key `after`)
+
+        Returns:
+            (statement, columns to return: id, ride_id and the paging key)
+        """
+        table = RideOffer.__table__
+        return self._statement(table, table.c.created_at, cutoff, after, (),
+                               (table.c.id, table.c.ride_id, table.c.created_at))
+
+    def ride_statement(self, cutoff, after=None):
+        """UPDATE expiring the oldest batch of pending rides requested before cutoff with no pending offer"""
+        table = Ride.__table__
+        offers = RideOffer.__table__
+        has_offer = exists().where(offers.c.ride_id == table.c.id, offers.c.status == 'pending')
+        return self._statement(table, table.c.requested_at, cutoff, after, (~has_offer,),
+                               (table.c.id, table.c.requested_at))
+
+    def _statement(self, table, created, cutoff, after, conditions, columns):
+        stale = (select(table.c.id)
+                 .where(table.c.status == 'pending', created < cutoff, *conditions)
+                 .order_by(created, table.c.id)
+                 .limit(self.batch_size)
+                 .with_for_update(skip_locked=True)
+                 .correlate(None))
+        if after is not None:
+            # Rows skipped by earlier batches (e.g. rides that still have an offer) aren't rescanned
+            stale = stale.where(tuple_(created, table.c.id) > after)
+        # No status recheck out here: FOR UPDATE re-evaluates the subquery on rows changed
+        # meanwhile, and an extra filter would make SQLite scan the index instead of the IDs
+        statement = (table.update()
+                     .where(table.c.id.in_(stale.scalar_subquery()))
+                     .values(status='expired'))
+        return statement, columns
+
+    def _sweep(self, kind, build):
+        returning = db.engine.dialect.update_returning
+        total = 0
+        after = None
+        while not self._stopping.is_set():
+            statement, columns = build(after)
+            if returning:
+                statement = statement.returning(*columns)
+
+            started = time.perf_counter()
+            try:
+                result = db.session.execute(statement)
+                rows = result.all() if returning else []
+                count = len(rows) if returning else result.rowcount
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            expiry_batches.observe(time.perf_counter() - started, kind)
+
+            if count:
+                total += count
+                expired_total.inc(kind, amount=count)
+            if rows:
+                after = max((row[-1], row[0]) for row in rows)
+                if self.on_expired is not None:
+                    try:
+                        if kind == 'offer':
+                            self.on_expired([(row[0], row[1]) for row in rows], [])
+                        else:
+                            self.on_expired([], [row[0] for row in rows])
+                    except Exception as e:
+                        logger.error("Expiry callback failed: %s", e)
+            if count < self.batch_size:
+                break
+            time.sleep(self.pause)
+        return total
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    summary = self.run_once()
+                if summary['offers'] or summary['rides']:
+                    logger.info("Expired %d offers and %d rides in %.2fs",
+                                summary['offers'], summary['rides'], summary['seconds'])
+            except Exception as e:
+                logger.error("Expiry sweep failed: %s", e)
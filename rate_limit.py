@@ -0,0 +1,220 @@
+"""
+Outbound Rate Limiting
+======================
+
+Token buckets that keep calls.create and messages.create under the
+account's Twilio calls/messages-per-second limits. Requests wait in
+priority lanes (safety > arrival > booking > feedback > reminders): when a
+token frees up it goes to the oldest request of the most urgent lane, so a
+burst of feedback calls or a campaign can't delay a safety call.
+
+Each lane except safety has a deadline. A request whose queueing time plus
+projected wait for a token would exceed it is shed (LoadShed) instead of
+being sent late.
+
+    with throttle('calls.create', 'arrival'):
+        client.calls.create(...)
+
+Requests retried by a circuit breaker take a token per attempt:
+
+    twilio_breaker.call(throttled('calls.create', client.calls.create, 'arrival'), ...)
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from config import TWILIO_CALLS_PER_SECOND, TWILIO_MESSAGES_PER_SECOND, OUTBOUND_SHED_AFTER
+from metrics import registry, twilio_timer
+
+LANES = ('safety', 'arrival', 'booking', 'feedback', 'reminders')
+DEFAULT_LANE = 'booking'
+
+# Call types (including the /twiml-enhanced ones) by lane
+CALL_TYPE_LANES = {
+    'safety': 'safety',
+    'safety_check': 'safety',
+    'arrival': 'arrival',
+    'driver_arrived': 'arrival',
+    'driver_enroute': 'arrival',
+    'cancellation': 'arrival',
+    'ride_cancelled': 'arrival',
+    'booking': 'booking',
+    'booking_confirmed': 'booking',
+    'driver_assigned': 'booking',
+    'feedback': 'feedback',
+    'feedback_request': 'feedback',
+    'campaign': 'reminders',
+    'campaign_sms': 'reminders',
+    'payment_reminder': 'reminders'
+}
+
+outbound_requests = registry.counter(
+    'outbound_requests_total', "Twilio requests admitted or shed by the rate limiter", ('channel', 'lane', 'outcome'))
+outbound_wait = registry.histogram(
+    'outbound_wait_seconds', "Time spent waiting for a rate limiter token", ('channel', 'lane'),
+    (0.01, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0))
+
+
+class LoadShed(Exception):
+    """A request dropped because its lane's backlog exceeded the deadline"""
+
+
+def lane_for(call_type):
+    return CALL_TYPE_LANES.get(call_type, DEFAULT_LANE)
+
+
+def lane_priority(call_type):
+    """Sort key for a call type: 0 is the most urgent lane"""
+    return LANES.index(lane_for(call_type))
+
+
+def parse_shed_after(text):
+    """'arrival=120,booking=300' -> {'arrival': 120.0, 'booking': 300.0}"""
+    deadlines = {}
+    for item in (text or '').split(','):
+        if not item.strip():
+            continue
+        lane, _, seconds = item.partition('=')
+        lane = lane.strip()
+        if lane not in LANES:
+            raise ValueError(f"Unknown rate limit lane '{lane}'")
+        deadlines[lane] = float(seconds)
+    return deadlines
+
+
+class PriorityRateLimiter:
+    """Token bucket whose waiters are served by lane priority, then arrival order"""
+
+    def __init__(self, rate, burst=None, shed_after=None, channel='calls'):
+        """
+        Args:
+            rate: Tokens per second; 0 or less disables limiting
+            burst: Bucket size (defaults to one second's worth, at least 1)
+            shed_after: Seconds per lane after which queued work is shed;
+                lanes without an entry are never shed
+            channel: Label for the metrics
+        """
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.shed_after = dict(shed_after or {})
+        self.channel = channel
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def acquire(self, call_type=None, waited=0.0):
+        """
+        Block until a request of this call type may be sent
+
+        Args:
+            call_type: Decides the lane
+            waited: Seconds the work already spent queued elsewhere (e.g. as a
+                CallJob), counted against the lane's deadline
+
+        Returns:
+            Seconds spent waiting here
+
+        Raises:
+            LoadShed: The lane's deadline would pass before a token is free
+        """
+        lane = lane_for(call_type)
+        if self.rate <= 0:
+            outbound_requests.inc(self.channel, lane, 'admitted')
+            return 0.0
+
+        started = time.monotonic()
+        limit = self.shed_after.get(lane)
+        deadline = None if limit is None else started + limit - waited
+        entry = (LANES.index(lane), next(self._seq))
+
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    now = self._refill()
+                    ahead = self._position(entry)
+                    if ahead == 0 and self._tokens >= 1:
+                        self._tokens -= 1
+                        break
+
+                    # Projected time a token reaches this request
+                    ready_at = now + (ahead + 1 - self._tokens) / self.rate
+                    if deadline is not None and ready_at > deadline:
+                        outbound_requests.inc(self.channel, lane, 'shed')
+                        raise LoadShed(f"{lane} backlog: ~{ready_at - now + waited:.0f}s exceeds "
+                                       f"{limit:.0f}s deadline for {self.channel}")
+                    self._cond.wait(ready_at - now if ahead == 0 else None)
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                # Wake the rest: the next in line may now take a token
+                self._cond.notify_all()
+
+        elapsed = time.monotonic() - started
+        outbound_requests.inc(self.channel, lane, 'admitted')
+        outbound_wait.observe(elapsed, self.channel, lane)
+        return elapsed
+
+    def waiting(self):
+        """Requests waiting for a token, by lane"""
+        with self._cond:
+            counts = dict.fromkeys(LANES, 0)
+            for priority, _ in self._waiting:
+                counts[LANES[priority]] += 1
+            return counts
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return now
+
+    def _position(self, entry):
+        # Waiters ahead of entry; the heap head is the next to be served
+        if self._waiting[0] == entry:
+            return 0
+        return sum(1 for other in self._waiting if other < entry)
+
+
+shed_after = parse_shed_after(OUTBOUND_SHED_AFTER)
+call_limiter = PriorityRateLimiter(TWILIO_CALLS_PER_SECOND, shed_after=shed_after, channel='calls')
+message_limiter = PriorityRateLimiter(TWILIO_MESSAGES_PER_SECOND, shed_after=shed_after, channel='messages')
+
+LIMITERS = {
+    'calls.create': call_limiter,
+    'messages.create': message_limiter
+}
+
+registry.gauge('outbound_waiting', "Twilio requests waiting for a rate limiter token",
+               lambda: {(limiter.channel, lane): count
+                        for limiter in LIMITERS.values()
+                        for lane, count in limiter.waiting().items()},
+               labels=('channel', 'lane'))
+
+
+@contextmanager
+def throttle(operation, call_type=None, waited=0.0):
+    """Wait for the rate limiter of a Twilio operation ('calls.create' or 'messages.create')"""
+    LIMITERS[operation].acquire(call_type, waited)
+    yield
+
+
+def throttled(operation, func, call_type=None, waited=0.0):
+    """
+    func wrapped to wait for a rate limiter token, and be timed, on every
+    call, for CircuitBreaker.call: each retry is then a request of its own
+    against the limit. Time since the first attempt counts against the
+    lane's deadline on top of `waited`.
+    """
+    started = time.monotonic()
+
+    def attempt(*args, **kwargs):
+        with throttle(operation, call_type, waited + time.monotonic() - started), twilio_timer(operation, call_type):
+            return func(*args, **kwargs)
+
+    return attempt
@@ -0,0 +1,198 @@
+"""
+Circuit Breakers
+================
+
+Per-dependency circuit breakers with bounded retries, for calls to Twilio
+and Firebase. A breaker is closed while the dependency works; after
+`failure_threshold` consecutive failures it opens and every call fails
+immediately with CircuitOpenError instead of waiting out an HTTP timeout.
+After `reset_timeout` seconds it lets one trial call through (half-open):
+success closes it, failure opens it again.
+
+Within a call, errors the dependency marks as retryable are retried with
+exponential backoff and full jitter, at most `attempts` times. Errors that
+aren't failures of the dependency (a 4xx from a bad phone number, say)
+neither retry nor count towards opening the breaker. Errors raised before
+anything was sent (a request shed by the rate limiter) don't count either
+way.
+
+Breaker state is exported on /metrics as weride_circuit_state.
+"""
+
+import logging
+import random
+import threading
+import time
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+circuit_transitions = registry.counter(
+    'circuit_transitions_total', "Circuit breaker state changes", ('dependency', 'state'))
+circuit_rejected = registry.counter(
+    'circuit_rejected_total', "Calls failed fast by an open circuit breaker", ('dependency',))
+dependency_retries = registry.counter(
+    'dependency_retries_total', "Retries of failed calls to a dependency", ('dependency',))
+
+# Every breaker by dependency name, for monitoring
+breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"{name} circuit is open; retry in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker with bounded exponential-backoff retries"""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, attempts=3,
+                 base_delay=0.2, max_delay=2.0, is_failure=None, is_retryable=None, is_unsent=None):
+        """
+        Args:
+            name: Dependency name, used in errors and metrics
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a trial call
+            attempts: Tries per call, including the first
+            base_delay: Backoff before the first retry (doubles each retry)
+            max_delay: Cap on a single backoff
+            is_failure: exc -> bool, whether an error counts against the
+                dependency (default: every exception)
+            is_retryable: exc -> bool, whether an error is safe to retry
+                (default: same as is_failure)
+            is_unsent: exc -> bool, whether an error was raised before the
+                request was sent, so it says nothing about the dependency
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.is_failure = is_failure or (lambda exc: True)
+        self.is_retryable = is_retryable or self.is_failure
+        self.is_unsent = is_unsent or (lambda exc: False)
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+        with _breakers_lock:
+            breakers[name] = self
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def call(self, func, *args, **kwargs):
+        """Call func through the breaker, retrying retryable errors"""
+        for attempt in range(1, self.attempts + 1):
+            trial = self._before_call()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if self.is_unsent(e):
+                    self._release(trial)
+                    raise
+                failed = self.is_failure(e)
+                self._after_call(trial, failed)
+                if not failed or attempt == self.attempts or not self.is_retryable(e):
+                    raise
+                dependency_retries.inc(self.name)
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                logger.warning("%s call failed (attempt %d/%d), retrying in %.2fs: %s",
+                               self.name, attempt, self.attempts, delay, e)
+                time.sleep(delay)
+            else:
+                self._after_call(trial, False)
+                return result
+
+    def snapshot(self):
+        """State for monitoring"""
+        state = self.state
+        with self._lock:
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)) if state == OPEN else 0.0
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'retry_in': round(retry_in, 1)
+            }
+
+    def reset(self):
+        with self._lock:
+            self._transition(CLOSED)
+            self._failures = 0
+            self._trial_running = False
+
+    def _before_call(self):
+        # Returns True when this call is the half-open trial
+        with self._lock:
+            if self._state == CLOSED:
+                return False
+            elapsed = time.monotonic() - self._opened_at
+            if self._state == OPEN and elapsed >= self.reset_timeout:
+                self._transition(HALF_OPEN)
+            if self._state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+        circuit_rejected.inc(self.name)
+        raise CircuitOpenError(self.name, max(0.0, self.reset_timeout - elapsed))
+
+    def _release(self, trial):
+        # Neither a success nor a failure; only give up the half-open trial slot
+        if trial:
+            with self._lock:
+                self._trial_running = False
+
+    def _after_call(self, trial, failed):
+        with self._lock:
+            if trial:
+                self._trial_running = False
+            if not failed:
+                self._failures = 0
+                if self._state != CLOSED:
+                    self._transition(CLOSED)
+                return
+            self._failures += 1
+            if trial or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def _transition(self, state):
+        if state == self._state:
+            return
+        self._state = state
+        circuit_transitions.inc(self.name, state)
+        if state == OPEN:
+            logger.warning("%s circuit opened after %d consecutive failures", self.name, self._failures)
+        elif state == HALF_OPEN:
+            logger.info("%s circuit half-open, letting a trial call through", self.name)
+        else:
+            logger.info("%s circuit closed", self.name)
+
+
+def breaker_states():
+    """Snapshot of every breaker by dependency name"""
+    with _breakers_lock:
+        current = list(breakers.items())
+    return {name: breaker.snapshot() for name, breaker in current}
+
+
+registry.gauge('circuit_state', "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+               lambda: {(name,): STATE_VALUES[state['state']] for name, state in breaker_states().items()},
+               labels=('dependency',))
@@ -0,0 +1,217 @@
+"""
+Ride Status Mirror
+==================
+
+In-process mirror of a Firebase Realtime Database subtree (`rides/` for
+get_realtime_status), kept current by a streaming listener so reads are
+a local dict lookup. It only needs a `reference(path)` factory, so
+fake_firebase.FakeFirebase can stand in for Firebase in tests.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ('completed', 'cancelled', 'expired')
+
+
+class RideStatusMirror:
+    """
+    In-process mirror of the Firebase `rides/` subtree
+
+    A streaming listener on `rides/` keeps the mirror current, so reads are a
+    local dict lookup. Finished rides are kept in a small LRU of their own and
+    evicted first; active rides are capped as well. Misses (and every read
+    while the listener is down) fall back to a direct fetch.
+
+    `reference` is any callable taking a path and returning an object with
+    get() and listen(callback), e.g. firebase_utils.reference or
+    fake_firebase.FakeFirebase.reference. The mirror only serves reads once
+    the listener's initial snapshot has arrived, and goes back to direct
+    fetches (and reconnects) when the listener's stream dies. Direct fetches
+    go through `breaker` when one is given, so a Firebase outage fails fast
+    instead of blocking on every miss.
+    """
+
+    def __init__(self, reference, root='rides', max_active=10000, max_finished=1000, retry_seconds=30,
+                 breaker=None):
+        self.reference = reference
+        self.breaker = breaker
+        self.root = root.strip('/')
+        self.max_active = max_active
+        self.max_finished = max_finished
+        self.retry_seconds = retry_seconds
+        self.listening = False
+        self._attached = False  # listen() called and not stopped since; snapshots only count then
+        self._active = OrderedDict()
+        self._finished = OrderedDict()
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._registration = None
+        self._failed_at = None
+
+    def __len__(self):
+        return len(self._active) + len(self._finished)
+
+    def start(self):
+        """Attach the streaming listener (idempotent)"""
+        if self._registration is not None:
+            return
+        # A separate lock: the listener may deliver its first event (which
+        # takes self._lock) before listen() returns
+        with self._start_lock:
+            if self._registration is not None:
+                return
+            if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_seconds:
+                return
+            try:
+                # listening is set by the initial snapshot, not here
+                self._attached = True
+                self._registration = self.reference(self.root).listen(self._on_event)
+            except Exception as e:
+                self._attached = False
+                self._failed_at = time.monotonic()
+                logger.error(f"Firebase listener for {self.root}/ failed to start: {e}")
+
+    def stop(self):
+        with self._start_lock:
+            registration, self._registration = self._registration, None
+            self._attached = False
+            self.listening = False
+        if registration is not None:
+            registration.close()
+
+    def get(self, ride_id):
+        """Current status of a ride, from memory when the listener is live"""
+        key = str(ride_id)
+        self._check_listener()
+        if self.listening:
+            with self._lock:
+                for entries in (self._active, self._finished):
+                    if key in entries:
+                        entries.move_to_end(key)
+                        return _copy(entries[key])
+
+        ref = self.reference(f"{self.root}/{key}")
+        data = self.breaker.call(ref.get) if self.breaker is not None else ref.get()
+        if data is not None:
+            with self._lock:
+                self._store(key, data)
+        return _copy(data) if data is not None else {}
+
+    def _check_listener(self):
+        """Reconnect if the listener's stream has died, so stale data isn't served"""
+        registration = self._registration
+        if registration is None or _registration_alive(registration):
+            return
+        with self._start_lock:
+            if self._registration is not registration:
+                return
+            self._registration = None
+            self._attached = False
+            self.listening = False
+        with self._lock:
+            self._active.clear()
+            self._finished.clear()
+        logger.warning(f"Firebase listener for {self.root}/ stopped; reconnecting")
+        try:
+            registration.close()
+        except Exception:
+            pass
+        self.start()
+
+    # ─────────── LISTENER EVENTS ───────────
+    def _on_event(self, event):
+        path = [part for part in (event.path or '/').split('/') if part]
+        with self._lock:
+            if not path:
+                if event.event_type == 'put':
+                    # Full snapshot of the subtree (sent first on connect)
+                    self._active.clear()
+                    self._finished.clear()
+                    self.listening = self._attached
+                for key, value in (event.data or {}).items():
+                    self._store(key, value)
+                return
+
+            key = path[0]
+            if len(path) == 1:
+                if event.event_type == 'patch':
+                    current = self._lookup(key)
+                    if isinstance(current, dict) and isinstance(event.data, dict):
+                        merged = dict(current)
+                        for field, value in event.data.items():
+                            if value is None:
+                                merged.pop(field, None)
+                            else:
+                                merged[field] = value
+                        self._store(key, merged)
+                    else:
+                        # Can't merge into something we don't hold; refetch on read
+                        self._drop(key)
+                else:
+                    self._store(key, event.data)
+                return
+
+            # A nested field changed: apply it to a copy of the mirrored ride
+            current = self._lookup(key)
+            if not isinstance(current, dict):
+                self._drop(key)
+                return
+            updated = _copy(current)
+            node = updated
+            for part in path[1:-1]:
+                child = node.get(part)
+                node[part] = dict(child) if isinstance(child, dict) else {}
+                node = node[part]
+            if event.event_type == 'patch' and isinstance(event.data, dict):
+                child = node.get(path[-1])
+                target = node[path[-1]] = dict(child) if isinstance(child, dict) else {}
+                for field, value in event.data.items():
+                    if value is None:
+                        target.pop(field, None)
+                    else:
+                        target[field] = value
+            elif event.data is None:
+                node.pop(path[-1], None)
+            else:
+                node[path[-1]] = event.data
+            self._store(key, updated)
+
+    def _lookup(self, key):
+        if key in self._active:
+            return self._active[key]
+        return self._finished.get(key)
+
+    def _drop(self, key):
+        self._active.pop(key, None)
+        self._finished.pop(key, None)
+
+    def _store(self, key, data):
+        self._drop(key)
+        if data is None:
+            return
+        finished = isinstance(data, dict) and data.get('status') in FINISHED_STATUSES
+        entries, limit = (self._finished, self.max_finished) if finished else (self._active, self.max_active)
+        entries[key] = data
+        while len(entries) > limit:
+            entries.popitem(last=False)
+
+
+def _copy(data):
+    if isinstance(data, dict):
+        return {key: _copy(value) for key, value in data.items()}
+    return data
+
+
+def _registration_alive(registration):
+    """Whether a listener registration's stream is still running"""
+    is_alive = getattr(registration, 'is_alive', None)
+    if callable(is_alive):
+        return is_alive()
+    # firebase_admin's ListenerRegistration streams on a thread that exits when the stream drops
+    thread = getattr(registration, '_thread', None)
+    return thread is None or thread.is_alive()
@@ -0,0 +1,114 @@
+"""
+Ride Event Stream
+=================
+
+In-process publish/subscribe for ride updates, served to browsers as
+Server-Sent Events. Handlers publish after they commit; every open stream
+for that ride receives the event. A short per-ride history lets a client
+that reconnects with Last-Event-ID (or subscribes just after creating the
+ride) catch up on what it missed.
+
+Events only reach streams held by the same process, so multi-worker
+deployments should route a ride's stream and its updates to one worker.
+"""
+
+import itertools
+import json
+import queue
+import threading
+from collections import OrderedDict, deque
+
+TERMINAL_STATUSES = ('completed', 'cancelled', 'expired')
+
+
+class RideEventBroker:
+    """Fan ride events out to the SSE streams subscribed to each ride"""
+
+    def __init__(self, history=20, max_rides=10000, heartbeat=15.0, queue_size=100):
+        self.history = history
+        self.max_rides = max_rides
+        self.heartbeat = heartbeat
+        self.queue_size = queue_size
+        self._ids = itertools.count(1)
+        self._history = OrderedDict()
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, ride_id, event, data):
+        """Send an event to every stream of a ride"""
+        entry = (next(self._ids), event, json.dumps(data, default=str))
+        with self._lock:
+            recent = self._history.get(ride_id)
+            if recent is None:
+                recent = self._history[ride_id] = deque(maxlen=self.history)
+                if len(self._history) > self.max_rides:
+                    self._history.popitem(last=False)
+            else:
+                self._history.move_to_end(ride_id)
+            recent.append(entry)
+            subscribers = list(self._subscribers.get(ride_id, ()))
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(entry)
+            except queue.Full:
+                # A stalled client; it will resync from history on reconnect
+                pass
+
+    def subscriber_count(self, ride_id=None):
+        with self._lock:
+            if ride_id is not None:
+                return len(self._subscribers.get(ride_id, ()))
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def stream(self, ride_id, last_event_id=None, initial=None):
+        """
+        Generate the SSE wire format for one subscriber
+
+        Args:
+            ride_id: Ride to follow
+            last_event_id: Replay buffered events newer than this ID; a new
+                subscriber gets the ride's whole buffered history
+            initial: Optional (event, data) sent first, e.g. a status snapshot
+
+        The stream ends after a terminal status-change event.
+        """
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(ride_id, set()).add(subscriber)
+            backlog = list(self._history.get(ride_id, ()))
+
+        try:
+            yield "retry: 3000\n\n"
+            if initial:
+                yield _format(None, initial[0], json.dumps(initial[1], default=str))
+                if initial[0] == 'status-change' and initial[1].get('status') in TERMINAL_STATUSES:
+                    return
+
+            for entry in backlog:
+                if entry[0] > (last_event_id or 0):
+                    yield _format(*entry)
+
+            while True:
+                try:
+                    entry = subscriber.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _format(*entry)
+                if entry[1] == 'status-change' and json.loads(entry[2]).get('status') in TERMINAL_STATUSES:
+                    return
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(ride_id)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del self._subscribers[ride_id]
+
+
+def _format(event_id, event, payload):
+    lines = [f"event: {event}", f"data: {payload}"]
+    if event_id is not None:
+        lines.insert(0, f"id: {event_id}")
+    return '\n'.join(lines) + '\n\n'
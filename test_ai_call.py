@@ -6,7 +6,7 @@ This script will help you test your Twilio AI calling functionality
 
 import os
 from dotenv import load_dotenv
-from twilio.rest import Client
+from twilio_pool import get_twilio_client  # honours TWILIO_API_BASE (fake_twilio.py)
 import sys
 
 # Load environment variables
@@ -28,7 +28,7 @@ def test_twilio_setup():
     print(f"Ngrok Base: {NGROK_BASE}")
     
     try:
-        client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+        client = get_twilio_client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
         # Test the connection by getting account info
         account = client.api.accounts(TWILIO_ACCOUNT_SID).fetch()
         print(f"✅ Twilio connection successful!")
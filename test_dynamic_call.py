@@ -1,5 +1,5 @@
 # test_dynamic_call.py
-from twilio.rest import Client
+from twilio_pool import get_twilio_client  # honours TWILIO_API_BASE (fake_twilio.py)
 import os
 from dotenv import load_dotenv
 from urllib.parse import urlencode
@@ -23,7 +23,7 @@ voice = "Polly.Matthew"
 params = urlencode({"message": message, "voice": voice})
 voice_url = f"{ngrok_base}/voice-dynamic?{params}"
 
-client = Client(account_sid, auth_token)
+client = get_twilio_client(account_sid, auth_token)
 
 # Initiate the call
 call = client.calls.create(
@@ -9,7 +9,7 @@ import time
 import requests
 import json
 from dotenv import load_dotenv
-from twilio.rest import Client
+from twilio_pool import get_twilio_client  # honours TWILIO_API_BASE (fake_twilio.py)
 
 # Load environment variables
 load_dotenv()
@@ -26,7 +26,7 @@ def test_twilio_connection():
     """Test Twilio API connection"""
     print("🔍 Testing Twilio Connection...")
     try:
-        client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+        client = get_twilio_client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
         account = client.api.accounts(TWILIO_ACCOUNT_SID).fetch()
         print(f"✅ Twilio connected: {account.friendly_name} ({account.status})")
         return client
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+WeRide Ride Status Mirror Test Script
+Drives RideStatusMirror with fake_firebase.FakeFirebase: the initial
+snapshot, put/patch/nested events, eviction, fallback fetches and
+reconnecting after the listener's stream dies. Needs no Firebase project.
+"""
+
+import sys
+
+from fake_firebase import FakeFirebase
+from ride_status_mirror import RideStatusMirror
+
+
+def check(label, condition):
+    if not condition:
+        print(f"❌ {label}")
+        sys.exit(1)
+    print(f"✅ {label}")
+
+
+def main():
+    print("🔍 Testing the ride status mirror...")
+    firebase = FakeFirebase({'rides': {
+        '1': {'status': 'pending', 'driver': {'name': 'Ali', 'eta': 7}},
+        '2': {'status': 'completed'},
+    }})
+    mirror = RideStatusMirror(firebase.reference, max_active=3, max_finished=2)
+
+    check("not serving from memory before start", not mirror.listening)
+    mirror.start()
+    check("initial snapshot loaded", mirror.listening and len(mirror) == 2)
+    check("read from memory", mirror.get(1)['driver']['eta'] == 7 and firebase.gets == 0)
+
+    # Whole-ride put, then a patch merged into it
+    firebase.put('rides/3', {'status': 'accepted', 'fare': 500})
+    check("put of one ride", mirror.get(3) == {'status': 'accepted', 'fare': 500})
+    firebase.patch('rides/3', {'status': 'en_route', 'fare': None})
+    check("patch merges and None removes a field", mirror.get(3) == {'status': 'en_route'})
+
+    # Nested paths
+    firebase.put('rides/1/driver/eta', 3)
+    check("nested put", mirror.get(1)['driver'] == {'name': 'Ali', 'eta': 3})
+    firebase.put('rides/1/driver/name', None)
+    check("nested delete", mirror.get(1)['driver'] == {'eta': 3})
+    firebase.patch('rides/1/driver', {'lat': 24.86})
+    check("nested patch", mirror.get(1)['driver'] == {'eta': 3, 'lat': 24.86})
+
+    # Copies out, so callers can't corrupt the mirror
+    mirror.get(1)['status'] = 'tampered'
+    check("reads are copies", mirror.get(1)['status'] == 'pending')
+
+    # Finished rides move to their own LRU and are evicted before active ones
+    firebase.put('rides/3/status', 'completed')
+    firebase.put('rides/4', {'status': 'expired'})
+    check("finished LRU capped", set(mirror._finished) == {'3', '4'} and '2' not in mirror._finished)
+    check("finished ride left the active set", '3' not in mirror._active)
+    for ride_id in (5, 6, 7):
+        firebase.put(f'rides/{ride_id}', {'status': 'pending'})
+    check("active rides capped, oldest evicted", list(mirror._active) == ['5', '6', '7'])
+
+    # An evicted ride is fetched directly and mirrored again
+    check("fallback fetch on a miss", mirror.get(1)['driver']['eta'] == 3 and firebase.gets == 1)
+    check("fetched ride mirrored", '1' in mirror._active)
+    check("unknown ride is empty", mirror.get(99) == {} and firebase.gets == 2)
+
+    # Deleting the ride drops it from the mirror
+    firebase.delete('rides/7')
+    check("delete removes the ride", '7' not in mirror._active)
+
+    # The stream dies without a close(): detect it, reset, reconnect
+    firebase.drop_streams()
+    firebase.put('rides/5', {'status': 'cancelled'})  # missed while disconnected
+    gets = firebase.gets
+    status = mirror.get(5)
+    check("dead listener replaced by a new one", mirror._registration is not None
+          and mirror._registration.is_alive() and mirror.listening)
+    check("fresh snapshot after reconnect", status == {'status': 'cancelled'} and firebase.gets == gets)
+
+    # Events after the reconnect keep flowing
+    firebase.patch('rides/6', {'status': 'accepted'})
+    check("events after reconnect", mirror.get(6) == {'status': 'accepted'})
+
+    # Stopped: reads go straight to the database
+    mirror.stop()
+    gets = firebase.gets
+    check("stopped mirror fetches directly", not mirror.listening and mirror.get(6)['status'] == 'accepted'
+          and firebase.gets == gets + 1)
+
+    print("\n🎉 Ride status mirror works!")
+
+
+if __name__ == "__main__":
+    main()
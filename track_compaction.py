@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Ride Track Compaction
+=====================
+
+RideTracking keeps one row per GPS ping, and most of a finished ride's
+pings lie on straight stretches of road. Once a ride has been finished for
+longer than the raw retention window, its track is simplified with
+Douglas-Peucker: every dropped point lies within `tolerance_m` metres of
+the simplified line, and the first and last points always stay. The
+dropped rows are deleted, and a TrackCompaction row records the before and
+after counts, which also marks the ride as done.
+
+Rides are compacted in batches of `batch_size`, one short transaction per
+batch, so ingestion of live pings is never blocked for long.
+
+Usage:
+    python track_compaction.py              # compact every eligible ride
+    python track_compaction.py --dry-run    # report what would be removed
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from sqlalchemy import and_, or_
+
+from db.models import db, Ride, RideTracking, TrackCompaction
+from driver_index import KM_PER_DEGREE
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DELETE_CHUNK = 500
+
+compaction_points = registry.counter(
+    'track_compaction_points_total', "Tracking points read and deleted by track compaction", ('outcome',))
+compaction_runs = registry.histogram(
+    'track_compaction_seconds', "Duration of a track compaction run", (),
+    (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0))
+
+
+def simplify(points, tolerance_m):
+    """
+    Douglas-Peucker over (lat, lng) points
+
+    Distances are measured to the segment (not its infinite line) in a local
+    equirectangular projection, which is accurate to well under a metre over
+    a ride. Iterative, so long tracks can't hit the recursion limit.
+
+    Returns:
+        Sorted indices of the points to keep
+    """
+    n = len(points)
+    if n < 3:
+        return list(range(n))
+
+    lat0 = points[0][0]
+    metres_per_degree = KM_PER_DEGREE * 1000
+    cos_lat = math.cos(math.radians(lat0))
+    xs = [(lng - points[0][1]) * metres_per_degree * cos_lat for _, lng in points]
+    ys = [(lat - lat0) * metres_per_degree for lat, _ in points]
+
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    tolerance_sq = tolerance_m * tolerance_m
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xs[first], ys[first]
+        dx, dy = xs[last] - ax, ys[last] - ay
+        length_sq = dx * dx + dy * dy
+        farthest = -1
+        farthest_sq = tolerance_sq
+        for index in range(first + 1, last):
+            px, py = xs[index] - ax, ys[index] - ay
+            if length_sq > 0:
+                t = min(1.0, max(0.0, (px * dx + py * dy) / length_sq))
+                px -= t * dx
+                py -= t * dy
+            distance_sq = px * px + py * py
+            if distance_sq > farthest_sq:
+                farthest = index
+                farthest_sq = distance_sq
+        if farthest >= 0:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [index for index in range(n) if keep[index]]
+
+
+class TrackCompactor:
+    """Simplify and prune the tracks of rides finished before the retention window"""
+
+    def __init__(self, app=None, tolerance_m=10.0, retention_hours=72, batch_size=100, interval=3600):
+        """
+        Args:
+            tolerance_m: Furthest a dropped point may be from the simplified track
+            retention_hours: How long a finished ride keeps every raw point
+            batch_size: Rides per transaction
+            interval: Seconds between background runs
+        """
+        self.app = None
+        self.tolerance_m = tolerance_m
+        self.retention_hours = retention_hours
+        self.batch_size = batch_size
+        self.interval = interval
+        self._run_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['track_compaction'] = self
+
+    def start(self):
+        """Compact in a background thread every interval seconds"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="track-compaction", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=30)
+
+    def run_once(self, dry_run=False, max_rides=None):
+        """
+        Compact every eligible ride, a batch at a time
+
+        Args:
+            dry_run: Simplify and count, but delete and record nothing
+            max_rides: Stop after this many rides
+
+        Returns:
+            Summary dict: rides, points_before, points_after, seconds and
+            points_per_second (raw points processed per second)
+        """
+        with self._run_lock:
+            started = time.perf_counter()
+            cutoff = datetime.utcnow() - timedelta(hours=self.retention_hours)
+            summary = {'rides': 0, 'points_before': 0, 'points_after': 0}
+            last_id = 0
+            while max_rides is None or summary['rides'] < max_rides:
+                limit = self.batch_size if max_rides is None else min(self.batch_size, max_rides - summary['rides'])
+                ride_ids = self.eligible_rides(cutoff, last_id, limit)
+                if not ride_ids:
+                    break
+                last_id = ride_ids[-1]
+                before, after = self.compact_batch(ride_ids, dry_run)
+                summary['rides'] += len(ride_ids)
+                summary['points_before'] += before
+                summary['points_after'] += after
+
+            elapsed = time.perf_counter() - started
+        compaction_runs.observe(elapsed)
+        summary['seconds'] = round(elapsed, 3)
+        summary['points_per_second'] = round(summary['points_before'] / elapsed) if elapsed > 0 else 0
+        return summary
+
+    def eligible_rides(self, cutoff, after_id=0, limit=100):
+        """IDs of rides finished before cutoff whose tracks haven't been compacted"""
+        finished = or_(
+            and_(Ride.status == 'completed', Ride.completed_at < cutoff),
+            and_(Ride.status == 'cancelled', Ride.requested_at < cutoff)
+        )
+        rows = (db.session.query(Ride.id)
+                .outerjoin(TrackCompaction, TrackCompaction.ride_id == Ride.id)
+                .filter(finished, Ride.id > after_id, TrackCompaction.ride_id.is_(None))
+                .order_by(Ride.id)
+                .limit(limit)
+                .all())
+        return [ride_id for ride_id, in rows]
+
+    def compact_batch(self, ride_ids, dry_run=False):
+        """
+        Simplify the tracks of the given rides in one transaction
+
+        Returns:
+            (points_before, points_after)
+        """
+        rows = (db.session.query(RideTracking.ride_id, RideTracking.id,
+                                 RideTracking.driver_lat, RideTracking.driver_lng)
+                .filter(RideTracking.ride_id.in_(ride_ids))
+                .order_by(RideTracking.ride_id, RideTracking.timestamp, RideTracking.id)
+                .all())
+
+        tracks = {ride_id: [] for ride_id in ride_ids}
+        for ride_id, points in groupby(rows, key=lambda row: row[0]):
+            tracks[ride_id] = list(points)
+
+        now = datetime.utcnow()
+        drop = []
+        records = []
+        before = after = 0
+        for ride_id, points in tracks.items():
+            kept = simplify([(lat, lng) for _, _, lat, lng in points], self.tolerance_m)
+            kept_ids = {points[index][1] for index in kept}
+            drop.extend(point_id for _, point_id, _, _ in points if point_id not in kept_ids)
+            before += len(points)
+            after += len(kept)
+            records.append({'ride_id': ride_id, 'raw_points': len(points), 'kept_points': len(kept),
+                            'tolerance_m': self.tolerance_m, 'compacted_at': now})
+
+        if dry_run:
+            db.session.rollback()
+            return before, after
+
+        try:
+            for start in range(0, len(drop), DELETE_CHUNK):
+                (RideTracking.query
+                 .filter(RideTracking.id.in_(drop[start:start + DELETE_CHUNK]))
+                 .delete(synchronize_session=False))
+            db.session.execute(TrackCompaction.__table__.insert(), records)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        compaction_points.inc('read', amount=before)
+        compaction_points.inc('deleted', amount=len(drop))
+        return before, after
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    summary = self.run_once()
+                if summary['rides']:
+                    logger.info("Compacted %d ride tracks: %d -> %d points in %.1fs",
+                                summary['rides'], summary['points_before'], summary['points_after'],
+                                summary['seconds'])
+            except Exception as e:
+                logger.error("Track compaction failed: %s", e)
+
+
+def main():
+    import argparse
+
+    from dotenv import load_dotenv
+    from flask import Flask
+
+    from config import TRACK_SIMPLIFY_TOLERANCE_M, TRACK_RAW_RETENTION_HOURS, TRACK_COMPACTION_BATCH
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Simplify the GPS tracks of finished rides")
+    parser.add_argument('--dry-run', action='store_true', help="Report what would be removed, change nothing")
+    parser.add_argument('--tolerance', type=float, default=TRACK_SIMPLIFY_TOLERANCE_M, help="Metres")
+    parser.add_argument('--retention-hours', type=float, default=TRACK_RAW_RETENTION_HOURS)
+    parser.add_argument('--batch-size', type=int, default=TRACK_COMPACTION_BATCH)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI', 'sqlite:///weride.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    compactor = TrackCompactor(app, tolerance_m=args.tolerance, retention_hours=args.retention_hours,
+                               batch_size=args.batch_size)
+
+    with app.app_context():
+        db.create_all()
+        total = db.session.query(RideTracking.id).count()
+        summary = compactor.run_once(dry_run=args.dry_run)
+
+    removed = summary['points_before'] - summary['points_after']
+    print(f"{'🔎 Would compact' if args.dry_run else '✅ Compacted'} {summary['rides']} rides: "
+          f"{summary['points_before']} -> {summary['points_after']} points ({removed} removed) "
+          f"in {summary['seconds']:.2f}s, {summary['points_per_second']} points/s")
+    print(f"📉 RideTracking rows: {total} -> {total if args.dry_run else total - removed}")
+
+
+if __name__ == "__main__":
+    main()
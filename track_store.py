@@ -0,0 +1,241 @@
+"""
+Packed Ride Track Store
+=======================
+
+RideTracking spends a full row (id, ride_id, two floats, a timestamp and
+an index entry) on every GPS ping, and reading a track back hydrates one
+ORM object per point. This store keeps a ride's whole track in a single
+RideTrack row instead, as three int32 columns packed back to back in one
+little-endian blob:
+
+    [lat deltas x n][lng deltas x n][ms offsets x n]
+
+Coordinates are in E7 units (1e-7 degree, about 1 cm) and delta-encoded
+against the previous point. Deltas wrap modulo 2**32, so a jump across
+the antimeridian still fits. Times are milliseconds after started_at.
+That makes 12 bytes per point. PackedTrack.columns() returns zero-copy
+memoryviews over the blob, and as_numpy() decodes the coordinates with
+one cumulative sum.
+
+An append rewrites the blob and only succeeds if point_count hasn't moved
+since the read. Two writers appending to the same ride therefore retry
+instead of losing each other's points.
+"""
+
+import logging
+import sys
+from array import array
+from datetime import timedelta
+from itertools import accumulate
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from db.models import db, RideTrack, RideTracking
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+E7 = 10_000_000
+INT32_MIN = -(1 << 31)
+INT32_MAX = (1 << 31) - 1
+_INT32 = 'i' if array('i').itemsize == 4 else 'l'
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+track_points = registry.counter(
+    'track_store_points_total', "GPS points appended to packed ride tracks")
+track_conflicts = registry.counter(
+    'track_store_append_conflicts_total', "Packed track appends retried after a concurrent append")
+
+
+def _wrap(value):
+    """Reduce an integer to int32 the way two's complement overflow would"""
+    return (value - INT32_MIN) % (1 << 32) + INT32_MIN
+
+
+def _pack(values):
+    column = array(_INT32, values)
+    if not _LITTLE_ENDIAN:
+        column.byteswap()
+    return column.tobytes()
+
+
+def encode(points, last_lat_e7, last_lng_e7, started_at):
+    """
+    Pack (lat, lng, timestamp) points that follow a track's last point
+
+    Args:
+        points: (lat, lng, timestamp) tuples, oldest first
+        last_lat_e7, last_lng_e7: Last point already in the track (0, 0 for a new one)
+        started_at: The track's time origin
+
+    Returns:
+        (lat_column, lng_column, offset_column, last_lat_e7, last_lng_e7),
+        the columns as bytes
+    """
+    lat_deltas = []
+    lng_deltas = []
+    offsets = []
+    for lat, lng, timestamp in points:
+        if not -90 <= lat <= 90 or not -180 <= lng <= 180:
+            raise ValueError(f"Invalid coordinates ({lat}, {lng})")
+        offset = (timestamp - started_at) // timedelta(milliseconds=1)
+        if not INT32_MIN <= offset <= INT32_MAX:
+            raise ValueError(f"Point at {timestamp} is too far from the track start {started_at}")
+        lat_e7 = round(lat * E7)
+        lng_e7 = round(lng * E7)
+        lat_deltas.append(_wrap(lat_e7 - last_lat_e7))
+        lng_deltas.append(_wrap(lng_e7 - last_lng_e7))
+        offsets.append(offset)
+        last_lat_e7, last_lng_e7 = lat_e7, lng_e7
+    return _pack(lat_deltas), _pack(lng_deltas), _pack(offsets), last_lat_e7, last_lng_e7
+
+
+class PackedTrack:
+    """A ride's track as stored, decoded on demand"""
+
+    __slots__ = ('ride_id', 'started_at', 'count', 'data')
+
+    def __init__(self, ride_id, started_at, count, data):
+        self.ride_id = ride_id
+        self.started_at = started_at
+        self.count = count
+        self.data = data
+
+    def __len__(self):
+        return self.count
+
+    def columns(self):
+        """
+        The stored columns as int32 memoryviews
+
+        Returns:
+            (lat_deltas, lng_deltas, offsets_ms), views over the blob
+            itself on little-endian hosts
+        """
+        if _LITTLE_ENDIAN:
+            ints = memoryview(self.data).cast(_INT32)
+        else:
+            swapped = array(_INT32, self.data)
+            swapped.byteswap()
+            ints = memoryview(swapped)
+        n = self.count
+        return ints[:n], ints[n:2 * n], ints[2 * n:3 * n]
+
+    def as_numpy(self):
+        """
+        Decode with NumPy
+
+        Returns:
+            (lat, lng, offsets_ms): float64 degrees, and the stored int32
+            offsets as a zero-copy view
+        """
+        import numpy as np
+
+        n = self.count
+        raw = np.frombuffer(self.data, dtype='<i4', count=3 * n).reshape(3, n)
+        # int32 accumulation wraps exactly like the encoded deltas did
+        lat = np.cumsum(raw[0], dtype=np.int32) / E7
+        lng = np.cumsum(raw[1], dtype=np.int32) / E7
+        return lat, lng, raw[2]
+
+    def points(self):
+        """(lat, lng, timestamp) tuples in track order"""
+        lat_deltas, lng_deltas, offsets = self.columns()
+        lats = (_wrap(value) / E7 for value in accumulate(lat_deltas))
+        lngs = (_wrap(value) / E7 for value in accumulate(lng_deltas))
+        times = (self.started_at + timedelta(milliseconds=offset) for offset in offsets)
+        return list(zip(lats, lngs, times))
+
+
+class TrackStore:
+    """Append to and read the packed tracks of rides"""
+
+    def __init__(self, retries=5):
+        self.retries = retries
+
+    def append(self, ride_id, points):
+        """
+        Add points to the end of a ride's track
+
+        Runs in the caller's transaction; the caller commits.
+
+        Args:
+            points: (lat, lng, timestamp) tuples, oldest first
+
+        Returns:
+            Number of points in the track afterwards
+        """
+        points = list(points)
+        if not points:
+            return None
+
+        table = RideTrack.__table__
+        for _ in range(self.retries):
+            row = db.session.execute(
+                select(table.c.started_at, table.c.point_count, table.c.last_lat_e7,
+                       table.c.last_lng_e7, table.c.data)
+                .where(table.c.ride_id == ride_id)
+            ).first()
+
+            if row is None:
+                started_at = points[0][2]
+                lat_column, lng_column, offsets, last_lat, last_lng = encode(points, 0, 0, started_at)
+                try:
+                    # Savepoint: losing the race for a new track mustn't roll back the caller's work
+                    with db.session.begin_nested():
+                        db.session.execute(table.insert().values(
+                            ride_id=ride_id, started_at=started_at, point_count=len(points),
+                            last_lat_e7=last_lat, last_lng_e7=last_lng,
+                            data=lat_column + lng_column + offsets, updated_at=points[-1][2]
+                        ))
+                except IntegrityError:
+                    track_conflicts.inc()
+                    continue
+                track_points.inc(amount=len(points))
+                return len(points)
+
+            count = row.point_count
+            lat_column, lng_column, offsets, last_lat, last_lng = encode(
+                points, row.last_lat_e7, row.last_lng_e7, row.started_at)
+            old = memoryview(row.data)
+            data = b''.join((old[:4 * count], lat_column, old[4 * count:8 * count], lng_column,
+                             old[8 * count:12 * count], offsets))
+            result = db.session.execute(
+                table.update()
+                .where(table.c.ride_id == ride_id, table.c.point_count == count)
+                .values(point_count=count + len(points), last_lat_e7=last_lat, last_lng_e7=last_lng,
+                        data=data, updated_at=points[-1][2])
+            )
+            if result.rowcount == 1:
+                track_points.inc(amount=len(points))
+                return count + len(points)
+            track_conflicts.inc()
+
+        raise RuntimeError(f"Track of ride {ride_id} kept changing; gave up after {self.retries} attempts")
+
+    def read(self, ride_id):
+        """
+        Returns:
+            The ride's PackedTrack, or None if it has none
+        """
+        table = RideTrack.__table__
+        row = db.session.execute(
+            select(table.c.started_at, table.c.point_count, table.c.data).where(table.c.ride_id == ride_id)
+        ).first()
+        if row is None:
+            return None
+        return PackedTrack(ride_id, row.started_at, row.point_count, row.data)
+
+    def points(self, ride_id):
+        """
+        (lat, lng, timestamp) of a ride's track from whichever store holds
+        it: the packed track, else RideTracking rows
+        """
+        track = self.read(ride_id)
+        if track is not None:
+            return track.points()
+        return (db.session.query(RideTracking.driver_lat, RideTracking.driver_lng, RideTracking.timestamp)
+                .filter(RideTracking.ride_id == ride_id)
+                .order_by(RideTracking.timestamp, RideTracking.id)
+                .all())
@@ -8,10 +8,12 @@ SMS, and webhooks.
 """
 
 import os
-from twilio.rest import Client
-from twilio.twiml import VoiceResponse
+from twilio.twiml.voice_response import VoiceResponse
 from dotenv import load_dotenv
 import logging
+from message_templates import AIVoiceTemplates, CallStatusTemplates
+from twilio_pool import get_twilio_client, twilio_breaker
+from rate_limit import throttled
 
 # Load environment variables
 load_dotenv()
@@ -35,8 +37,8 @@ class TwilioConfig:
         if not all([self.account_sid, self.auth_token, self.phone_number]):
             raise ValueError("Missing required Twilio credentials in environment variables")
         
-        # Initialize Twilio client
-        self.client = Client(self.account_sid, self.auth_token)
+        # Shared, pooled client (same connections as app.py and utils.py)
+        self.client = get_twilio_client(self.account_sid, self.auth_token)
         
         logger.info(f"Twilio configured with phone number: {self.phone_number}")
     
@@ -48,20 +50,22 @@ class TwilioConfig:
         """Generate webhook URL for Twilio callbacks"""
         return f"{self.ngrok_base.rstrip('/')}/{endpoint.lstrip('/')}"
     
-    def make_call(self, to_number, twiml_url, **kwargs):
+    def make_call(self, to_number, twiml_url, call_type=None, **kwargs):
         """
         Make a voice call using Twilio
         
         Args:
             to_number: Phone number to call
             twiml_url: URL that returns TwiML instructions
+            call_type: Label for the call in the Twilio latency metrics
             **kwargs: Additional call parameters (timeout, etc.)
         
         Returns:
             Twilio call SID or None if failed
         """
         try:
-            call = self.client.calls.create(
+            call = twilio_breaker.call(
+                throttled('calls.create', self.client.calls.create, call_type),
                 to=to_number,
                 from_=self.phone_number,
                 url=twiml_url,
@@ -74,19 +78,21 @@ class TwilioConfig:
             logger.error(f"Failed to make call to {to_number}: {str(e)}")
             return None
     
-    def send_sms(self, to_number, message):
+    def send_sms(self, to_number, message, call_type=None):
         """
         Send SMS using Twilio
         
         Args:
             to_number: Phone number to send SMS to
             message: SMS content
+            call_type: Label for the message in the Twilio latency metrics
         
         Returns:
             Message SID or None if failed
         """
         try:
-            message = self.client.messages.create(
+            message = twilio_breaker.call(
+                throttled('messages.create', self.client.messages.create, call_type),
                 to=to_number,
                 from_=self.phone_number,
                 body=message
@@ -168,126 +174,6 @@ class TwiMLBuilder:
         response.redirect(redirect_url)
         return str(response)
 
-# AI Voice Message Templates
-class AIVoiceTemplates:
-    """Pre-defined AI voice message templates for different ride statuses"""
-    
-    @staticmethod
-    def booking_confirmation(passenger_name, ride_id, pickup_location, destination):
-        """Booking confirmation message"""
-        return f"""
-        Hello {passenger_name}! This is WeRide AI calling to confirm your booking.
-        Your ride has been successfully booked with ID {ride_id}.
-        We will pick you up from {pickup_location} and take you to {destination}.
-        We're finding the best driver for you. You'll receive another call when a driver is assigned.
-        Thank you for choosing WeRide!
-        """
-    
-    @staticmethod
-    def driver_assigned(passenger_name, driver_name, vehicle_info, eta_minutes):
-        """Driver assignment notification"""
-        return f"""
-        Hello {passenger_name}! Great news from WeRide AI.
-        Your driver {driver_name} has been assigned to your ride.
-        They're driving a {vehicle_info} and will arrive in approximately {eta_minutes} minutes.
-        You can track your driver's location in the WeRide app.
-        We'll call you again when your driver arrives at the pickup location.
-        """
-    
-    @staticmethod
-    def driver_arrival(passenger_name, driver_name, location):
-        """Driver arrival notification with interaction"""
-        return f"""
-        Hello {passenger_name}! This is WeRide AI.
-        Your driver {driver_name} has arrived at {location}.
-        Please come to the pickup point and look for your assigned vehicle.
-        If you can see your driver and are ready to start your ride, press 1.
-        If you need more time or can't find your driver, press 2.
-        If you want to cancel this ride, press 3.
-        """
-    
-    @staticmethod
-    def safety_check(passenger_name, driver_name):
-        """Mid-ride safety check with interaction"""
-        return f"""
-        Hello {passenger_name}! This is WeRide AI conducting a routine safety check.
-        You're currently on a ride with driver {driver_name}.
-        If everything is going well and you feel safe, press 1.
-        If you need assistance or feel unsafe, press 9 immediately.
-        If you don't respond, we'll follow up with additional safety measures.
-        Your safety is our top priority.
-        """
-    
-    @staticmethod
-    def ride_completion(passenger_name, destination, fare):
-        """Ride completion notification"""
-        return f"""
-        Hello {passenger_name}! This is WeRide AI.
-        Your ride to {destination} has been completed successfully.
-        The total fare is ${fare}.
-        We hope you had a pleasant journey with WeRide.
-        You'll receive a receipt via email shortly.
-        Thank you for choosing WeRide for your transportation needs!
-        """
-    
-    @staticmethod
-    def feedback_request(passenger_name, driver_name):
-        """Post-ride feedback collection"""
-        return f"""
-        Hello {passenger_name}! This is WeRide AI.
-        We hope you enjoyed your ride with driver {driver_name}.
-        We'd love to hear about your experience to help us improve our service.
-        To rate your ride, press a number from 1 to 5, where 5 is excellent and 1 is poor.
-        Press 5 for excellent, 4 for good, 3 for average, 2 for below average, or 1 for poor.
-        Your feedback helps us maintain high service quality.
-        """
-
-# Call Status Templates
-class CallStatusTemplates:
-    """Templates for different call status scenarios"""
-    
-    @staticmethod
-    def driver_delay(passenger_name, driver_name, new_eta):
-        """Driver delay notification"""
-        return f"""
-        Hello {passenger_name}! This is WeRide AI with an update.
-        Your driver {driver_name} is experiencing a slight delay due to traffic conditions.
-        The new estimated arrival time is {new_eta} minutes.
-        We apologize for any inconvenience and appreciate your patience.
-        You can track the driver's real-time location in the WeRide app.
-        """
-    
-    @staticmethod
-    def ride_cancellation(passenger_name, reason, refund_info=None):
-        """Ride cancellation notification"""
-        base_message = f"""
-        Hello {passenger_name}! This is WeRide AI calling about your recent booking.
-        Unfortunately, your ride has been cancelled due to {reason}.
-        We sincerely apologize for the inconvenience.
-        """
-        
-        if refund_info:
-            base_message += f" {refund_info}"
-        
-        base_message += """
-        You can immediately book a new ride through the WeRide app.
-        Thank you for your understanding and for choosing WeRide.
-        """
-        
-        return base_message
-    
-    @staticmethod
-    def payment_reminder(passenger_name, amount, ride_date):
-        """Payment reminder for outstanding rides"""
-        return f"""
-        Hello {passenger_name}! This is WeRide AI calling regarding your ride on {ride_date}.
-        We notice there's an outstanding payment of ${amount} for your recent trip.
-        Please complete the payment through the WeRide app at your earliest convenience.
-        If you've already made the payment, please disregard this call.
-        For payment assistance, you can contact our support team.
-        Thank you for using WeRide!
-        """
-
 # Response handlers for interactive calls
 class CallResponseHandlers:
     """Handle responses from interactive voice calls"""
@@ -414,7 +300,7 @@ def make_ai_call(to_number, message_type, **context):
         params = '&'.join([f'{k}={v}' for k, v in context.items()])
         webhook_url += f'?{params}'
     
-    return twilio_config.make_call(to_number, webhook_url)
+    return twilio_config.make_call(to_number, webhook_url, call_type=message_type)
 
 def send_notification_sms(to_number, message_type, **context):
     """Send SMS notification"""
@@ -427,7 +313,7 @@ def send_notification_sms(to_number, message_type, **context):
     }
     
     message = messages.get(message_type, "WeRide: Thank you for using our service!")
-    return twilio_config.send_sms(to_number, message)
+    return twilio_config.send_sms(to_number, message, call_type=message_type)
 
 if __name__ == "__main__":
     # Test configuration
@@ -0,0 +1,124 @@
+"""
+Shared Twilio Client
+====================
+
+One Twilio REST client per set of credentials, shared by every call path
+(app.py, utils.py, TwilioConfig). Its HTTP session keeps connections to the
+API alive in a fixed-size pool sized for the call dispatcher's workers, with
+explicit connect/read timeouts. Only connection failures are retried, since
+a request that reached Twilio may already have placed the call.
+
+twilio_breaker guards REST requests: callers go through
+twilio_breaker.call(throttled('calls.create', client.calls.create), ...)
+so an outage fails fast instead of holding every worker for the read
+timeout, and every retry waits for a rate limiter token.
+"""
+
+import threading
+
+from requests.adapters import HTTPAdapter
+from requests import exceptions as requests_errors
+from twilio.base.exceptions import TwilioRestException
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client
+from urllib3.util.retry import Retry
+
+from config import (
+    TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_POOL_SIZE,
+    TWILIO_CONNECT_TIMEOUT, TWILIO_READ_TIMEOUT, TWILIO_CONNECT_RETRIES, TWILIO_API_BASE,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS, RETRY_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY
+)
+from rate_limit import LoadShed
+from resilience import CircuitBreaker
+
+_clients = {}
+_lock = threading.Lock()
+
+
+class PooledHttpClient(TwilioHttpClient):
+    """TwilioHttpClient with a tuned keep-alive pool and (connect, read) timeouts"""
+
+    def __init__(self, pool_size=TWILIO_POOL_SIZE, connect_timeout=TWILIO_CONNECT_TIMEOUT,
+                 read_timeout=TWILIO_READ_TIMEOUT, connect_retries=TWILIO_CONNECT_RETRIES):
+        super().__init__(pool_connections=True)
+        # requests takes a (connect, read) pair; the base class only validates floats
+        self.timeout = (connect_timeout, read_timeout)
+        retries = Retry(total=connect_retries, connect=connect_retries, read=0, status=0,
+                        backoff_factor=0.2, raise_on_status=False)
+        # pool_block: threads beyond pool_size wait for a connection rather than
+        # opening one that is thrown away afterwards
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                              pool_block=True, max_retries=retries)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+
+def get_twilio_client(account_sid=None, auth_token=None, base_url=None):
+    """
+    Shared Twilio client, built on first use
+
+    Args:
+        account_sid: Account SID (default: TWILIO_ACCOUNT_SID)
+        auth_token: Auth token (default: TWILIO_AUTH_TOKEN)
+        base_url: Override for the REST API host, e.g. a local stub
+            (default: TWILIO_API_BASE)
+
+    Returns:
+        twilio.rest.Client shared by every caller with these arguments
+
+    Raises:
+        ValueError: If no credentials are given or configured
+    """
+    account_sid = account_sid or TWILIO_ACCOUNT_SID
+    auth_token = auth_token or TWILIO_AUTH_TOKEN
+    base_url = base_url or TWILIO_API_BASE
+    if not account_sid or not auth_token:
+        raise ValueError("Missing Twilio credentials")
+
+    key = (account_sid, auth_token, base_url)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = Client(account_sid, auth_token, http_client=PooledHttpClient())
+            if base_url:
+                client.api.base_url = base_url.rstrip('/')
+            _clients[key] = client
+    return client
+
+
+def close_all():
+    """Close every pooled connection (the clients stay usable and reconnect)"""
+    with _lock:
+        for client in _clients.values():
+            client.http_client.session.close()
+
+
+def is_twilio_failure(exc):
+    """Errors that say Twilio itself is unhealthy: network errors, 429 and 5xx"""
+    if isinstance(exc, TwilioRestException):
+        return exc.status == 429 or exc.status >= 500
+    return isinstance(exc, (requests_errors.ConnectionError, requests_errors.Timeout))
+
+
+def is_twilio_retryable(exc):
+    """Errors after which Twilio can't have acted on the request, so a retry won't place a second call"""
+    if isinstance(exc, TwilioRestException):
+        return exc.status in (429, 503)
+    return isinstance(exc, requests_errors.ConnectTimeout)
+
+
+twilio_breaker = CircuitBreaker(
+    'twilio',
+    failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=CIRCUIT_RESET_SECONDS,
+    attempts=RETRY_ATTEMPTS,
+    base_delay=RETRY_BASE_DELAY,
+    max_delay=RETRY_MAX_DELAY,
+    is_failure=is_twilio_failure,
+    is_retryable=is_twilio_retryable,
+    is_unsent=lambda exc: isinstance(exc, LoadShed)
+)
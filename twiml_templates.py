@@ -0,0 +1,136 @@
+"""
+Precompiled TwiML Templates
+===========================
+
+Registry of voice message templates compiled once into ready-made TwiML
+documents. Each message variant is rendered through VoiceResponse/Gather at
+registration time with its placeholders left as slots, so serving a webhook
+is a variant pick plus a single string fill of XML-escaped values.
+"""
+
+import inspect
+import random
+import re
+from xml.sax.saxutils import escape
+
+from twilio.twiml.voice_response import VoiceResponse, Gather
+
+_PLACEHOLDER = re.compile(r'\{(\w+)\}')
+_SLOT = re.compile(r'@@(\w+)@@')
+
+FALLBACK_MESSAGE = "Hello from WeRide AI Assistant. Thank you for using our service."
+
+
+class _EscapedValues(dict):
+    """Values for a fill: escaped on first use, blank when missing"""
+
+    def __init__(self, values):
+        super().__init__()
+        self._raw = values
+
+    def __missing__(self, key):
+        value = self._raw.get(key)
+        escaped = escape(str(value)) if value is not None else ''
+        self[key] = escaped
+        return escaped
+
+
+class CompiledTemplate:
+    """All variants of one message, compiled to TwiML format strings"""
+
+    __slots__ = ('name', 'variants', 'fields')
+
+    def __init__(self, name, variants, fields):
+        self.name = name
+        self.variants = variants
+        self.fields = fields
+
+    def render(self, values):
+        """Fill a randomly chosen variant with XML-escaped values"""
+        return random.choice(self.variants).format_map(_EscapedValues(values))
+
+
+class TemplateRegistry:
+    """Compile message templates to TwiML once and render them by name"""
+
+    def __init__(self):
+        self._templates = {}
+        self.fallback = self._compile('fallback', [FALLBACK_MESSAGE], 'Polly.Joanna', 'en-US', None, None)
+
+    def __contains__(self, name):
+        return name in self._templates
+
+    def names(self):
+        return sorted(self._templates)
+
+    def register(self, name, variants, voice='Polly.Joanna', language='en-US', gather_action=None, gather_prompt=None):
+        """
+        Compile the variants of a message into TwiML templates
+
+        Args:
+            name: Template name, e.g. the call type
+            variants: Message strings with {placeholder} fields
+            voice: Twilio voice for the message
+            language: Language code
+            gather_action: If set, collect one keypad digit posted to this URL
+            gather_prompt: Spoken inside the Gather after the message; without
+                it the message itself is spoken inside the Gather
+
+        Returns:
+            The CompiledTemplate
+        """
+        template = self._compile(name, variants, voice, language, gather_action, gather_prompt)
+        self._templates[name] = template
+        return template
+
+    def register_functions(self, prefix, source, voice='alice', language='en-US'):
+        """
+        Compile every static message function on a template class
+
+        Each function is called once with '{param}' for every parameter, so
+        the text it builds carries the parameters as placeholders. Functions
+        that only add text conditionally are compiled with that text present.
+        """
+        for attr, func in inspect.getmembers(source, inspect.isfunction):
+            if attr.startswith('_'):
+                continue
+            params = list(inspect.signature(func).parameters)
+            text = func(**{param: '{%s}' % param for param in params})
+            self.register(f"{prefix}.{attr}", [' '.join(text.split())], voice=voice, language=language)
+
+    def get(self, name):
+        return self._templates.get(name, self.fallback)
+
+    def render(self, name, **values):
+        """Render a registered template to a TwiML string; unknown names use the fallback"""
+        return self.get(name).render(values)
+
+    @staticmethod
+    def _compile(name, variants, voice, language, gather_action, gather_prompt):
+        compiled = []
+        fields = set()
+        for text in variants:
+            fields.update(_PLACEHOLDER.findall(text))
+            # Swap {field} for a token the XML serializer leaves untouched
+            message = _PLACEHOLDER.sub(r'@@\1@@', text)
+
+            response = VoiceResponse()
+            if gather_action and not gather_prompt:
+                gather = Gather(numDigits=1, action=gather_action, method='POST')
+                gather.say(message, voice=voice, language=language)
+                response.append(gather)
+            else:
+                response.say(message, voice=voice, language=language)
+                if gather_action:
+                    gather = Gather(numDigits=1, action=gather_action, method='POST')
+                    gather.say(gather_prompt, voice=voice, language=language)
+                    response.append(gather)
+
+            xml = str(response).replace('{', '{{').replace('}', '}}')
+            compiled.append(_SLOT.sub(r'{\1}', xml))
+
+        return CompiledTemplate(name, compiled, frozenset(fields))
+
+
+# Shared registry; modules register their templates at import time
+twiml_templates = TemplateRegistry()
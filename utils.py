@@ -1,21 +1,29 @@
 # utils.py
 import os
-from twilio.rest import Client
 from dotenv import load_dotenv
 
-load_dotenv()
+from rate_limit import throttled
 
-client = Client(
-    os.getenv("TWILIO_ACCOUNT_SID"),
-    os.getenv("TWILIO_AUTH_TOKEN")
-)
+load_dotenv()
 
 TWILIO_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
 
 
-def make_voice_call(to, message_url):
+def get_client():
+    # Imported here so importing utils stays cheap; the client is shared and pooled
+    from twilio_pool import get_twilio_client
+    return get_twilio_client()
+
+
+def get_breaker():
+    from twilio_pool import twilio_breaker
+    return twilio_breaker
+
+
+def make_voice_call(to, message_url, call_type=None):
     try:
-        call = client.calls.create(
+        call = get_breaker().call(
+            throttled('calls.create', get_client().calls.create, call_type),
             to=to,
             from_=TWILIO_NUMBER,
             url=message_url  # TwiML or webhook
@@ -26,9 +34,10 @@ def make_voice_call(to, message_url):
         return None
 
 
-def send_sms(to, body):
+def send_sms(to, body, call_type=None):
     try:
-        message = client.messages.create(
+        message = get_breaker().call(
+            throttled('messages.create', get_client().messages.create, call_type),
             to=to,
             from_=TWILIO_NUMBER,
             body=body
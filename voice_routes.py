@@ -0,0 +1,385 @@
+"""
+Voice Routes
+============
+
+TwiML webhooks Twilio fetches during a call: the message documents and the
+keypad response handlers. They render from templates and request
+parameters only, so this module never imports the database, the Twilio REST
+client or Firebase, and serves cold requests through the light app from
+create_voice_app().
+
+Responses pass through the audio cache on the way out, so any <Say> whose
+audio has been pre-rendered is played from /audio/<hash>.wav instead.
+"""
+
+import os
+
+from flask import Blueprint, Flask, Response, abort, current_app, request, send_from_directory
+from twilio.twiml.voice_response import VoiceResponse, Gather
+
+from audio_cache import AUDIO_MIMETYPE, AUDIO_SUFFIX, KEY_PATTERN, MAX_AGE, audio_cache, spoken_texts
+from message_templates import template_names
+from metrics import RequestMetrics
+from twiml_templates import twiml_templates
+
+voice_routes = Blueprint('voice', __name__)
+
+# Enhanced AI Response templates with detailed status updates
+AI_RESPONSES = {
+    'booking_confirmed': [
+        "Hello! This is WeRide AI assistant. Your ride has been successfully booked for {price} rupees from {pickup} to {destination}. Your booking ID is {booking_id}. We'll call you when a driver accepts your request.",
+        "Hi! WeRide AI here. Great news! Your ride booking is confirmed. Route: {pickup} to {destination}. Price: {price} rupees. Booking reference: {booking_id}. You'll get another call when your driver is assigned.",
+        "Thank you for choosing WeRide! Your booking is confirmed. From {pickup} to {destination} for {price} rupees. Booking ID: {booking_id}. We'll notify you once a driver accepts."
+    ],
+    'driver_assigned': [
+        "Good news! Driver {driver_name} has accepted your ride request. They're driving a {vehicle} with license plate {plate}. Driver rating: {rating} stars. They'll reach you in approximately {eta} minutes.",
+        "WeRide AI here! Your driver {driver_name} is confirmed. Vehicle: {vehicle}, Plate: {plate}, Rating: {rating} stars. Estimated arrival: {eta} minutes. Get ready!",
+        "Hello! Driver {driver_name} has accepted your WeRide booking. They're in a {vehicle} ({plate}) with {rating} star rating. Expected pickup time: {eta} minutes."
+    ],
+    'driver_enroute': [
+        "Your WeRide driver {driver_name} is now on the way to pick you up. They're currently {distance} away and should arrive in {eta} minutes. Vehicle: {vehicle}, Plate: {plate}.",
+        "WeRide update: Driver {driver_name} is heading to your location. Current distance: {distance}. Arrival time: approximately {eta} minutes. Look for {vehicle} with plate {plate}.",
+        "Hi! Your driver {driver_name} is en route. They're {distance} away in a {vehicle} ({plate}). Estimated arrival: {eta} minutes. Please be ready!"
+    ],
+    'driver_arrived': [
+        "Your WeRide driver {driver_name} has arrived at your pickup location! They're waiting in a {vehicle} with license plate {plate}. Please come out and look for your driver. Press 1 when you see them, or 2 if you need more time.",
+        "Hi! This is WeRide AI. Driver {driver_name} is now at your location in a {vehicle}, plate number {plate}. They're waiting for you outside. Press 1 to confirm you're coming out, or 2 if you need a few more minutes.",
+        "Good day! Your WeRide driver {driver_name} has reached your pickup point. Look for a {vehicle} with plate {plate}. Press 1 when you spot your driver, or 2 if you need additional time to come out."
+    ],
+    'ride_started': [
+        "Your WeRide journey has begun! Driver {driver_name} is taking you from {pickup} to {destination}. Estimated trip time: {duration} minutes. For safety, we may call to check on you during the ride.",
+        "WeRide AI here! Your trip has started with driver {driver_name}. Route: {pickup} to {destination}. Journey time: approximately {duration} minutes. Have a safe ride!",
+        "Hello! Your WeRide trip is underway. Driver {driver_name} is driving you to {destination}. Expected arrival: {duration} minutes. Enjoy your ride and stay safe!"
+    ],
+    'safety_check': [
+        "This is WeRide AI safety monitoring. We're checking in on your ongoing ride with driver {driver_name}. Press 1 if everything is fine and you feel safe. Press 2 if you need immediate assistance or feel unsafe.",
+        "WeRide safety AI here. How is your ride going with driver {driver_name}? Press 1 if you're comfortable and safe. Press 2 if you have any safety concerns or need help.",
+        "Hi, this is WeRide AI conducting a safety check. You're currently on a ride with {driver_name}. Press 1 to confirm you're safe and comfortable. Press 2 if you need emergency assistance."
+    ],
+    'ride_completed': [
+        "Your WeRide journey is complete! You've arrived at {destination}. Total fare: {final_price} rupees. Driver: {driver_name}. We hope you had a pleasant experience. A feedback call will follow shortly.",
+        "WeRide AI here! Trip completed successfully to {destination}. Final amount: {final_price} rupees. Thank you for riding with driver {driver_name}. Please expect a feedback call in a moment.",
+        "Hello! Your WeRide trip has ended at {destination}. Total cost: {final_price} rupees. Driver {driver_name} thanks you for the ride. We'll call back shortly for your feedback."
+    ],
+    'feedback_request': [
+        "Hi! WeRide AI here for your ride feedback. How was your experience with driver {driver_name} from {pickup} to {destination}? Press 1 for excellent, 2 for good, 3 for average, 4 for poor, or 5 if you had serious issues.",
+        "WeRide feedback collection! Please rate your recent trip with {driver_name}. Route: {pickup} to {destination}. Press 1 for 5 stars, 2 for 4 stars, 3 for 3 stars, 4 for 2 stars, or 5 for 1 star.",
+        "Hello! How was your WeRide experience? Driver: {driver_name}, Route: {pickup} to {destination}. Rate your trip: Press 1 for excellent service, 2 for good, 3 for okay, 4 for poor, or 5 for very poor."
+    ],
+    'ride_cancelled': [
+        "WeRide AI notification: Your ride booking has been cancelled. Reason: {reason}. If this was unexpected, please contact our support. You can book a new ride anytime through our app.",
+        "Hi! This is WeRide AI. Your ride from {pickup} to {destination} has been cancelled due to: {reason}. No charges applied. Feel free to book another ride when you're ready.",
+        "WeRide update: Your booking for {pickup} to {destination} is cancelled. Reason: {reason}. We apologize for any inconvenience. You can make a new booking immediately."
+    ],
+    'payment_reminder': [
+        "WeRide AI payment reminder: Your trip with {driver_name} costs {final_price} rupees. Please complete the payment to your driver. Trip: {pickup} to {destination}. Thank you!",
+        "Payment reminder from WeRide AI! Please pay {final_price} rupees to driver {driver_name} for your ride from {pickup} to {destination}. We appreciate your prompt payment."
+    ],
+    'driver_delay': [
+        "WeRide AI update: Your driver {driver_name} is running approximately {delay} minutes late due to {reason}. They'll reach you as soon as possible. We apologize for the delay.",
+        "Hi! Driver {driver_name} is delayed by about {delay} minutes because of {reason}. They're still coming to pick you up. Thank you for your patience with WeRide."
+    ]
+}
+
+# ─────────── DYNAMIC AI VOICE CALL ───────────
+@voice_routes.route("/voice-dynamic", methods=["POST"])
+def voice_dynamic():
+    message = request.form.get("message", "This is a default AI message.")
+    voice = request.form.get("voice", "Polly.Joanna")  # Options: Polly.Matthew, Polly.Ivy, etc.
+
+    xml = f"""<?xml version="1.0" encoding="UTF-8"?>
+<Response>
+    <Say voice="{voice}" language="en-US">{message}</Say>
+</Response>"""
+    return Response(xml, mimetype='text/xml')
+
+# ─────────── STATIC XML VOICE ROUTES ───────────
+@voice_routes.route("/voice-arrival", methods=["POST"])
+def voice_arrival():
+    resp = """<?xml version="1.0" encoding="UTF-8"?>
+<Response>
+    <Say voice="Polly.Joanna" language="en-US">
+        Your WeRide driver has arrived. Please confirm before boarding.
+    </Say>
+</Response>"""
+    return Response(resp, mimetype='text/xml')
+
+@voice_routes.route("/voice-safety", methods=["POST"])
+def voice_safety():
+    resp = """<?xml version="1.0" encoding="UTF-8"?>
+<Response>
+    <Gather action="/safety-response" numDigits="1">
+        <Say voice="Polly.Matthew" language="en-US">
+            We detected a possible issue. Press 1 if you're safe. Press 2 if you need help.
+        </Say>
+    </Gather>
+</Response>"""
+    return Response(resp, mimetype='text/xml')
+
+@voice_routes.route("/voice-feedback", methods=["POST"])
+def voice_feedback():
+    resp = """<?xml version="1.0" encoding="UTF-8"?>
+<Response>
+    <Say voice="Polly.Ivy" language="en-US">
+        How was your ride today? Press 1 for good, 2 for bad, or leave a short message after the tone.
+    </Say>
+</Response>"""
+    return Response(resp, mimetype='text/xml')
+
+# ─────────── ENHANCED TWIML RESPONSE HANDLERS ───────────
+# Call types served by /twiml-enhanced, compiled to TwiML once at startup
+ENHANCED_TWIML = {
+    'booking_confirmed': {},
+    'driver_assigned': {},
+    'driver_arrived': {
+        'gather_action': '/handle-arrival-response-enhanced',
+        'gather_prompt': "Press 1 when you see your driver, or 2 if you need more time."
+    },
+    'safety_check': {'voice': 'Polly.Matthew', 'gather_action': '/handle-safety-response-enhanced'},
+    'feedback_request': {'voice': 'Polly.Ivy', 'gather_action': '/handle-feedback-response-enhanced'},
+    'ride_completed': {},
+    'ride_cancelled': {}
+}
+
+for enhanced_call_type, twiml_options in ENHANCED_TWIML.items():
+    twiml_templates.register(enhanced_call_type, AI_RESPONSES[enhanced_call_type], **twiml_options)
+
+# message_templates names served by /twiml/message/<name>, e.g. for campaigns
+MESSAGE_TWIML = frozenset(template_names())
+
+@voice_routes.route("/twiml-enhanced", methods=["POST"])
+def generate_enhanced_twiml():
+    """Generate enhanced TwiML responses with context"""
+    call_type = request.args.get('call_type', 'booking')
+    
+    # Get context data from URL parameters
+    price = request.args.get('price', '0')
+    context = {
+        'booking_id': request.args.get('ride_id') or 'WR12345',
+        'driver_name': request.args.get('driver_name', 'your driver'),
+        'vehicle': request.args.get('vehicle', 'vehicle'),
+        'plate': request.args.get('plate', 'unknown'),
+        'pickup': request.args.get('pickup', 'your location'),
+        'destination': request.args.get('destination', 'your destination'),
+        'price': price,
+        'final_price': price,
+        'eta': request.args.get('eta', '5'),
+        'rating': request.args.get('rating', '5.0'),
+        'reason': request.args.get('reason', 'driver unavailable')
+    }
+    
+    return Response(twiml_templates.render(call_type, **context), mimetype='text/xml')
+
+@voice_routes.route("/twiml/message/<name>", methods=["POST"])
+def generate_message_twiml(name):
+    """Speak a message template (e.g. call_status.payment_reminder) filled from URL parameters"""
+    if name not in MESSAGE_TWIML:
+        name = 'fallback'
+    return Response(twiml_templates.render(name, **request.args.to_dict()), mimetype='text/xml')
+
+# ─────────── LEGACY TWIML RESPONSE HANDLERS ───────────
+LEGACY_CALL_TYPES = ('arrival', 'safety', 'feedback', 'booking', 'other')
+
+@voice_routes.route("/twiml/<call_type>", methods=["POST"])
+def generate_twiml(call_type):
+    """Generate TwiML responses for different call types (legacy support)"""
+    response = VoiceResponse()
+    
+    if call_type == 'arrival':
+        response.say("Your WeRide driver has arrived at your pickup location. Please come out when ready.", 
+                    voice='Polly.Joanna', language='en-US')
+        
+        gather = Gather(numDigits=1, action='/handle-arrival-response', method='POST')
+        gather.say("Press 1 to confirm you're coming out, or 2 if you need more time.", 
+                  voice='Polly.Joanna', language='en-US')
+        response.append(gather)
+        
+    elif call_type == 'safety':
+        gather = Gather(numDigits=1, action='/handle-safety-response', method='POST')
+        gather.say("WeRide AI safety check: Are you okay? Press 1 for yes, 2 if you need help immediately.", 
+                  voice='Polly.Matthew', language='en-US')
+        response.append(gather)
+        
+    elif call_type == 'feedback':
+        gather = Gather(numDigits=1, action='/handle-feedback-response', method='POST')
+        gather.say("Hi! This is WeRide AI. How was your ride? Press 1 for excellent, 2 for good, 3 for average, or 4 for poor.", 
+                  voice='Polly.Ivy', language='en-US')
+        response.append(gather)
+        
+    elif call_type == 'booking':
+        response.say("Thank you for booking with WeRide! Your ride has been confirmed. We'll call you when your driver arrives.", 
+                    voice='Polly.Joanna', language='en-US')
+        
+    else:
+        response.say("Hello from WeRide AI Assistant. Thank you for using our service.", 
+                    voice='Polly.Joanna', language='en-US')
+    
+    return Response(str(response), mimetype='text/xml')
+
+# ─────────── RESPONSE HANDLERS ───────────
+@voice_routes.route("/handle-arrival-response", methods=["POST"])
+def handle_arrival_response():
+    """Handle user response to arrival call"""
+    digit_pressed = request.form.get('Digits')
+    response = VoiceResponse()
+    
+    if digit_pressed == '1':
+        response.say("Great! Your driver will wait for you. Have a safe ride!", 
+                    voice='Polly.Joanna', language='en-US')
+    elif digit_pressed == '2':
+        response.say("No problem! Take your time. Your driver has been notified.", 
+                    voice='Polly.Joanna', language='en-US')
+    else:
+        response.say("Thank you for your response. Have a great day!", 
+                    voice='Polly.Joanna', language='en-US')
+    
+    return Response(str(response), mimetype='text/xml')
+
+@voice_routes.route("/handle-safety-response", methods=["POST"])
+def handle_safety_response():
+    """Handle user response to safety call"""
+    digit_pressed = request.form.get('Digits')
+    response = VoiceResponse()
+    
+    if digit_pressed == '1':
+        response.say("Great to hear you're safe! Continue with your ride.", 
+                    voice='Polly.Matthew', language='en-US')
+    elif digit_pressed == '2':
+        response.say("We're connecting you to emergency services immediately. Stay on the line.", 
+                    voice='Polly.Matthew', language='en-US')
+        # In production, trigger emergency response
+    else:
+        response.say("If this is an emergency, please call emergency services directly.", 
+                    voice='Polly.Matthew', language='en-US')
+    
+    return Response(str(response), mimetype='text/xml')
+
+@voice_routes.route("/handle-feedback-response", methods=["POST"])
+def handle_feedback_response():
+    """Handle user response to feedback call (legacy)"""
+    digit_pressed = request.form.get('Digits')
+    response = VoiceResponse()
+    
+    feedback_responses = {
+        '1': "Thank you for the excellent rating! We're glad you enjoyed your ride.",
+        '2': "Thanks for the good rating! We appreciate your feedback.",
+        '3': "Thank you for your feedback. We'll work to improve our service.",
+        '4': "We're sorry about the issues. A customer service representative will contact you soon."
+    }
+    
+    message = feedback_responses.get(digit_pressed, "Thank you for your feedback!")
+    response.say(message, voice='Polly.Ivy', language='en-US')
+    
+    return Response(str(response), mimetype='text/xml')
+
+# ─────────── ENHANCED INTERACTIVE RESPONSE HANDLERS ───────────
+@voice_routes.route("/handle-arrival-response-enhanced", methods=["POST"])
+def handle_arrival_response_enhanced():
+    """Handle enhanced user response to arrival call"""
+    digit_pressed = request.form.get('Digits')
+    response = VoiceResponse()
+    
+    if digit_pressed == '1':
+        response.say("Perfect! We've notified your driver that you're on your way out. Please look for their vehicle and confirm with them before getting in. Have a safe and pleasant ride with WeRide!", 
+                    voice='Polly.Joanna', language='en-US')
+    elif digit_pressed == '2':
+        response.say("No problem! We've let your driver know you need a few more minutes. They'll wait for you. Please come out as soon as you're ready. Thank you for using WeRide!", 
+                    voice='Polly.Joanna', language='en-US')
+    else:
+        response.say("Thank you for responding to WeRide AI assistant. If you need any assistance, please call our support line. Have a great day!", 
+                    voice='Polly.Joanna', language='en-US')
+    
+    return Response(str(response), mimetype='text/xml')
+
+@voice_routes.route("/handle-safety-response-enhanced", methods=["POST"])
+def handle_safety_response_enhanced():
+    """Handle enhanced user response to safety call"""
+    digit_pressed = request.form.get('Digits')
+    response = VoiceResponse()
+    
+    if digit_pressed == '1':
+        response.say("Excellent! We're happy to confirm you're safe and comfortable during your WeRide journey. Continue enjoying your ride. We may check in again if the trip is long. Thank you!", 
+                    voice='Polly.Matthew', language='en-US')
+    elif digit_pressed == '2':
+        response.say("We understand you need immediate assistance. WeRide emergency protocol is now activated. We're connecting you to our emergency response team and local authorities. Please stay on the line and provide your location.", 
+                    voice='Polly.Matthew', language='en-US')
+        # In production, trigger emergency response system
+        # - Contact emergency services
+        # - Alert WeRide safety team  
+        # - Track ride location
+        # - Notify emergency contacts
+    else:
+        response.say("This is WeRide safety monitoring. If you're in immediate danger, please call emergency services directly at your local emergency number. For non-urgent issues, contact WeRide support.", 
+                    voice='Polly.Matthew', language='en-US')
+    
+    return Response(str(response), mimetype='text/xml')
+
+@voice_routes.route("/handle-feedback-response-enhanced", methods=["POST"])
+def handle_feedback_response_enhanced():
+    """Handle enhanced user response to feedback call"""
+    digit_pressed = request.form.get('Digits')
+    response = VoiceResponse()
+    
+    enhanced_feedback_responses = {
+        '1': "Fantastic! We're thrilled you had an excellent WeRide experience. Your 5-star rating means the world to us and your driver. Thank you for choosing WeRide, and we look forward to serving you again soon!",
+        '2': "Great to hear you had a good ride! Your positive feedback helps us maintain high service standards. We appreciate you taking the time to rate your WeRide experience. Thank you for riding with us!",
+        '3': "Thank you for your honest feedback. We value all passenger input as it helps us improve our WeRide service. We'll take note of your experience and work to make your next ride even better.",
+        '4': "We're sorry to hear your ride wasn't up to your expectations. Your feedback is important to us. A WeRide customer service representative will contact you within 24 hours to discuss your experience and make things right.",
+        '5': "We sincerely apologize for the serious issues you experienced during your WeRide trip. This is not the standard we strive for. A senior customer service manager will call you within 2 hours to personally address your concerns and ensure this doesn't happen again."
+    }
+    
+    message = enhanced_feedback_responses.get(digit_pressed, "Thank you for providing feedback to WeRide AI assistant. Your input helps us improve our service quality.")
+    response.say(message, voice='Polly.Ivy', language='en-US')
+    
+    # In production, log the feedback rating to database
+    # and trigger appropriate follow-up actions based on rating
+    
+    return Response(str(response), mimetype='text/xml')
+
+# ─────────── PRE-RENDERED AUDIO ───────────
+@voice_routes.after_request
+def play_cached_audio(response):
+    """Swap <Say> for <Play> wherever the audio cache has the message"""
+    if (response.mimetype == 'text/xml' and not response.direct_passthrough
+            and current_app.config.get('AUDIO_CACHE', True)):
+        response.set_data(audio_cache.play_cached(response.get_data(as_text=True)))
+    return response
+
+@voice_routes.route("/audio/<key>.wav", methods=["GET"])
+def cached_audio(key):
+    """Rendered audio by content hash; it never changes, so clients may cache it for good"""
+    if not audio_cache.enabled or not KEY_PATTERN.match(key):
+        abort(404)
+    response = send_from_directory(os.path.join(audio_cache.directory, key[:2]), key + AUDIO_SUFFIX,
+                                   mimetype=AUDIO_MIMETYPE, max_age=MAX_AGE, etag=key)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+def static_prompts():
+    """(text, voice, language) of every prompt spoken without request values, for pre-rendering"""
+    items = []
+    for name in twiml_templates.names() + ['fallback']:
+        for variant in twiml_templates.get(name).variants:
+            items.extend(spoken_texts(variant))
+
+    # Crawl the routes for the <Say> text itself, not what the cache makes of it
+    app = create_voice_app()
+    app.config['AUDIO_CACHE'] = False
+    paths = [rule.rule for rule in app.url_map.iter_rules()
+             if rule.endpoint.startswith('voice.') and not rule.arguments and rule.rule != '/twiml-enhanced']
+    paths += [f"/twiml/{call_type}" for call_type in LEGACY_CALL_TYPES]
+    client = app.test_client()
+    for path in paths:
+        # Every keypad answer the response handlers know, plus none
+        for digits in ('', '1', '2', '3', '4', '5'):
+            items.extend(spoken_texts(client.post(path, data={'Digits': digits}).get_data(as_text=True)))
+    return items
+
+
+def create_voice_app():
+    """Minimal Flask app serving only the TwiML routes"""
+    app = Flask(__name__, static_folder=None)
+    app.register_blueprint(voice_routes)
+    RequestMetrics(app, count_queries=False)
+    return app